@@ -2,6 +2,8 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from core.services.storage_url_service import profile_photo_url
+
 class RegisterSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(required=True)
     last_name = serializers.CharField(required=True)
@@ -141,10 +143,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_photo_url(self, obj):
         try:
-            profile = obj.profile
-            if profile.photo:
-                return profile.photo.url
-            return profile.photo_url
+            return profile_photo_url(obj.profile, self.context.get('request'))
         except:
             return None
 
@@ -1,3 +1,6 @@
+import csv
+from io import StringIO
+
 from django.contrib.auth.models import User
 from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
@@ -136,3 +139,15 @@ class AdminUserEndpointPermissionTests(APITestCase):
         returned_ids = {item['id'] for item in response.data}
         self.assertIn(self.admin.id, returned_ids)
         self.assertIn(self.member.id, returned_ids)
+
+    def test_admin_can_export_filtered_users(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('admin_user_export'), {'q': 'member'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['username'] for row in rows], ['memberuser'])
+        self.assertIn('tier', rows[0])
+
+        self.client.force_authenticate(user=self.member)
+        self.assertEqual(self.client.get(reverse('admin_user_export')).status_code, status.HTTP_403_FORBIDDEN)
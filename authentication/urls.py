@@ -2,7 +2,7 @@ from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     welcome, RegisterView, AdminPasswordResetView, CustomTokenObtainPairView, 
-    AdminUserListView, AdminUserDetailView, UserPasswordChangeView, UserDeleteView,
+    AdminUserListView, AdminUserExportView, AdminUserDetailView, UserPasswordChangeView, UserDeleteView,
     PasswordResetRequestOTPView, PasswordResetConfirmOTPView,
     VerifySignupOTPView, ResendSignupOTPView
 )
@@ -31,5 +31,6 @@ urlpatterns = [
     
     # Admin User Management
     path('admin/users/', AdminUserListView.as_view(), name='admin_user_list'),
+    path('admin/users/export/', AdminUserExportView.as_view(), name='admin_user_export'),
     path('admin/users/<int:pk>/', AdminUserDetailView.as_view(), name='admin_user_detail'),
 ]
@@ -417,6 +417,12 @@ class AdminUserListView(generics.ListAPIView):
             )
         return queryset
 
+class AdminUserExportView(AdminUserListView):
+    """The (optionally ?q= filtered) user list as a streamed CSV / NDJSON download."""
+    def list(self, request, *args, **kwargs):
+        from members.exports import export_members
+        return export_members(request, self.filter_queryset(self.get_queryset()).order_by('id'))
+
 class AdminUserDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
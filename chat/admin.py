@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import Conversation, Message, MessageArchive
 
 # This lets you see messages inside the Conversation page
 class MessageInline(admin.TabularInline):
@@ -24,3 +24,9 @@ class MessageAdmin(admin.ModelAdmin):
 
     def text_preview(self, obj):
         return obj.text[:50] + "..." if len(obj.text) > 50 else obj.text
+
+
+@admin.register(MessageArchive)
+class MessageArchiveAdmin(admin.ModelAdmin):
+    list_display = ('conversation', 'month', 'message_count', 'storage_key', 'created_at')
+    readonly_fields = ('conversation', 'month', 'message_count', 'first_message_id', 'last_message_id', 'storage_key', 'created_at')
@@ -0,0 +1,188 @@
+"""
+Cold storage for old chat messages.
+
+archive_conversation_months() moves messages older than a cutoff out of the
+Message table, one (conversation, month) at a time, into gzipped JSONL files in
+default storage and records a MessageArchive for each file. The Message table
+then only holds recent traffic, so the hot queries stay on a small table/index.
+
+archived_messages() rehydrates a month for a user scrolling back: the records
+become unsaved Message instances, so MessageSerializer renders them exactly like
+live ones. Parsed files are cached briefly.
+
+Messages that a recent message replies to are never archived, so reply previews
+in the hot table keep working; archived replies carry a snapshot of the message
+they quote.
+"""
+import gzip
+import json
+import tempfile
+import uuid
+from datetime import date, datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Message, MessageArchive
+
+ARCHIVE_CACHE_SECONDS = 10 * 60
+DELETE_BATCH_SIZE = 500
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+
+def archive_prefix():
+    return getattr(settings, 'CHAT_ARCHIVE_PREFIX', 'chat_archive/')
+
+
+def _month_bounds(month):
+    """[start, end) of a month in the current time zone, matching TruncMonth."""
+    next_month = date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+    return (
+        timezone.make_aware(datetime(month.year, month.month, 1)),
+        timezone.make_aware(datetime(next_month.year, next_month.month, 1)),
+    )
+
+
+def archivable_messages(cutoff):
+    hot_reply_targets = Message.objects.filter(
+        created_at__gte=cutoff, reply_to__isnull=False,
+    ).values('reply_to_id')
+    return Message.objects.filter(created_at__lt=cutoff).exclude(id__in=hot_reply_targets)
+
+
+def pending_months(cutoff):
+    """(conversation_id, month, count) still to archive, newest month first."""
+    rows = (
+        archivable_messages(cutoff)
+        .annotate(month=TruncMonth('created_at'))
+        .values('conversation_id', 'month')
+        .annotate(total=Count('id'))
+        # Newest first, so a cold reply is archived (with its snapshot) before
+        # the older message it quotes is deleted.
+        .order_by('conversation_id', '-month')
+    )
+    for row in rows:
+        month = row['month']
+        yield row['conversation_id'], date(month.year, month.month, 1), row['total']
+
+
+def _record(message):
+    reply_to = message.reply_to
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'text': message.text,
+        'created_at': message.created_at,
+        'is_read': message.is_read,
+        'message_type': message.message_type,
+        'attachment': message.attachment.name or None,
+        'metadata': message.metadata,
+        'reply_to': {
+            'id': reply_to.id,
+            'text': reply_to.text,
+            'sender_id': reply_to.sender_id,
+        } if reply_to else None,
+    }
+
+
+def archive_month(conversation_id, month, cutoff, batch_size=1000):
+    """
+    Write one conversation-month to storage and delete the rows. The file is
+    uploaded before anything is deleted, so a failure never loses messages.
+    Returns the MessageArchive, or None if there was nothing to archive.
+    """
+    start, end = _month_bounds(month)
+    messages = (
+        archivable_messages(cutoff)
+        .filter(conversation_id=conversation_id, created_at__gte=start, created_at__lt=end)
+        .select_related('reply_to')
+        .order_by('id')
+    )
+
+    ids = []
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buffer:
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as gz:
+            for message in messages.iterator(chunk_size=batch_size):
+                gz.write(json.dumps(_record(message), cls=DjangoJSONEncoder).encode() + b'\n')
+                ids.append(message.id)
+        if not ids:
+            return None
+
+        buffer.seek(0)
+        key = default_storage.save(
+            f'{archive_prefix()}{conversation_id}/{month:%Y-%m}-{uuid.uuid4().hex}.jsonl.gz',
+            File(buffer),
+        )
+
+    with transaction.atomic():
+        archive = MessageArchive.objects.create(
+            conversation_id=conversation_id,
+            month=month,
+            storage_key=key,
+            message_count=len(ids),
+            first_message_id=ids[0],
+            last_message_id=ids[-1],
+        )
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            Message.objects.filter(id__in=ids[start:start + DELETE_BATCH_SIZE]).delete()
+    return archive
+
+
+def load_records(archive):
+    cache_key = f'chat-archive:{archive.id}'
+    records = cache.get(cache_key)
+    if records is None:
+        with default_storage.open(archive.storage_key, 'rb') as fh:
+            with gzip.GzipFile(fileobj=fh) as gz:
+                records = [json.loads(line) for line in gz if line.strip()]
+        cache.set(cache_key, records, ARCHIVE_CACHE_SECONDS)
+    return records
+
+
+def archived_messages(conversation, month, since=None):
+    """
+    Unsaved Message instances for one archived month of `conversation`, oldest
+    first. `since` drops messages from before the user cleared the chat.
+    """
+    records = []
+    for archive in conversation.message_archives.filter(month=month).order_by('first_message_id'):
+        records.extend(load_records(archive))
+
+    sender_ids = {r['sender_id'] for r in records}
+    sender_ids |= {r['reply_to']['sender_id'] for r in records if r['reply_to']}
+    users = User.objects.select_related('profile').in_bulk(sender_ids)
+
+    messages = []
+    for record in records:
+        created_at = parse_datetime(record['created_at'])
+        if since and created_at <= since:
+            continue
+        sender = users.get(record['sender_id'])
+        if sender is None:
+            # Sender account deleted since; their live messages would be gone too
+            continue
+        message = Message(
+            id=record['id'],
+            conversation=conversation,
+            sender=sender,
+            text=record['text'],
+            created_at=created_at,
+            is_read=record['is_read'],
+            message_type=record['message_type'],
+            attachment=record['attachment'],
+            metadata=record['metadata'],
+        )
+        reply = record['reply_to']
+        if reply and reply['sender_id'] in users:
+            message.reply_to = Message(id=reply['id'], text=reply['text'], sender=users[reply['sender_id']])
+        messages.append(message)
+    return messages
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.archive import archive_month, pending_months
+
+
+class Command(BaseCommand):
+    help = 'Moves chat messages older than CHAT_ARCHIVE_AFTER_DAYS to gzipped JSONL archives in storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+            help='Archive messages older than this many days',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write(f"Archiving chat messages created before {cutoff:%Y-%m-%d %H:%M}")
+
+        months = 0
+        archived = 0
+        # Months go newest first so replies are archived before the messages they
+        # quote; archiving older months after a failure would null the replies'
+        # reply_to (SET_NULL) while they are still live, so skip the conversation.
+        failed = set()
+        for conversation_id, month, total in list(pending_months(cutoff)):
+            if conversation_id in failed:
+                continue
+            if options['dry_run']:
+                self.stdout.write(f"  conversation {conversation_id} {month:%Y-%m}: {total} messages")
+                months += 1
+                archived += total
+                continue
+            try:
+                archive = archive_month(conversation_id, month, cutoff, batch_size=options['batch_size'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(
+                    f"  conversation {conversation_id} {month:%Y-%m}: failed ({e}); skipping its older months"
+                ))
+                failed.add(conversation_id)
+                continue
+            if archive:
+                months += 1
+                archived += archive.message_count
+                self.stdout.write(f"  conversation {conversation_id} {month:%Y-%m}: {archive.message_count} messages -> {archive.storage_key}")
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {archived} messages in {months} conversation-months"))
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:10
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def merge_direct_conversations(apps, schema_editor):
+    """
+    Give every private two-person conversation its dm_key. Where the same pair
+    has several conversations, the oldest one is kept and the others' messages,
+    archives, read cursors, clear and mute states are moved into it.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    MessageArchive = apps.get_model('chat', 'MessageArchive')
+    ConversationReadCursor = apps.get_model('chat', 'ConversationReadCursor')
+    ConversationClearStatus = apps.get_model('chat', 'ConversationClearStatus')
+    ConversationMuteStatus = apps.get_model('chat', 'ConversationMuteStatus')
+    Participants = Conversation.participants.through
+
+    pairs = (
+        Conversation.objects.filter(is_public=False)
+        .annotate(n=Count('participants'))
+        .filter(n=2)
+        .values_list('id', flat=True)
+    )
+    members = defaultdict(list)
+    for conversation_id, user_id in (
+        Participants.objects.filter(conversation_id__in=list(pairs)).values_list('conversation_id', 'user_id')
+    ):
+        members[conversation_id].append(user_id)
+
+    by_key = defaultdict(list)
+    for conversation_id, user_ids in members.items():
+        low, high = sorted(user_ids)
+        by_key[f'{low}:{high}'].append(conversation_id)
+
+    for key, conversation_ids in by_key.items():
+        keep, *duplicates = sorted(conversation_ids)
+        if duplicates:
+            Message.objects.filter(conversation_id__in=duplicates).update(conversation_id=keep)
+            MessageArchive.objects.filter(conversation_id__in=duplicates).update(conversation_id=keep)
+
+            # Per-user rows are unique per conversation: keep the furthest read cursor,
+            # and the kept conversation's clear/mute state when both have one
+            cursors = (
+                ConversationReadCursor.objects.filter(conversation_id__in=conversation_ids)
+                .values('user_id')
+                .annotate(upto=Max('last_read_message_id'), at=Max('last_read_at'))
+            )
+            for cursor in cursors:
+                ConversationReadCursor.objects.update_or_create(
+                    user_id=cursor['user_id'], conversation_id=keep,
+                    defaults={'last_read_message_id': cursor['upto'], 'last_read_at': cursor['at']},
+                )
+            for model in (ConversationClearStatus, ConversationMuteStatus):
+                kept_users = model.objects.filter(conversation_id=keep).values_list('user_id', flat=True)
+                model.objects.filter(conversation_id__in=duplicates).exclude(user_id__in=list(kept_users)).update(conversation_id=keep)
+
+            latest = Conversation.objects.filter(id__in=conversation_ids).aggregate(latest=Max('updated_at'))['latest']
+            Conversation.objects.filter(id__in=duplicates).delete()
+            Conversation.objects.filter(id=keep).update(updated_at=latest)
+        Conversation.objects.filter(id=keep).update(dm_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_message_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='dm_key',
+            field=models.CharField(blank=True, max_length=41, null=True),
+        ),
+        migrations.RunPython(merge_direct_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0012 so the merge's deferred FK checks are committed
+    # before the table is altered (PostgreSQL refuses otherwise)
+
+    dependencies = [
+        ('chat', '0012_conversation_dm_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conversation',
+            name='dm_key',
+            field=models.CharField(blank=True, max_length=41, null=True, unique=True),
+        ),
+    ]
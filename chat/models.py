@@ -8,6 +8,8 @@ class Conversation(models.Model):
     participants = models.ManyToManyField(User, related_name='conversations', blank=True)
     is_public = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
+    # "<lower user id>:<higher user id>" for 1:1 chats, NULL otherwise; see chat.services.get_or_create_dm
+    dm_key = models.CharField(max_length=41, unique=True, null=True, blank=True)
 
     def __str__(self):
         return f"Conversation {self.id}"
@@ -31,6 +33,21 @@ class ConversationMuteStatus(models.Model):
     class Meta:
         unique_together = ('user', 'conversation')
 
+class ConversationReadCursor(models.Model):
+    """
+    How far a participant has read a conversation: every message with
+    id <= last_read_message_id counts as read for this user. Replaces flipping
+    Message.is_read on each fetch (that flag is kept for older rows only and
+    cannot describe group chats).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_cursors')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_cursors')
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'conversation')
+
 class Message(models.Model):
     MESSAGE_TYPES = (
         ('text', 'Text'),
@@ -56,7 +73,9 @@ class Message(models.Model):
 
     def save(self, *args, **kwargs):
         # Compression Logic for Images
-        if self.attachment and self.message_type == 'image':
+        # Only for files uploaded through this request; attachments that were
+        # uploaded directly to storage (upload_service) are already committed.
+        if self.attachment and self.message_type == 'image' and not self.attachment._committed:
             # Check if it's already compressed (avoid re-compressing heavily)
             # Or simplified: try-except around opening it.
             try:
@@ -84,5 +103,33 @@ class Message(models.Model):
         
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            # Hot path: a conversation's recent messages in order
+            models.Index(fields=['conversation', 'created_at']),
+        ]
+
     def __str__(self):
         return f"{self.sender.username}: {self.message_type}"
+
+
+class MessageArchive(models.Model):
+    """
+    One conversation's messages from one month, moved out of the Message table
+    into gzipped JSONL in storage (see chat/archive.py). A month can have more
+    than one chunk if it was archived across several runs.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='message_archives')
+    month = models.DateField() # First day of the month
+    storage_key = models.CharField(max_length=255)
+    message_count = models.PositiveIntegerField()
+    first_message_id = models.PositiveBigIntegerField()
+    last_message_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-month', '-last_message_id']
+        indexes = [models.Index(fields=['conversation', 'month'])]
+
+    def __str__(self):
+        return f"Conversation {self.conversation_id} archive {self.month:%Y-%m} ({self.message_count})"
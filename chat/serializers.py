@@ -6,6 +6,9 @@ from django.utils import timezone
 from datetime import timedelta
 import boto3
 
+from core.services.storage_url_service import file_url, profile_photo_url
+from . import services as chat_services
+
 # A simple User serializer for chat participants
 class ChatUserSerializer(serializers.ModelSerializer):
     tier = serializers.SerializerMethodField()
@@ -17,9 +20,7 @@ class ChatUserSerializer(serializers.ModelSerializer):
 
     def get_photo_url(self, obj):
         try:
-            if obj.profile.photo:
-                return obj.profile.photo.url
-            return obj.profile.photo_url
+            return profile_photo_url(obj.profile, self.context.get('request'))
         except:
             return None
 
@@ -55,47 +56,39 @@ class MessageSerializer(serializers.ModelSerializer):
         return int(getattr(settings, 'CHAT_MESSAGE_DELETE_WINDOW_MINUTES', 15))
 
     def get_attachment_url(self, obj):
-        if not obj.attachment:
-            return None
-        
-        request = self.context.get('request')
         try:
-             # Try to get the URL from the attachment
-             url = obj.attachment.url
-             if not url:
-                 return None
-             
-             # If it's already an absolute URL (S3 or external), return as-is
-             if url.startswith('http'):
-                 return url
-             
-             # If local storage (relative path), ensure absolute URI
-             if url.startswith('/'):
-                 if request: 
-                     return request.build_absolute_uri(url)
-                 # Fallback if no request context
-                 import os
-                 domain = os.environ.get('SITE_URL', 'https://ffig-backend-ti5w.onrender.com')
-                 return f"{domain}{url}"
-             
-             return url
+            return file_url(obj.attachment, self.context.get('request'))
         except Exception as e:
-             print(f"Error getting attachment URL: {e}")
-             return None
+            print(f"Error getting attachment URL: {e}")
+            return None
+
+    def _read_state(self, obj, user):
+        """
+        (my read cursor, receipt cursor) for obj's conversation - see
+        chat.services. MessageListView and ConversationListView inject it for
+        the whole page; otherwise looked up once per conversation and kept in
+        the (shared) context.
+        """
+        read_state = self.context.setdefault('read_state', {})
+        if obj.conversation_id not in read_state:
+            read_state.update(chat_services.read_states(user, [obj.conversation_id]))
+        return read_state[obj.conversation_id]
 
     def get_is_read(self, obj):
-        # 1. Start with actual DB status
-        status = obj.is_read
-        
-        # 2. If I am the SENDER, check if the RECIPIENT allows me to see it
+        # 1. Rows marked read before read cursors existed
+        if obj.is_read:
+            return True
+
         request = self.context.get('request')
-        if request and obj.sender == request.user:
-            # Context injected by MessageListView
-            partner_allows = self.context.get('partner_read_receipts', True) 
-            if not partner_allows:
-                return False
-        
-        return status
+        if not request or not request.user.is_authenticated:
+            return False
+        my_read_upto, receipt_read_upto = self._read_state(obj, request.user)
+
+        # 2. If I am the SENDER, only report it read if the RECIPIENT shares read receipts
+        if obj.sender_id == request.user.id:
+            return receipt_read_upto is not None and obj.id <= receipt_read_upto
+
+        return obj.id <= my_read_upto
 
     def get_reply_to(self, obj):
         if obj.reply_to:
@@ -134,16 +127,23 @@ class ConversationSerializer(serializers.ModelSerializer):
     last_message = serializers.SerializerMethodField()
 
     def get_last_message(self, obj):
-        last_msg = obj.messages.order_by('-created_at').first()
+        # Loaded for the whole page by ConversationListView
+        if 'last_messages' in self.context:
+            last_msg = self.context['last_messages'].get(getattr(obj, 'last_message_id', None))
+        else:
+            last_msg = obj.messages.order_by('-created_at').first()
         if last_msg:
             return MessageSerializer(last_msg, context=self.context).data
         return None
 
     def get_unread_count(self, obj):
+        # Annotated by ConversationListView
+        if hasattr(obj, 'unread_for_user'):
+            return obj.unread_for_user
         request = self.context.get('request')
-        if request and request.user:
-             # Count messages in this conversation where I am a participant, but NOT the sender, and is_read=False
-             return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
+        if request and request.user.is_authenticated:
+             # Messages from others past my read cursor
+             return chat_services.unread_count(request.user, obj)
         return 0
 
     unread_count = serializers.SerializerMethodField()
@@ -0,0 +1,200 @@
+"""
+Chat services.
+
+Direct messages: every 1:1 conversation carries a dm_key built from the sorted
+user-id pair, unique in the database, so finding or starting a chat between
+two users is one index lookup and concurrent starts can't create duplicates.
+
+Read state is backed by one ConversationReadCursor per (user, conversation)
+instead of a per-message is_read flag. A message counts as read by a user when
+its id is at or below their cursor. Message.is_read is still honoured for rows
+marked read before cursors existed, but it is no longer written.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, IntegerField, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Conversation, ConversationReadCursor, Message
+
+
+def dm_key(a, b):
+    """Canonical key for the direct chat between two users (or user ids)."""
+    a, b = sorted((int(getattr(a, 'id', a)), int(getattr(b, 'id', b))))
+    return f'{a}:{b}'
+
+
+def dm_partner_id(conversation, user):
+    """The other participant's id in a 1:1 conversation, without a query (None otherwise)."""
+    if not conversation.dm_key:
+        return None
+    ids = [int(part) for part in conversation.dm_key.split(':')]
+    user_id = getattr(user, 'id', user)
+    return ids[1] if ids[0] == user_id else ids[0]
+
+
+def get_or_create_dm(a, b):
+    """(conversation, created) for the direct chat between users a and b."""
+    key = dm_key(a, b)
+    conversation = Conversation.objects.filter(dm_key=key).first()
+    if conversation:
+        return conversation, False
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(dm_key=key, is_public=False)
+            conversation.participants.add(a, b)
+        return conversation, True
+    except IntegrityError:
+        # Someone else started the same chat a moment ago
+        return Conversation.objects.get(dm_key=key), False
+
+
+def read_cursor(user, conversation_id):
+    """The user's last_read_message_id in the conversation (0 before their first read)."""
+    return (
+        ConversationReadCursor.objects.filter(user=user, conversation_id=conversation_id)
+        .values_list('last_read_message_id', flat=True).first()
+    ) or 0
+
+
+def mark_read(user, conversation_id, message_id, current=None):
+    """
+    Move the user's cursor up to `message_id`; it never moves back, so an older
+    overlapping request (poll racing a fetch) can't bring unread badges back.
+    One conditional UPDATE, plus an insert the first time. Pass the cursor
+    value already known to the caller as `current` to skip the write when
+    nothing new arrived (e.g. repeated polling).
+    """
+    if not message_id or (current is not None and current >= message_id):
+        return
+    now = timezone.now()
+    cursor = ConversationReadCursor.objects.filter(user=user, conversation_id=conversation_id)
+    if cursor.filter(last_read_message_id__lt=message_id).update(last_read_message_id=message_id, last_read_at=now):
+        return
+    if cursor.exists():
+        # Already at or past message_id
+        return
+    try:
+        with transaction.atomic():
+            ConversationReadCursor.objects.create(
+                user=user, conversation_id=conversation_id, last_read_message_id=message_id, last_read_at=now,
+            )
+    except IntegrityError:
+        # Created concurrently: only move it forward
+        cursor.filter(last_read_message_id__lt=message_id).update(last_read_message_id=message_id, last_read_at=now)
+
+
+def _cursor_subquery(user, conversation_ref):
+    return Coalesce(
+        Subquery(
+            ConversationReadCursor.objects.filter(user=user, conversation=conversation_ref)
+            .values('last_read_message_id')[:1]
+        ),
+        Value(0),
+    )
+
+
+def _unread_for(user, messages):
+    return (
+        messages.filter(is_read=False)
+        .exclude(sender=user)
+        .annotate(read_upto=_cursor_subquery(user, OuterRef('conversation')))
+        .filter(id__gt=F('read_upto'))
+    )
+
+
+def unread_messages(user):
+    """Messages from others, in any conversation of `user`, past their read cursor."""
+    return _unread_for(user, Message.objects.filter(conversation__participants=user))
+
+
+def unread_count_subquery(user):
+    """Per-conversation unread count, for annotating a Conversation queryset."""
+    unread = (
+        _unread_for(user, Message.objects.filter(conversation=OuterRef('pk')))
+        .order_by()
+        .values('conversation')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(unread, output_field=IntegerField()), Value(0))
+
+
+def has_unread(user):
+    """Exists() filter for conversations with unread messages for `user`."""
+    return Exists(_unread_for(user, Message.objects.filter(conversation=OuterRef('pk'))))
+
+
+def unread_count(user, conversation):
+    read_upto = read_cursor(user, conversation.id)
+    return (
+        conversation.messages.filter(is_read=False, id__gt=read_upto)
+        .exclude(sender=user).count()
+    )
+
+
+def receipt_watermarks(user, conversation_ids):
+    """
+    conversation_id -> highest message id every other participant who shares
+    read receipts has read, in one grouped query. Conversations where nobody
+    else shares them are left out.
+    """
+    if not conversation_ids:
+        return {}
+    cursor = Coalesce(
+        Subquery(
+            ConversationReadCursor.objects.filter(
+                user_id=OuterRef('user_id'), conversation_id=OuterRef('conversation_id'),
+            ).values('last_read_message_id')[:1]
+        ),
+        Value(0),
+    )
+    rows = (
+        Conversation.participants.through.objects
+        .filter(conversation_id__in=conversation_ids)
+        .exclude(user_id=getattr(user, 'id', user))
+        # Members without a profile keep the default (sharing)
+        .filter(Q(user__profile__isnull=True) | Q(user__profile__read_receipts_enabled=True))
+        .annotate(cursor=cursor)
+        .values('conversation_id')
+        .annotate(read_upto=Min('cursor'))
+        .values_list('conversation_id', 'read_upto')
+    )
+    return dict(rows)
+
+
+def receipt_read_upto(conversation, user):
+    """
+    Highest message id every other participant who shares read receipts has
+    read, or None when nobody in the conversation shares them.
+    """
+    conversation_id = getattr(conversation, 'id', conversation)
+    return receipt_watermarks(user, [conversation_id]).get(conversation_id)
+
+
+def read_states(user, conversation_ids):
+    """
+    conversation_id -> (my read cursor, receipt watermark) for a page of
+    conversations, in two queries whatever the page size.
+    """
+    mine = dict(
+        ConversationReadCursor.objects.filter(user=user, conversation_id__in=conversation_ids)
+        .values_list('conversation_id', 'last_read_message_id')
+    )
+    receipts = receipt_watermarks(user, conversation_ids)
+    return {cid: (mine.get(cid, 0), receipts.get(cid)) for cid in conversation_ids}
+
+
+def last_message_subquery():
+    """Id of each conversation's newest message, for annotating a Conversation queryset."""
+    return Subquery(
+        Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at', '-id').values('id')[:1]
+    )
+
+
+def messages_by_id(message_ids):
+    """id -> Message with everything MessageSerializer reads, in one query."""
+    messages = Message.objects.filter(id__in=[mid for mid in message_ids if mid]).select_related(
+        'sender', 'sender__profile', 'reply_to', 'reply_to__sender', 'reply_to__sender__profile',
+    )
+    return {message.id: message for message in messages}
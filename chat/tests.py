@@ -1,15 +1,22 @@
+import io
+import tempfile
 from unittest.mock import patch
 
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from .models import Conversation, Message
+from . import services as chat_services
+from .models import Conversation, ConversationReadCursor, Message, MessageArchive
+from .services import mark_read
 
 
 @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
@@ -61,6 +68,95 @@ class ChatApiTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['unread_count'], 2)
 
+    def test_fetching_messages_moves_read_cursor_instead_of_flagging_rows(self):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(self.sender, self.recipient)
+        outgoing = Message.objects.create(conversation=conversation, sender=self.sender, text='Hi')
+        Message.objects.create(conversation=conversation, sender=self.recipient, text='Hello')
+        Message.objects.create(conversation=conversation, sender=self.recipient, text='Still there?')
+
+        self.client.force_authenticate(user=self.sender)
+        self.assertEqual(self.client.get(reverse('unread-count')).data['unread_count'], 2)
+        conversations = self.client.get(reverse('conversation-list'), {'filter': 'unread'}).data
+        self.assertEqual([c['unread_count'] for c in conversations], [2])
+
+        response = self.client.get(reverse('message-list', kwargs={'pk': conversation.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Message.objects.filter(is_read=True).exists())
+        cursor = ConversationReadCursor.objects.get(user=self.sender, conversation=conversation)
+        self.assertEqual(cursor.last_read_message_id, Message.objects.latest('id').id)
+        self.assertEqual(self.client.get(reverse('unread-count')).data['unread_count'], 0)
+        self.assertEqual(self.client.get(reverse('conversation-list'), {'filter': 'unread'}).data, [])
+
+        # The recipient hasn't fetched yet, so my message isn't read
+        data = {m['id']: m for m in response.data}
+        self.assertFalse(data[outgoing.id]['is_read'])
+        self.assertTrue(all(m['is_read'] for m in response.data if not m['is_me']))
+
+        # Polling with nothing new doesn't write
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('message-list', kwargs={'pk': conversation.id}))
+        cursor_writes = [
+            q['sql'] for q in queries.captured_queries
+            if 'chat_conversationreadcursor' in q['sql'] and q['sql'].lstrip().upper().startswith(('UPDATE', 'INSERT'))
+        ]
+        self.assertEqual(cursor_writes, [])
+
+    def test_read_cursor_never_moves_back(self):
+        conversation = Conversation.objects.create()
+        mark_read(self.sender, conversation.id, 5)
+        mark_read(self.sender, conversation.id, 9)
+        # A slower overlapping request that saw fewer messages
+        mark_read(self.sender, conversation.id, 7)
+
+        cursor = ConversationReadCursor.objects.get(user=self.sender, conversation=conversation)
+        self.assertEqual(cursor.last_read_message_id, 9)
+
+    def test_read_receipts_follow_recipient_cursor_and_privacy(self):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(self.sender, self.recipient)
+        outgoing = Message.objects.create(conversation=conversation, sender=self.sender, text='Hi')
+
+        self.client.force_authenticate(user=self.recipient)
+        self.client.get(reverse('message-list', kwargs={'pk': conversation.id}))
+
+        self.client.force_authenticate(user=self.sender)
+        response = self.client.get(reverse('message-list', kwargs={'pk': conversation.id}))
+        self.assertTrue({m['id']: m for m in response.data}[outgoing.id]['is_read'])
+
+        self.recipient.profile.read_receipts_enabled = False
+        self.recipient.profile.save()
+        response = self.client.get(reverse('message-list', kwargs={'pk': conversation.id}))
+        self.assertFalse({m['id']: m for m in response.data}[outgoing.id]['is_read'])
+
+    def test_conversation_list_queries_do_not_grow_with_conversations(self):
+        def add_conversations(count):
+            for i in range(count):
+                partner = User.objects.create_user(username=f'partner{User.objects.count()}', password='x')
+                conversation, _ = chat_services.get_or_create_dm(self.sender, partner)
+                question = Message.objects.create(conversation=conversation, sender=partner, text=f'Question {i}')
+                Message.objects.create(conversation=conversation, sender=self.sender, text='Answer', reply_to=question)
+                mark_read(partner, conversation.id, question.id)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('conversation-list'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries), response.data
+
+        self.client.force_authenticate(user=self.sender)
+        add_conversations(3)
+        self.client.get(reverse('conversation-list'))  # warm the block graph cache
+        few, _ = count_queries()
+        add_conversations(10)
+        many, data = count_queries()
+
+        self.assertEqual(few, many)
+        self.assertEqual(many, 5)
+        self.assertEqual(len(data), 13)
+        last = data[0]['last_message']
+        self.assertEqual((last['text'], last['reply_to']['text'], last['is_read']), ('Answer', 'Question 9', False))
+
     @patch('core.services.fcm_service.send_push_notification', return_value=True)
     def test_send_message_creates_conversation_and_message(self, _mock_push):
         self.client.force_authenticate(user=self.sender)
@@ -85,6 +181,28 @@ class ChatApiTests(APITestCase):
         self.assertEqual(conversation.messages.count(), 1)
         self.assertEqual(conversation.messages.first().text, 'Hello from API test')
 
+    @patch('core.services.fcm_service.send_push_notification', return_value=True)
+    def test_direct_chat_is_found_by_pair_key(self, _mock_push):
+        from . import services
+
+        group = Conversation.objects.create()
+        group.participants.add(self.sender, self.recipient, User.objects.create_user(username='third', password='x'))
+
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(reverse('send-message'), {'recipient_id': self.recipient.id, 'text': 'One'}, format='json')
+        self.client.force_authenticate(user=self.recipient)
+        self.client.post(reverse('send-message'), {'recipient_id': self.sender.id, 'text': 'Two'}, format='json')
+
+        direct = Conversation.objects.get(dm_key=services.dm_key(self.recipient, self.sender))
+        self.assertEqual(direct.messages.count(), 2)
+        self.assertEqual(group.messages.count(), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(services.get_or_create_dm(self.sender.id, self.recipient.id), (direct, False))
+        self.assertEqual(services.dm_partner_id(direct, self.sender), self.recipient.id)
+
+        response = self.client.get(reverse('conversation-list'), {'recipient_id': self.sender.id})
+        self.assertEqual([c['id'] for c in response.data], [direct.id])
+
     @patch('core.services.fcm_service.send_push_notification', return_value=True)
     def test_send_document_attachment_uses_document_type(self, _mock_push):
         self.client.force_authenticate(user=self.sender)
@@ -111,6 +229,61 @@ class ChatApiTests(APITestCase):
         self.assertEqual(message.message_type, 'document')
         self.assertTrue(bool(message.attachment))
 
+    @patch('core.services.fcm_service.send_push_notification', return_value=True)
+    def test_send_message_with_direct_upload_attaches_uploaded_key(self, _mock_push):
+        self.client.force_authenticate(user=self.sender)
+        payload = b'RIFF....WAVEfmt mock audio'
+
+        with override_settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            upload = self.client.post(
+                reverse('upload-create'),
+                {
+                    'purpose': 'chat_attachment',
+                    'filename': 'voice note.wav',
+                    'content_type': 'audio/wav',
+                    'size': len(payload),
+                },
+                format='json',
+            )
+            self.assertEqual(upload.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(upload.data['method'], 'PUT')
+
+            put = self.client.generic(
+                'PUT', upload.data['url'], payload, content_type='audio/wav'
+            )
+            self.assertEqual(put.status_code, 204)
+
+            response = self.client.post(
+                reverse('send-message'),
+                {
+                    'recipient_id': self.recipient.id,
+                    'message_type': 'audio',
+                    'attachment_upload': upload.data['upload_token'],
+                },
+                format='json',
+            )
+
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            message = Message.objects.order_by('-id').first()
+            self.assertEqual(message.attachment.name, upload.data['key'])
+            self.assertEqual(message.attachment.read(), payload)
+
+    def test_direct_upload_token_is_bound_to_uploader(self):
+        self.client.force_authenticate(user=self.sender)
+        upload = self.client.post(
+            reverse('upload-create'),
+            {'purpose': 'chat_attachment', 'filename': 'a.pdf', 'content_type': 'application/pdf', 'size': 10},
+            format='json',
+        )
+
+        self.client.force_authenticate(user=self.recipient)
+        response = self.client.post(
+            reverse('send-message'),
+            {'recipient_id': self.sender.id, 'attachment_upload': upload.data['upload_token']},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_sender_can_delete_message_within_window(self):
         conversation = Conversation.objects.create()
         conversation.participants.add(self.sender, self.recipient)
@@ -164,3 +337,75 @@ class ChatApiTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertTrue(Message.objects.filter(id=message.id).exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CHAT_ARCHIVE_AFTER_DAYS=30)
+class ChatArchiveTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='x')
+        self.bob = User.objects.create_user(username='bob', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def _message(self, sender, text, days_ago, **kwargs):
+        message = Message.objects.create(conversation=self.conversation, sender=sender, text=text, **kwargs)
+        Message.objects.filter(id=message.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return message
+
+    def test_old_messages_are_archived_and_rehydrated(self):
+        first = self._message(self.alice, 'Old question', 100)
+        self._message(self.bob, 'Old answer', 100, reply_to=first)
+        quoted = self._message(self.bob, 'Quoted by a recent reply', 100)
+        self._message(self.alice, 'Recent', 1, reply_to=quoted)
+
+        call_command('archive_chat_messages', stdout=io.StringIO())
+
+        self.assertEqual(
+            set(Message.objects.values_list('text', flat=True)),
+            {'Quoted by a recent reply', 'Recent'},
+        )
+        archive = MessageArchive.objects.get()
+        self.assertEqual(archive.message_count, 2)
+
+        self.client.force_authenticate(user=self.bob)
+        url = reverse('message-archive', kwargs={'pk': self.conversation.id})
+        months = self.client.get(url).data
+        self.assertEqual(months, [{'month': f'{archive.month:%Y-%m}', 'message_count': 2}])
+
+        response = self.client.get(url, {'month': months[0]['month']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['text'] for m in response.data], ['Old question', 'Old answer'])
+        self.assertEqual(response.data[1]['reply_to']['text'], 'Old question')
+        self.assertTrue(response.data[1]['is_me'])
+        self.assertEqual(response.data[0]['sender']['username'], 'alice')
+
+    def test_failed_month_keeps_older_months_of_the_conversation(self):
+        quoted = self._message(self.alice, 'Older month', 100)
+        self._message(self.bob, 'Newer month reply', 60, reply_to=quoted)
+        other = Conversation.objects.create()
+        other.participants.add(self.alice, self.bob)
+        elsewhere = Message.objects.create(conversation=other, sender=self.alice, text='Elsewhere')
+        Message.objects.filter(id=elsewhere.id).update(created_at=timezone.now() - timedelta(days=100))
+
+        from chat.archive import archive_month
+
+        def fail_newest(conversation_id, month, *args, **kwargs):
+            if conversation_id == self.conversation.id:
+                raise RuntimeError('storage unavailable')
+            return archive_month(conversation_id, month, *args, **kwargs)
+
+        out = io.StringIO()
+        with patch('chat.management.commands.archive_chat_messages.archive_month', side_effect=fail_newest) as mock_archive:
+            call_command('archive_chat_messages', stdout=out)
+
+        # One attempt for the failed conversation, none for its older month
+        self.assertEqual([c.args[0] for c in mock_archive.call_args_list], [self.conversation.id, other.id])
+        reply = Message.objects.get(text='Newer month reply')
+        self.assertEqual(reply.reply_to_id, quoted.id)
+        self.assertFalse(Message.objects.filter(conversation=other).exists())
+
+    def test_archive_requires_participation(self):
+        outsider = User.objects.create_user(username='outsider', password='x')
+        self.client.force_authenticate(user=outsider)
+        response = self.client.get(reverse('message-archive', kwargs={'pk': self.conversation.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -3,13 +3,16 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.contrib.auth.models import User
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 from core.permissions import IsPremiumUser, IsStandardUser
+from core.services import block_service
 from .models import Conversation, Message
 from .serializers import ConversationSerializer, MessageSerializer
+from . import services as chat_services
 
 # 1. List all my conversations
 class ConversationListView(generics.ListAPIView):
@@ -21,16 +24,16 @@ class ConversationListView(generics.ListAPIView):
         user = self.request.user
         queryset = user.conversations.all().order_by('-updated_at')
         
-        # 0. Exclude Blocked Users (Hide chats with people I blocked)
-        if hasattr(user, 'profile'):
-            blocked_users = user.profile.blocked_users.all()
-            if blocked_users.exists():
-                queryset = queryset.exclude(participants__in=blocked_users)
+        # 0. Exclude Blocked Users (Hide chats with people I blocked; ids come from the cached block graph)
+        queryset = block_service.exclude_blocked(queryset, user, field='participants__id', both_ways=False)
 
-        # 1. Critical: Filter by Recipient ID (Fixes Chat Bleed)
+        # 1. Critical: Filter by Recipient ID (Fixes Chat Bleed) - the 1:1 chat via its pair key
         recipient_id = self.request.query_params.get('recipient_id')
         if recipient_id:
-             queryset = queryset.filter(participants__id=recipient_id)
+             try:
+                 queryset = queryset.filter(dm_key=chat_services.dm_key(user, recipient_id))
+             except ValueError:
+                 queryset = queryset.none()
 
         # 2. Search
         search = self.request.query_params.get('search')
@@ -45,14 +48,31 @@ class ConversationListView(generics.ListAPIView):
         if filter_type == 'unread':
              # Use Q to find conversations with at least one message that is Unread AND Not from me.
              # The previous .exclude(messages__sender=user) removed conversations if I ever sent a message.
-             queryset = queryset.filter(
-                 Q(messages__is_read=False) & ~Q(messages__sender=user)
-             ).distinct()
+             # Unread = from someone else and past my read cursor
+             queryset = queryset.filter(chat_services.has_unread(user))
         elif filter_type == 'favorites':
              if hasattr(user, 'profile'):
                  queryset = queryset.filter(participants__in=user.profile.favorites.all()).distinct()
         
-        return queryset
+        return queryset.annotate(
+            unread_for_user=chat_services.unread_count_subquery(user),
+            last_message_id=chat_services.last_message_subquery(),
+        ).prefetch_related(Prefetch('participants', queryset=User.objects.select_related('profile')))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        conversations = list(page if page is not None else queryset)
+
+        # Last messages and read state for the whole page, not per conversation
+        ids = [conversation.id for conversation in conversations]
+        context = self.get_serializer_context()
+        context['read_state'] = chat_services.read_states(request.user, ids)
+        context['last_messages'] = chat_services.messages_by_id(c.last_message_id for c in conversations)
+        serializer = self.get_serializer_class()(conversations, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
 # 2. Get messages for a specific conversation
 # 2. Get messages for a specific conversation
@@ -90,40 +110,79 @@ class MessageListView(generics.ListAPIView):
         messages = messages.order_by('created_at')
 
         # 2. MARK AS READ (Fix for Live Count)
-        # Always mark incoming messages as read so the UI badge clears.
-        # Privacy (hiding read status from sender) is now handled in the Serializer.
-        messages.exclude(sender=self.request.user).update(is_read=True)
+        # Move my read cursor up to the newest message so the UI badge clears:
+        # one upsert, and no write at all when polling finds nothing new.
+        # Privacy (hiding read status from sender) is handled in the Serializer.
+        user = self.request.user
+        latest_id = Message.objects.filter(conversation__id=conversation_id).order_by('-id').values_list('id', flat=True).first()
+        my_read_upto = chat_services.read_cursor(user, conversation_id)
+        chat_services.mark_read(user, conversation_id, latest_id, current=my_read_upto)
+        self.my_read_upto = max(my_read_upto, latest_id or 0)
 
         return messages
 
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
-        # Inject Partner Privacy Settings for Serializer to mask 'is_read'
-        try:
+        # Inject my read cursor + the partners' receipt watermark for the Serializer's 'is_read'
+        my_read_upto = getattr(self, 'my_read_upto', None)
+        if my_read_upto is not None:
             conversation_id = self.kwargs['pk']
-            # Optimization: We could fetch this cleaner, but this is safe
-            from .models import Conversation
-            c = Conversation.objects.only('id').get(id=conversation_id)
-            # Find the "Other" person
-            others = c.participants.exclude(id=self.request.user.id)
-            if others.exists():
-                partner = others.first()
-                if hasattr(partner, 'profile'):
-                    ctx['partner_read_receipts'] = partner.profile.read_receipts_enabled
-        except Exception:
-            pass # Default to True (or None) if lookup fails
-            
+            ctx['read_state'] = {
+                conversation_id: (my_read_upto, chat_services.receipt_read_upto(conversation_id, self.request.user)),
+            }
+
         return ctx
 
+# 2b. Older messages moved to cold storage (chat/archive.py)
+class ArchivedMessageListView(APIView):
+    """
+    GET without params lists the archived months (newest first); with
+    ?month=YYYY-MM returns that month's messages in the MessageSerializer format.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        from django.db.models import Sum
+        from datetime import datetime
+        from .archive import archived_messages
+        from .models import ConversationClearStatus
+
+        conversation = get_object_or_404(Conversation, id=pk)
+        if not conversation.is_public and request.user not in conversation.participants.all() and not request.user.is_staff:
+            return Response({"error": "You are not a participant"}, status=403)
+
+        month = request.query_params.get('month')
+        if not month:
+            months = (
+                conversation.message_archives.values('month')
+                .annotate(message_count=Sum('message_count'))
+                .order_by('-month')
+            )
+            return Response([
+                {'month': f"{row['month']:%Y-%m}", 'message_count': row['message_count']}
+                for row in months
+            ])
+
+        try:
+            month = datetime.strptime(month, '%Y-%m').date()
+        except ValueError:
+            return Response({"error": "month must be YYYY-MM"}, status=400)
+
+        clear_status = ConversationClearStatus.objects.filter(
+            user=request.user, conversation=conversation
+        ).last()
+        messages = archived_messages(
+            conversation, month, since=clear_status.cleared_at if clear_status else None
+        )
+        serializer = MessageSerializer(messages, many=True, context={'request': request})
+        return Response(serializer.data)
+
 class UnreadCountView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        # Count messages sent to ME that are NOT read
-        count = Message.objects.filter(
-            conversation__participants=request.user, 
-            is_read=False
-        ).exclude(sender=request.user).count()
+        # Count messages sent to ME that are past my read cursors
+        count = chat_services.unread_messages(request.user).count()
 
         return Response({"unread_count": count})
 
@@ -138,8 +197,16 @@ class SendMessageView(APIView):
         conversation_id = request.data.get('conversation_id')
         
         # New: Handle Attachment
+        # Either a multipart file, or the upload_token of a direct-to-storage upload
         attachment = request.FILES.get('attachment')
         message_type = request.data.get('message_type', 'text')
+        attachment_upload = request.data.get('attachment_upload')
+        if attachment_upload and not attachment:
+            from core.services.upload_service import UploadError, confirm_upload
+            try:
+                attachment = confirm_upload(request.user, attachment_upload, 'chat_attachment')
+            except UploadError as e:
+                return Response({"error": str(e)}, status=400)
 
         sender = request.user
 
@@ -149,29 +216,26 @@ class SendMessageView(APIView):
             if not conversation.is_public and sender not in conversation.participants.all():
                  return Response({"error": "You are not a participant"}, status=403)
             
-            # BLOCKING CHECK (For 1-on-1 chats)
-            if not conversation.is_public and conversation.participants.count() == 2:
-                recipient = conversation.participants.exclude(id=sender.id).first()
-                if recipient:
-                    if hasattr(recipient, 'profile') and sender in recipient.profile.blocked_users.all():
-                        return Response({"error": "You cannot send messages to this user."}, status=403)
-                    if hasattr(sender, 'profile') and recipient in sender.profile.blocked_users.all():
-                        return Response({"error": "You have blocked this user. Unblock to send messages."}, status=403)
+            # BLOCKING CHECK (For 1-on-1 chats; the partner comes from the pair key)
+            partner_id = chat_services.dm_partner_id(conversation, sender)
+            if partner_id:
+                if block_service.has_blocked(partner_id, sender):
+                    return Response({"error": "You cannot send messages to this user."}, status=403)
+                if block_service.has_blocked(sender, partner_id):
+                    return Response({"error": "You have blocked this user. Unblock to send messages."}, status=403)
 
         # Scenario B: Starting a new chat with a User ID
         elif recipient_id:
             recipient = get_object_or_404(User, id=recipient_id)
             
             # BLOCKING CHECK
-            if hasattr(recipient, 'profile') and sender in recipient.profile.blocked_users.all():
+            if block_service.has_blocked(recipient, sender):
                 return Response({"error": "You cannot send messages to this user."}, status=403)
-            if hasattr(sender, 'profile') and recipient in sender.profile.blocked_users.all():
+            if block_service.has_blocked(sender, recipient):
                 return Response({"error": "You have blocked this user. Unblock to send messages."}, status=403)
 
-            conversation = Conversation.objects.filter(participants=sender).filter(participants=recipient).first()
-            if not conversation:
-                conversation = Conversation.objects.create()
-                conversation.participants.add(sender, recipient)
+            # One index probe on the pair key; concurrent first messages share one conversation
+            conversation, _ = chat_services.get_or_create_dm(sender, recipient)
         else:
             return Response({"error": "Missing recipient_id or conversation_id"}, status=400)
 
@@ -192,11 +256,15 @@ class SendMessageView(APIView):
         )
 
         conversation.save() # Update timestamp
+        # Sending implies I've read everything up to my own message
+        chat_services.mark_read(sender, conversation.id, msg.id)
         
         # Return serialized data including URL
         
         # 4. SEND PUSH NOTIFICATION
-        from core.services.fcm_service import send_push_notification
+        # Coalesced per (recipient, conversation) / per topic and sent off the
+        # request thread - see core/services/push_service.py
+        from core.services.push_service import queue_chat_push, queue_community_push
         
         # Determine Recipient (In 1-on-1 chat)
         # If public chat, maybe don't notify everyone yet (too noisy)
@@ -231,16 +299,16 @@ class SendMessageView(APIView):
                         "sender_name": sender.username
                     }
                     
-                    send_push_notification(
-                        recipient, 
-                        title, 
-                        body, 
-                        data=data_payload,
-                        tag=str(conversation.id) 
+                    queue_chat_push(
+                        recipient,
+                        conversation.id,
+                        sender.username,
+                        title,
+                        body,
+                        data_payload,
                     )
         
         else:
-            from core.services.fcm_service import send_topic_notification
             display_title = f"Community Chat: {sender.username}"
             
             # Dynamic body based on message type
@@ -264,8 +332,8 @@ class SendMessageView(APIView):
                 "message_id": str(msg.id)
             }
             
-            # Send to 'community_chat' topic
-            send_topic_notification("community_chat", display_title, display_body, data=data_payload)
+            # Send to 'community_chat' topic (throttled to one push per interval)
+            queue_community_push(sender.username, display_title, display_body, data_payload)
 
         return Response(MessageSerializer(msg, context={'request': request}).data, status=201)
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Poll, PollOption, PollVote, QuizQuestion, QuizSubmission
+from .models import Poll, PollOption, PollVote, QuizQuestion, QuizScore, QuizSubmission
 
 class PollOptionInline(admin.TabularInline):
     model = PollOption
@@ -21,5 +21,11 @@ class PollVoteAdmin(admin.ModelAdmin):
 
 @admin.register(QuizSubmission)
 class QuizSubmissionAdmin(admin.ModelAdmin):
-    list_display = ('user', 'quiz_question', 'selected_index', 'created_at')
+    list_display = ('user', 'quiz_question', 'selected_index', 'is_correct', 'created_at')
     list_filter = ('quiz_question',)
+
+@admin.register(QuizScore)
+class QuizScoreAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period', 'score', 'correct_count', 'answered_count', 'best_streak')
+    list_filter = ('period',)
+    search_fields = ('user__username',)
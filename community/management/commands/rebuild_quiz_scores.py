@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from community.scoring import rebuild_scores
+
+
+class Command(BaseCommand):
+    help = 'Re-marks quiz submissions against their questions and recounts every quiz score and leaderboard row'
+
+    def handle(self, *args, **options):
+        rows = rebuild_scores()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} quiz score rows"))
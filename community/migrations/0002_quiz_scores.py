@@ -0,0 +1,99 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+# Copied from community/scoring.py as of this migration, so later changes to
+# the scoring don't change what this migration does.
+POINTS_PER_CORRECT = 10
+STREAK_BONUS = 2
+MAX_STREAK_BONUS = 10
+
+
+def points(streak_before):
+    return POINTS_PER_CORRECT + min(streak_before * STREAK_BONUS, MAX_STREAK_BONUS)
+
+
+def period_keys(when):
+    day = timezone.localdate(when)
+    year, week, _ = day.isocalendar()
+    return {'all': 'all', 'week': f'week:{year}-W{week:02d}', 'month': f'month:{day:%Y-%m}'}
+
+
+def tally(submissions):
+    totals = {}
+    for user_id, created_at, is_correct in submissions:
+        for period_key in period_keys(created_at).values():
+            row = totals.setdefault((user_id, period_key), {
+                'score': 0, 'correct_count': 0, 'answered_count': 0,
+                'current_streak': 0, 'best_streak': 0, 'last_correct_at': None,
+            })
+            row['answered_count'] += 1
+            if is_correct:
+                row['score'] += points(row['current_streak'])
+                row['correct_count'] += 1
+                row['current_streak'] += 1
+                row['best_streak'] = max(row['best_streak'], row['current_streak'])
+                row['last_correct_at'] = created_at
+            else:
+                row['current_streak'] = 0
+    return totals
+
+
+def score_existing_submissions(apps, schema_editor):
+    QuizQuestion = apps.get_model('community', 'QuizQuestion')
+    QuizSubmission = apps.get_model('community', 'QuizSubmission')
+    QuizScore = apps.get_model('community', 'QuizScore')
+
+    correct = QuizQuestion.objects.filter(
+        id=models.OuterRef('quiz_question_id'), correct_index=models.OuterRef('selected_index'),
+    )
+    QuizSubmission.objects.update(is_correct=models.Exists(correct))
+
+    totals = tally(
+        QuizSubmission.objects.order_by('user_id', 'created_at', 'id')
+        .values_list('user_id', 'created_at', 'is_correct')
+        .iterator()
+    )
+    QuizScore.objects.bulk_create(
+        [QuizScore(user_id=user_id, period=period, **row) for (user_id, period), row in totals.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('community', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizsubmission',
+            name='is_correct',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='QuizScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=20)),
+                ('score', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('answered_count', models.IntegerField(default=0)),
+                ('current_streak', models.IntegerField(default=0)),
+                ('best_streak', models.IntegerField(default=0)),
+                ('last_correct_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', '-score', 'last_correct_at'], name='quizscore_board_idx')],
+                'unique_together': {('user', 'period')},
+            },
+        ),
+        migrations.RunPython(score_existing_submissions, migrations.RunPython.noop),
+    ]
@@ -50,7 +50,34 @@ class QuizSubmission(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     quiz_question = models.ForeignKey(QuizQuestion, on_delete=models.CASCADE)
     selected_index = models.IntegerField()
+    is_correct = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('user', 'quiz_question')
+
+
+class QuizScore(models.Model):
+    """
+    Running quiz totals for one user in one period ('all', 'week:2026-W42',
+    'month:2026-10'), updated in place on every submission so leaderboards
+    read the top rows of this table instead of scanning submissions.
+    """
+    user = models.ForeignKey(User, related_name='quiz_scores', on_delete=models.CASCADE)
+    period = models.CharField(max_length=20)
+    score = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    answered_count = models.IntegerField(default=0)
+    current_streak = models.IntegerField(default=0)
+    best_streak = models.IntegerField(default=0)
+    last_correct_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'period')
+        indexes = [
+            models.Index(fields=['period', '-score', 'last_correct_at'], name='quizscore_board_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.period}: {self.score}"
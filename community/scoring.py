@@ -0,0 +1,227 @@
+"""
+Quiz scoring and leaderboards.
+
+Every submission updates the submitter's QuizScore rows - one overall ('all')
+and one for the current ISO week and calendar month - with a single F()
+UPDATE, so scores, answered counts and streaks are never recomputed from
+QuizSubmission. A correct answer is worth POINTS_PER_CORRECT plus a streak
+bonus for each consecutive correct answer before it (capped).
+
+Leaderboards are the top QUIZ_LEADERBOARD_SIZE rows of a period, read through
+the (period, -score) index and cached per period. A submission only drops a
+cached board when it can change it (the user is on it, or now scores at least
+the last place). Names and photos are joined on read so profile edits show up.
+
+rebuild_scores() recounts everything from submissions (e.g. after an admin
+corrects a question's answer); it is the only place that scans them.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from core.services.cache_service import delete_now_and_on_commit
+from core.services.storage_url_service import profile_photo_url
+
+from .models import QuizQuestion, QuizScore, QuizSubmission
+
+POINTS_PER_CORRECT = 10
+STREAK_BONUS = 2
+MAX_STREAK_BONUS = 10
+
+PERIODS = ('all', 'week', 'month')
+LEADERBOARD_CACHE_SECONDS = 5 * 60
+
+BOARD_FIELDS = ('user_id', 'score', 'correct_count', 'answered_count', 'best_streak')
+
+
+def points(streak_before):
+    """Points for a correct answer after `streak_before` correct answers in a row."""
+    return POINTS_PER_CORRECT + min(streak_before * STREAK_BONUS, MAX_STREAK_BONUS)
+
+
+def period_keys(when=None):
+    """{'all': 'all', 'week': 'week:2026-W42', 'month': 'month:2026-10'} for a moment."""
+    day = timezone.localdate(when or timezone.now())
+    year, week, _ = day.isocalendar()
+    return {'all': 'all', 'week': f'week:{year}-W{week:02d}', 'month': f'month:{day:%Y-%m}'}
+
+
+def _board_key(period_key):
+    return f'quiz-leaderboard:{period_key}'
+
+
+def _board_size():
+    return getattr(settings, 'QUIZ_LEADERBOARD_SIZE', 20)
+
+
+def submit_answer(user, quiz, selected_index):
+    """Store the user's answer and score it; None if they already answered."""
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                submission = QuizSubmission.objects.create(
+                    user=user,
+                    quiz_question=quiz,
+                    selected_index=selected_index,
+                    is_correct=selected_index == quiz.correct_index,
+                )
+        except IntegrityError:
+            return None
+        record_submission(submission)
+    return submission
+
+
+def record_submission(submission):
+    """Apply one submission to the user's overall, weekly and monthly rows."""
+    keys = sorted(period_keys(submission.created_at).values())
+    user_id = submission.user_id
+    with transaction.atomic():
+        QuizScore.objects.bulk_create(
+            [QuizScore(user_id=user_id, period=key) for key in keys], ignore_conflicts=True,
+        )
+        rows = QuizScore.objects.filter(user_id=user_id, period__in=keys)
+        if submission.is_correct:
+            # Right-hand F() values are the pre-update ones, as in points()
+            rows.update(
+                score=F('score') + POINTS_PER_CORRECT + Least(F('current_streak') * STREAK_BONUS, Value(MAX_STREAK_BONUS)),
+                correct_count=F('correct_count') + 1,
+                answered_count=F('answered_count') + 1,
+                current_streak=F('current_streak') + 1,
+                best_streak=Greatest(F('best_streak'), F('current_streak') + 1),
+                last_correct_at=submission.created_at,
+                updated_at=timezone.now(),
+            )
+        else:
+            rows.update(answered_count=F('answered_count') + 1, current_streak=0, updated_at=timezone.now())
+        scores = dict(rows.values_list('period', 'score'))
+    _forget_boards_for(user_id, scores)
+
+
+def _forget_boards_for(user_id, scores):
+    size = _board_size()
+    stale = []
+    for period_key, score in scores.items():
+        board = cache.get(_board_key(period_key))
+        if board is None:
+            continue
+        on_board = any(row['user_id'] == user_id for row in board)
+        if on_board or (score > 0 and (len(board) < size or score >= board[-1]['score'])):
+            stale.append(_board_key(period_key))
+    delete_now_and_on_commit(stale)
+
+
+def _top(period_key):
+    board = cache.get(_board_key(period_key))
+    if board is None:
+        board = list(
+            QuizScore.objects.filter(period=period_key, score__gt=0)
+            .order_by('-score', 'last_correct_at', 'user_id')
+            .values(*BOARD_FIELDS)[:_board_size()]
+        )
+        cache.set(_board_key(period_key), board, LEADERBOARD_CACHE_SECONDS)
+    return board
+
+
+def _ranked(board):
+    """Standard competition ranks (1, 2, 2, 4) over a board sorted by score."""
+    ranked = []
+    for position, row in enumerate(board, start=1):
+        if ranked and ranked[-1]['score'] == row['score']:
+            rank = ranked[-1]['rank']
+        else:
+            rank = position
+        ranked.append({'rank': rank, **row})
+    return ranked
+
+
+def _with_members(entries, request=None):
+    users = User.objects.select_related('profile').in_bulk([entry['user_id'] for entry in entries])
+    for entry in entries:
+        member = users.get(entry['user_id'])
+        profile = getattr(member, 'profile', None) if member else None
+        entry['username'] = member.username if member else ''
+        entry['name'] = (member.get_full_name() or member.username) if member else ''
+        entry['photo_url'] = profile_photo_url(profile, request)
+    return entries
+
+
+def leaderboard(period='all', user=None, request=None):
+    """
+    {'period', 'key', 'results': [...], 'me': {...} or None} for the current
+    period. `me` is the user's own row and rank, also when off the board.
+    """
+    period_key = period_keys()[period]
+    results = _ranked(_top(period_key))
+
+    entries = list(results)
+    me = None
+    if user is not None and user.is_authenticated:
+        me = next((entry for entry in results if entry['user_id'] == user.id), None)
+        if me is None:
+            row = QuizScore.objects.filter(user=user, period=period_key).values(*BOARD_FIELDS).first()
+            if row is not None:
+                # Off the board: rank by the (period, -score) index, ties share a rank
+                ahead = QuizScore.objects.filter(period=period_key, score__gt=row['score']).count()
+                me = {'rank': ahead + 1, **row}
+                entries.append(me)
+
+    _with_members(entries, request)
+    return {'period': period, 'key': period_key, 'results': results, 'me': me}
+
+
+def my_quiz_submissions(user, quiz_ids):
+    """quiz_id -> selected_index for the quizzes in `quiz_ids` that `user` answered (one query)."""
+    return dict(
+        QuizSubmission.objects.filter(user=user, quiz_question_id__in=quiz_ids)
+        .values_list('quiz_question_id', 'selected_index')
+    )
+
+
+def tally(submissions):
+    """
+    {(user_id, period_key): totals} from (user_id, created_at, is_correct)
+    tuples ordered by user and time.
+    """
+    totals = {}
+    for user_id, created_at, is_correct in submissions:
+        for period_key in period_keys(created_at).values():
+            row = totals.setdefault((user_id, period_key), {
+                'score': 0, 'correct_count': 0, 'answered_count': 0,
+                'current_streak': 0, 'best_streak': 0, 'last_correct_at': None,
+            })
+            row['answered_count'] += 1
+            if is_correct:
+                row['score'] += points(row['current_streak'])
+                row['correct_count'] += 1
+                row['current_streak'] += 1
+                row['best_streak'] = max(row['best_streak'], row['current_streak'])
+                row['last_correct_at'] = created_at
+            else:
+                row['current_streak'] = 0
+    return totals
+
+
+def rebuild_scores():
+    """Re-mark every submission against its question and recount all score rows."""
+    correct = QuizQuestion.objects.filter(
+        id=OuterRef('quiz_question_id'), correct_index=OuterRef('selected_index'),
+    )
+    QuizSubmission.objects.update(is_correct=Exists(correct))
+
+    totals = tally(
+        QuizSubmission.objects.order_by('user_id', 'created_at', 'id')
+        .values_list('user_id', 'created_at', 'is_correct')
+        .iterator()
+    )
+    with transaction.atomic():
+        QuizScore.objects.all().delete()
+        QuizScore.objects.bulk_create(
+            [QuizScore(user_id=user_id, period=period_key, **row) for (user_id, period_key), row in totals.items()],
+            batch_size=1000,
+        )
+    cache.delete_many([_board_key(period_key) for period_key in period_keys().values()])
+    return len(totals)
@@ -22,12 +22,17 @@ class PollSerializer(serializers.ModelSerializer):
     def get_selected_index(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            vote = PollVote.objects.filter(user=request.user, poll=obj).first()
-            if vote:
+            # The list view passes the page's votes in one batch
+            my_votes = self.context.get('my_votes')
+            if my_votes is not None:
+                option_id = my_votes.get(obj.id)
+            else:
+                option_id = PollVote.objects.filter(user=request.user, poll=obj).values_list('option_id', flat=True).first()
+            if option_id:
                 # Find the index of the voted option in the options list (ordered by id)
-                options = list(obj.options.all().order_by('id'))
+                options = sorted(obj.options.all(), key=lambda opt: opt.id)
                 for i, opt in enumerate(options):
-                    if opt.id == vote.option_id:
+                    if opt.id == option_id:
                         return i
         return None
 
@@ -55,7 +60,8 @@ class PollSerializer(serializers.ModelSerializer):
                     # Update existing option
                     opt = existing_options.pop(opt_id)
                     opt.label = opt_data.get('label', opt.label)
-                    opt.save()
+                    # Never write back vote_count: votes move it with F() concurrently
+                    opt.save(update_fields=['label'])
                 else:
                     # Create new option
                     # Note: we ignore the ID if it's not in existing_options
@@ -82,7 +88,9 @@ class QuizQuestionSerializer(serializers.ModelSerializer):
     def get_selected_index(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            submission = QuizSubmission.objects.filter(user=request.user, quiz_question=obj).first()
-            if submission:
-                return submission.selected_index
+            # The list view passes the page's submissions in one batch
+            my_submissions = self.context.get('my_submissions')
+            if my_submissions is not None:
+                return my_submissions.get(obj.id)
+            return QuizSubmission.objects.filter(user=request.user, quiz_question=obj).values_list('selected_index', flat=True).first()
         return None
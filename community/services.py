@@ -0,0 +1,107 @@
+"""
+Community services.
+
+Poll voting: PollVote is unique per (user, poll) and PollOption.vote_count only
+ever moves by F() updates, so simultaneous votes (everyone opening the app
+after a poll push) can't lose increments. A vote locks just the voter's own
+PollVote row; option rows are touched last and in id order, so transactions
+stay short and never deadlock each other.
+
+Each poll's results (labels + counts) are cached as one snapshot that is
+rebuilt after every committed vote and dropped when an admin edits the poll,
+so clients polling for live results never hit the database. The rebuild only
+reaches other workers through a shared cache; with per-worker caches the
+snapshot lives a few seconds so their results can't drift far behind.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from core.services import cache_service
+
+from .models import Poll, PollOption, PollVote
+
+POLL_RESULTS_CACHE_SECONDS = 10 * 60
+POLL_RESULTS_LOCAL_CACHE_SECONDS = 5  # without a shared cache, see module docstring
+
+
+def _results_key(poll_id):
+    return f'poll-results:{poll_id}'
+
+
+def refresh_poll_results(poll_id):
+    """Rebuild and cache the snapshot; None if the poll doesn't exist."""
+    expires_at = Poll.objects.filter(id=poll_id).values_list('expires_at', flat=True).first()
+    if expires_at is None:
+        return None
+    options = list(PollOption.objects.filter(poll_id=poll_id).order_by('id').values('id', 'label', 'vote_count'))
+    results = {
+        'poll_id': poll_id,
+        'expires_at': expires_at,
+        'total_votes': sum(option['vote_count'] for option in options),
+        'options': [
+            {'id': option['id'], 'label': option['label'], 'votes': option['vote_count']}
+            for option in options
+        ],
+    }
+    timeout = POLL_RESULTS_CACHE_SECONDS if cache_service.is_shared() else POLL_RESULTS_LOCAL_CACHE_SECONDS
+    cache.set(_results_key(poll_id), results, timeout)
+    return results
+
+
+def poll_results(poll_id):
+    """Cached {'poll_id', 'expires_at', 'total_votes', 'options': [{'id', 'label', 'votes'}]}."""
+    return cache.get(_results_key(poll_id)) or refresh_poll_results(poll_id)
+
+
+def forget_poll_results(poll_id):
+    cache.delete(_results_key(poll_id))
+
+
+def cast_vote(user, poll, option):
+    """
+    Record `user`'s vote for `option`, switching an earlier vote if needed.
+    Returns 'created', 'changed' or 'unchanged'.
+    """
+    with transaction.atomic():
+        previous = (
+            PollVote.objects.select_for_update()
+            .filter(user=user, poll=poll)
+            .values_list('option_id', flat=True)
+            .first()
+        )
+        if previous == option.id:
+            return 'unchanged'
+
+        if previous is None:
+            try:
+                with transaction.atomic():
+                    PollVote.objects.create(user=user, poll=poll, option=option)
+            except IntegrityError:
+                # Same user voting from two devices at once; the other request won
+                return 'unchanged'
+            outcome = 'created'
+        else:
+            PollVote.objects.filter(user=user, poll=poll).update(option=option)
+            outcome = 'changed'
+
+        deltas = {option.id: 1}
+        if previous is not None:
+            deltas[previous] = -1
+        for option_id in sorted(deltas):
+            PollOption.objects.filter(id=option_id).update(
+                vote_count=Greatest(F('vote_count') + deltas[option_id], 0)
+            )
+
+        # Drop the stale snapshot now, rebuild it once the vote is committed
+        forget_poll_results(poll.id)
+        transaction.on_commit(lambda: refresh_poll_results(poll.id))
+    return outcome
+
+
+def my_poll_votes(user, poll_ids):
+    """poll_id -> option_id for the polls in `poll_ids` that `user` voted in (one query)."""
+    return dict(
+        PollVote.objects.filter(user=user, poll_id__in=poll_ids).values_list('poll_id', 'option_id')
+    )
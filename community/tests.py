@@ -1,3 +1,184 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .models import Poll, PollOption, PollVote, QuizQuestion, QuizScore
+from .scoring import rebuild_scores
+
+
+@patch('community.signals.send_push_to_users', return_value=0)
+class PollVotingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='voter', email='voter@test.com', password='x')
+        self.client.force_authenticate(user=self.user)
+
+    def _poll(self, question='Best venue?', labels=('Lagos', 'Nairobi')):
+        poll = Poll.objects.create(question=question, expires_at=timezone.now() + timedelta(days=1))
+        options = [PollOption.objects.create(poll=poll, label=label) for label in labels]
+        return poll, options
+
+    def _vote(self, poll, option):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('poll-vote', kwargs={'pk': poll.id}), {'option_id': option.id}, format='json')
+
+    def test_vote_switch_moves_counters_and_refreshes_results(self, _push):
+        poll, (lagos, nairobi) = self._poll()
+        other = User.objects.create_user(username='other', email='other@test.com', password='x')
+        PollVote.objects.create(user=other, poll=poll, option=lagos)
+        PollOption.objects.filter(id=lagos.id).update(vote_count=1)
+
+        response = self._vote(poll, lagos)
+        self.assertEqual([o['votes'] for o in response.data['results']['options']], [2, 0])
+
+        response = self._vote(poll, nairobi)
+        self.assertEqual(response.data['message'], 'Vote recorded successfully')
+        self.assertEqual([o['votes'] for o in response.data['results']['options']], [1, 1])
+        self.assertEqual(PollVote.objects.filter(user=self.user, poll=poll).count(), 1)
+
+        response = self._vote(poll, nairobi)
+        self.assertEqual(response.data['message'], 'Vote already recorded for this option.')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('poll-results', kwargs={'pk': poll.id}))
+        self.assertEqual(response.data['total_votes'], 2)
+
+        # Admin label edit keeps the counts and drops the snapshot
+        nairobi.label = 'Nairobi, Kenya'
+        nairobi.save(update_fields=['label'])
+        response = self.client.get(reverse('poll-results', kwargs={'pk': poll.id}))
+        self.assertEqual(response.data['options'][1], {'id': nairobi.id, 'label': 'Nairobi, Kenya', 'votes': 1})
+
+    def test_poll_list_batches_selected_options(self, _push):
+        polls = [self._poll(question=f'Question {i}', labels=('A', 'B', 'C')) for i in range(4)]
+        for poll, options in polls[:2]:
+            PollVote.objects.create(user=self.user, poll=poll, option=options[2])
+
+        # Polls, their options and my votes
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('poll-list'))
+
+        selected = {p['id']: p['selected_index'] for p in response.data}
+        self.assertEqual(selected[polls[0][0].id], 2)
+        self.assertIsNone(selected[polls[3][0].id])
+
+    def test_expired_poll_rejects_votes(self, _push):
+        poll, (option, _) = self._poll()
+        Poll.objects.filter(id=poll.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        response = self.client.post(reverse('poll-vote', kwargs={'pk': poll.id}), {'option_id': option.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('poll-results', kwargs={'pk': poll.id})).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_results_for_unknown_poll_is_not_found(self, _push):
+        response = self.client.get(reverse('poll-results', kwargs={'pk': 'not-a-number'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_per_worker_results_expire_quickly(self, _push):
+        from community import services as poll_services
+
+        poll, _ = self._poll()
+        with patch('community.services.cache.set') as cache_set:
+            poll_services.refresh_poll_results(poll.id)
+        self.assertEqual(cache_set.call_args.args[2], poll_services.POLL_RESULTS_LOCAL_CACHE_SECONDS)
+
+
+@patch('community.signals.send_push_to_users', return_value=0)
+class QuizScoringTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='quizzer', email='quizzer@test.com', password='x')
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _quiz(self, correct_index=1):
+        return QuizQuestion.objects.create(
+            prompt='Which year?', options=['2019', '2020', '2021'], correct_index=correct_index,
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+
+    def _submit(self, quiz, selected_index, user=None):
+        self.client.force_authenticate(user=user or self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('quiz-submit', kwargs={'pk': quiz.id}), {'selected_index': selected_index}, format='json')
+
+    def _scores(self, user=None):
+        return {row.period.split(':')[0]: row for row in QuizScore.objects.filter(user=user or self.user)}
+
+    def test_submissions_update_scores_and_streaks_in_place(self, _push):
+        quizzes = [self._quiz() for _ in range(3)]
+        self.assertTrue(self._submit(quizzes[0], 1).data['is_correct'])
+        self._submit(quizzes[1], 1)
+        response = self._submit(quizzes[2], 0)
+        self.assertFalse(response.data['is_correct'])
+
+        scores = self._scores()
+        self.assertEqual(set(scores), {'all', 'week', 'month'})
+        overall = scores['all']
+        # 10, then 10 + 2 streak bonus
+        self.assertEqual((overall.score, overall.correct_count, overall.answered_count), (22, 2, 3))
+        self.assertEqual((overall.current_streak, overall.best_streak), (0, 2))
+
+        response = self._submit(quizzes[0], 1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._scores()['all'].answered_count, 3)
+
+        # A full recount agrees with the incremental rows
+        before = {period: (row.score, row.best_streak) for period, row in self._scores().items()}
+        rebuild_scores()
+        self.assertEqual({period: (row.score, row.best_streak) for period, row in self._scores().items()}, before)
+
+    @override_settings(QUIZ_LEADERBOARD_SIZE=2)
+    def test_leaderboard_is_cached_and_ranks_the_caller(self, _push):
+        quizzes = [self._quiz() for _ in range(3)]
+        alice = User.objects.create_user(username='alice', email='alice@test.com', password='x', first_name='Alice')
+        bob = User.objects.create_user(username='bob', email='bob@test.com', password='x')
+        for quiz in quizzes:
+            self._submit(quiz, 1, user=alice)
+        for quiz in quizzes[:2]:
+            self._submit(quiz, 1, user=bob)
+        self._submit(quizzes[0], 1)
+
+        url = reverse('quiz-leaderboard')
+        response = self.client.get(url, {'period': 'week'})
+        self.assertEqual([(e['rank'], e['name'], e['score']) for e in response.data['results']], [(1, 'Alice', 36), (2, 'bob', 22)])
+        self.assertEqual((response.data['me']['rank'], response.data['me']['score']), (3, 10))
+
+        # Board from the cache: members, my row and my rank
+        with self.assertNumQueries(3):
+            self.client.get(url, {'period': 'week'})
+
+        # Below last place: the cached board stays
+        self._submit(self._quiz(correct_index=0), 2)
+        self.assertIsNotNone(cache.get(f"quiz-leaderboard:{response.data['key']}"))
+
+        # Overtaking bob drops it
+        self._submit(quizzes[1], 1)
+        self._submit(quizzes[2], 1)
+        response = self.client.get(url, {'period': 'week'})
+        self.assertEqual([e['username'] for e in response.data['results']], ['alice', 'quizzer'])
+        self.assertEqual(response.data['me']['rank'], 2)
+
+        self.assertEqual(self.client.get(url, {'period': 'year'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_quiz_list_batches_selected_answers(self, _push):
+        quizzes = [self._quiz() for _ in range(4)]
+        self._submit(quizzes[0], 2)
+
+        # Quizzes and my submissions
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('quiz-list'))
+
+        selected = {q['id']: q['selected_index'] for q in response.data}
+        self.assertEqual(selected[quizzes[0].id], 2)
+        self.assertIsNone(selected[quizzes[1].id])
@@ -3,9 +3,11 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.utils import timezone
-from django.db import transaction
-from .models import Poll, PollOption, QuizQuestion, PollVote, QuizSubmission
+from django.db.models import Prefetch
+from .models import Poll, PollOption, QuizQuestion
 from .serializers import PollSerializer, QuizQuestionSerializer
+from . import services as poll_services
+from . import scoring
 
 class PollViewSet(viewsets.ModelViewSet): # Changed from ReadOnlyModelViewSet
     """
@@ -16,11 +18,14 @@ class PollViewSet(viewsets.ModelViewSet): # Changed from ReadOnlyModelViewSet
 
     def get_queryset(self):
         # Admins/Staff should see all polls for management
+        polls = Poll.objects.prefetch_related(
+            Prefetch('options', queryset=PollOption.objects.order_by('id'))
+        ).order_by('-created_at')
         if self.request.user.is_staff:
-            return Poll.objects.all().order_by('-created_at')
+            return polls
             
         # Regular users only see active ones
-        return Poll.objects.filter(expires_at__gt=timezone.now()).order_by('-created_at')
+        return polls.filter(expires_at__gt=timezone.now())
 
     def get_permissions(self):
         """
@@ -33,6 +38,14 @@ class PollViewSet(viewsets.ModelViewSet): # Changed from ReadOnlyModelViewSet
             return [IsAdminUser()]
         return super().get_permissions()
 
+    def list(self, request, *args, **kwargs):
+        # Options prefetched, and the user's votes for the whole page in one query
+        polls = list(self.filter_queryset(self.get_queryset()))
+        context = self.get_serializer_context()
+        context['my_votes'] = poll_services.my_poll_votes(request.user, [poll.id for poll in polls])
+        serializer = self.get_serializer(polls, many=True, context=context)
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post'])
     def vote(self, request, pk=None):
         poll = self.get_object()
@@ -48,32 +61,26 @@ class PollViewSet(viewsets.ModelViewSet): # Changed from ReadOnlyModelViewSet
         try:
             # Ensure the option belongs to the correct poll
             option = PollOption.objects.get(id=option_id, poll=poll)
-        except PollOption.DoesNotExist:
+        except (PollOption.DoesNotExist, ValueError):
             return Response({'error': 'Invalid option_id for this poll'}, status=status.HTTP_400_BAD_REQUEST)
         
-        with transaction.atomic():
-            # Check for existing vote to prevent double-voting (or allow switching)
-            existing_vote = PollVote.objects.filter(user=request.user, poll=poll).first()
-            if existing_vote:
-                if existing_vote.option_id == int(option_id):
-                    return Response({'message': 'Vote already recorded for this option.'}, status=status.HTTP_200_OK)
-                
-                # If they want to change their vote, we must decrement the previous option's counter
-                previous_option = existing_vote.option
-                previous_option.vote_count = max(0, previous_option.vote_count - 1)
-                previous_option.save()
-                
-                existing_vote.option = option
-                existing_vote.save()
-            else:
-                # Create the vote tracking entry
-                PollVote.objects.create(user=request.user, poll=poll, option=option)
-            
-            # Increment the new option's counter
-            option.vote_count += 1
-            option.save()
+        # Upsert on (user, poll) with F() counter updates - see community/services.py
+        outcome = poll_services.cast_vote(request.user, poll, option)
+        if outcome == 'unchanged':
+            return Response({'message': 'Vote already recorded for this option.', 'results': poll_services.poll_results(poll.id)}, status=status.HTTP_200_OK)
             
-        return Response({'message': 'Vote recorded successfully'}, status=status.HTTP_200_OK)
+        return Response({'message': 'Vote recorded successfully', 'results': poll_services.poll_results(poll.id)}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def results(self, request, pk=None):
+        # Live results from the cached snapshot (no queries once warm)
+        try:
+            results = poll_services.poll_results(int(pk))
+        except ValueError:
+            results = None
+        if results is None or (not request.user.is_staff and results['expires_at'] <= timezone.now()):
+            return Response({'error': 'Poll not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(results)
 
 
 class QuizViewSet(viewsets.ModelViewSet): # Changed from ReadOnlyModelViewSet
@@ -101,6 +108,14 @@ class QuizViewSet(viewsets.ModelViewSet): # Changed from ReadOnlyModelViewSet
             return [IsAdminUser()]
         return super().get_permissions()
 
+    def list(self, request, *args, **kwargs):
+        # The user's answers for the whole page in one query
+        quizzes = list(self.filter_queryset(self.get_queryset()))
+        context = self.get_serializer_context()
+        context['my_submissions'] = scoring.my_quiz_submissions(request.user, [quiz.id for quiz in quizzes])
+        serializer = self.get_serializer(quizzes, many=True, context=context)
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post'])
     def submit(self, request, pk=None):
         quiz = self.get_object()
@@ -112,15 +127,23 @@ class QuizViewSet(viewsets.ModelViewSet): # Changed from ReadOnlyModelViewSet
         selected_index = request.data.get('selected_index')
         if selected_index is None:
             return Response({'error': 'selected_index is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            selected_index = int(selected_index)
+        except (TypeError, ValueError):
+            return Response({'error': 'selected_index must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Quizzes should be one-time only as per user requirements
-        if QuizSubmission.objects.filter(user=request.user, quiz_question=quiz).exists():
+        # (unique (user, quiz) row; scores update in place - see community/scoring.py)
+        submission = scoring.submit_answer(request.user, quiz, selected_index)
+        if submission is None:
             return Response({'error': 'You have already submitted an answer for this quiz.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        QuizSubmission.objects.create(
-            user=request.user,
-            quiz_question=quiz,
-            selected_index=int(selected_index)
-        )
-        
-        return Response({'message': 'Submission successful'}, status=status.HTTP_200_OK)
+        return Response({'message': 'Submission successful', 'is_correct': submission.is_correct}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def leaderboard(self, request):
+        # Cached top-N for all time / this week / this month, plus the caller's own rank
+        period = request.query_params.get('period', 'all')
+        if period not in scoring.PERIODS:
+            return Response({'error': f"period must be one of: {', '.join(scoring.PERIODS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(scoring.leaderboard(period, user=request.user, request=request))
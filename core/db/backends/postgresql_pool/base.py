@@ -0,0 +1,129 @@
+"""
+PostgreSQL backend that borrows connections from an in-process psycopg_pool
+instead of opening a new one per request / per CONN_MAX_AGE window.
+
+Enabled from settings.py via DB_POOL_ENABLED. Pool sizing lives in
+DATABASES[alias]['OPTIONS']['pool'] (same shape Django 5.1 later adopted), e.g.
+    {'min_size': 1, 'max_size': 4, 'timeout': 10, 'max_idle': 300, 'max_lifetime': 1800}
+
+Django "closing" a connection hands it back to the pool; the pool rolls back
+anything left open and health-checks it before the next checkout.
+
+Pool stats are exposed as ffig_db_pool_<alias>_* gauges. They describe the
+pool of the worker that answers the /metrics scrape only; they are not summed
+across workers in multiprocess mode.
+"""
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base as postgresql_base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+from django.utils.asyncio import async_unsafe
+
+from core.services.metrics_service import register_gauges
+
+from .creation import DatabaseCreation
+
+# One pool per (process, alias, database). Keyed by pid so a pool opened before
+# a fork (e.g. gunicorn --preload) is never shared with a child process.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def close_pools(alias=None):
+    """Close every pool owned by this process (optionally only for one alias)."""
+    with _pools_lock:
+        for key in list(_pools):
+            pid, pool_alias, _dbname = key
+            if pid == os.getpid() and (alias is None or pool_alias == alias):
+                _pools.pop(key).close()
+
+
+class DatabaseWrapper(postgresql_base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        if not is_psycopg3:
+            raise ImproperlyConfigured('The pooled PostgreSQL backend requires psycopg 3.')
+        super().__init__(*args, **kwargs)
+        # Pool the current connection was borrowed from.
+        self._connection_pool = None
+
+    @property
+    def pool_options(self):
+        return dict(self.settings_dict.get('OPTIONS', {}).get('pool') or {})
+
+    def get_connection_params(self):
+        # 'pool' is backend config, not a libpq parameter. The parent copies
+        # OPTIONS into a fresh dict, so drop it from that copy; settings_dict
+        # is shared between threads and is never modified.
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_pool(self, conn_params):
+        from psycopg_pool import ConnectionPool
+
+        key = (os.getpid(), self.alias, conn_params.get('dbname'))
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = self.pool_options
+                pool = ConnectionPool(
+                    kwargs=conn_params,
+                    min_size=options.get('min_size', 1),
+                    max_size=options.get('max_size', 4),
+                    timeout=options.get('timeout', 10),
+                    max_idle=options.get('max_idle', 300),
+                    max_lifetime=options.get('max_lifetime', 1800),
+                    check=ConnectionPool.check_connection,
+                    name=f'{self.alias}:{conn_params.get("dbname")}',
+                    open=True,
+                )
+                _pools[key] = pool
+                register_gauges(f'db_pool_{self.alias}', pool.get_stats)
+        return pool
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        # Mirrors the parent's isolation-level handling, but checks out a pooled
+        # connection instead of calling Database.connect().
+        options = self.settings_dict['OPTIONS']
+        set_isolation_level = False
+        try:
+            isolation_level_value = options['isolation_level']
+        except KeyError:
+            self.isolation_level = IsolationLevel.READ_COMMITTED
+        else:
+            try:
+                self.isolation_level = IsolationLevel(isolation_level_value)
+                set_isolation_level = True
+            except ValueError:
+                raise ImproperlyConfigured(
+                    f'Invalid transaction isolation level {isolation_level_value} '
+                    f'specified. Use one of the psycopg.IsolationLevel values.'
+                )
+
+        pool = self.get_pool(conn_params)
+        connection = pool.getconn()
+        self._connection_pool = pool
+        if set_isolation_level:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool, self._connection_pool = self._connection_pool, None
+        with self.wrap_database_errors:
+            if pool is None:
+                return self.connection.close()
+            # putconn() rolls back an open transaction and discards broken
+            # connections (or closes it if the pool itself was closed), so
+            # whatever state Django left behind is safe.
+            return pool.putconn(self.connection)
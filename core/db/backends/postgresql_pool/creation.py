@@ -0,0 +1,10 @@
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresDatabaseCreation
+
+
+class DatabaseCreation(PostgresDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would otherwise block DROP DATABASE.
+        from .base import close_pools
+
+        close_pools(self.connection.alias)
+        return super()._destroy_test_db(test_database_name, verbosity)
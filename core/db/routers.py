@@ -0,0 +1,62 @@
+"""
+Primary/replica routing.
+
+Writes always go to the primary ('default'). Reads go to the primary too,
+unless the current request or command opted in with `replica_reads()` - the
+ReplicaRoutingMiddleware does that for the views listed in
+settings.REPLICA_READ_VIEWS. Without a replica configured everything is a no-op.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Alias reads should use right now; None means "let Django decide" (primary).
+_read_alias = ContextVar('ffig_db_read_alias', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None when no replica database exists."""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def use_replica_for_reads():
+    """Route reads in the current context to the replica (if there is one)."""
+    _read_alias.set(replica_alias())
+
+
+def use_primary_for_reads():
+    _read_alias.set(None)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Read from the replica inside the block, e.g. in reporting commands:
+
+        with replica_reads():
+            rows = list(LoginLog.objects.filter(...))
+    """
+    token = _read_alias.set(replica_alias())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated directly.
+        return db == DEFAULT_DB_ALIAS
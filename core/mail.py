@@ -0,0 +1,21 @@
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+
+from core.services.metrics_service import record_outbound_error, track_outbound
+
+
+class InstrumentedSMTPEmailBackend(SMTPEmailBackend):
+    """
+    Stock SMTP backend that reports SES latency and failures to /metrics.
+    Covers every send_mail() call in the project without touching callers.
+    """
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        with track_outbound('smtp', 'send_messages'):
+            sent = super().send_messages(email_messages)
+        # With fail_silently=True the parent swallows SMTP errors and just
+        # reports fewer messages sent.
+        if (sent or 0) < len(email_messages):
+            record_outbound_error('smtp', 'send_messages')
+        return sent
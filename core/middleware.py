@@ -1,11 +1,95 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
 from django.utils import timezone
 from members.models import Profile
+from core.services.metrics_service import observe_request
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class MetricsMiddleware:
+    """
+    Records request latency (per URL name and status) and the number of
+    database queries each request executed. Exposed at /metrics.
+    """
+    sync_capable = True
+    async_capable = True
 
-class UpdateLastSeenMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self._observe(request) as observed:
+            response = self.get_response(request)
+            observed['status_code'] = response.status_code
+            return response
+
+    async def __acall__(self, request):
+        with self._observe(request) as observed:
+            response = await self.get_response(request)
+            observed['status_code'] = response.status_code
+            return response
+
+    @contextmanager
+    def _observe(self, request):
+        observed = {'status_code': 500, 'queries': 0}
+
+        def count_query(execute, sql, params, many, context):
+            observed['queries'] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count_query))
+                yield observed
+        finally:
+            observe_request(
+                request, observed['status_code'], time.perf_counter() - start, observed['queries']
+            )
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise with an async code path. The stock middleware is sync-only,
+    which would force every async view under ASGI back onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class UpdateLastSeenMiddleware(MiddlewareMixin):
+    # MiddlewareMixin runs process_request in a thread under ASGI, so the ORM
+    # work below stays sync while the rest of the stack can be async.
+    def process_request(self, request):
         if request.user.is_authenticated:
             now = timezone.now()
             # Update the profile's last_seen timestamp
@@ -26,22 +110,16 @@ class UpdateLastSeenMiddleware:
                     ip_address=ip,
                     user_agent=f"{user_agent} (Daily Activity)".strip()
                 )
-        
-        response = self.get_response(request)
-        return response
 
 from django.http import JsonResponse
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
-class RequireActiveMembershipMiddleware:
+class RequireActiveMembershipMiddleware(MiddlewareMixin):
     """
     Blocks access to core features if the authenticated user's membership has expired.
     Exception paths like payments, auth, and profile fetching are omitted so users can still renew.
     """
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
+    def process_request(self, request):
         if request.path.startswith('/api/') or request.path.startswith('/auth/'):
             # Allow endpoints that expired users MUST access to renew or log in
             allowed_paths = [
@@ -76,6 +154,67 @@ class RequireActiveMembershipMiddleware:
                 except Exception:
                     # If JWT decoding fails, pass to view to handle standard 401 unauthenticated
                     pass
-                    
-        response = self.get_response(request)
+
+
+from django.core.cache import cache
+from core.db.routers import replica_alias, use_primary_for_reads, use_replica_for_reads
+from core.services.cache_service import is_shared
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_PIN_COOKIE = 'ffig_db_pin'
+
+
+def _request_user_id(request):
+    """User id from the session or, without hitting the database, from the JWT."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    try:
+        auth = JWTAuthentication()
+        header = auth.get_header(request)
+        raw_token = auth.get_raw_token(header) if header else None
+        if raw_token:
+            from rest_framework_simplejwt.settings import api_settings as jwt_settings
+            return auth.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except Exception:
+        pass
+    return None
+
+
+def _primary_pin_key(user_id):
+    return f'db-primary-pin:{user_id}'
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Sends the reads of heavy read-only views (settings.REPLICA_READ_VIEWS) to
+    the replica database. After a user's own successful write they are pinned
+    to the primary for REPLICA_STICKY_SECONDS (cache pin + cookie) so they
+    always read their writes despite replication lag.
+
+    The cache pin only reaches the other workers through a shared cache, and
+    JWT clients don't send the cookie; without a shared cache authenticated
+    reads therefore stay on the primary and only anonymous reads use the replica.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS or not replica_alias():
+            return None
+        if request.resolver_match.url_name not in settings.REPLICA_READ_VIEWS:
+            return None
+        if request.COOKIES.get(PRIMARY_PIN_COOKIE):
+            return None
+        user_id = _request_user_id(request)
+        if user_id is not None and (not is_shared() or cache.get(_primary_pin_key(user_id))):
+            return None
+        use_replica_for_reads()
+        return None
+
+    def process_response(self, request, response):
+        use_primary_for_reads()
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_alias():
+            sticky_seconds = settings.REPLICA_STICKY_SECONDS
+            user_id = _request_user_id(request)
+            if user_id is not None and is_shared():
+                cache.set(_primary_pin_key(user_id), True, sticky_seconds)
+            response.set_cookie(PRIMARY_PIN_COOKIE, '1', max_age=sticky_seconds, httponly=True, samesite='Lax')
         return response
@@ -0,0 +1,101 @@
+"""
+Catalog of downloadable Android APKs for /api/home/download-apk/.
+
+The candidate directories are listed once and the result is kept in memory.
+Each lookup only stats the directories: adding, removing or renaming an APK
+(or a `collectstatic` run) changes a directory mtime, which triggers a rescan.
+"""
+import os
+import re
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+
+APK_CONTENT_TYPE = 'application/vnd.android.package-archive'
+VERSIONED_APK_RE = re.compile(r'^app-v(\d+(?:\.\d+)*)\.apk$')
+
+
+@dataclass(frozen=True)
+class ApkFile:
+    path: str
+    filename: str  # name the client saves it as
+
+
+_lock = threading.Lock()
+_catalog = {'signature': None, 'latest': None}
+
+
+def candidate_sources():
+    """
+    (directory, fallback filename) pairs in priority order. A fallback of None
+    means "newest app-vX.Y.Z.apk in the directory".
+    """
+    base = settings.BASE_DIR
+    web_dir = os.path.join(base, 'mobile_app', 'web')
+    return [
+        # Versioned builds first so the user gets the right filename
+        (web_dir, None),
+        # Generic fallback
+        (web_dir, 'app.apk'),
+        (os.path.join(base, 'ffig_backend', 'static', 'apk'), None),
+        # Where collectstatic moves files
+        (str(settings.STATIC_ROOT), None),
+    ]
+
+
+def _version_key(filename):
+    # app-v1.0.53 sorts after app-v1.0.9
+    return tuple(int(part) for part in VERSIONED_APK_RE.match(filename).group(1).split('.'))
+
+
+def _find_latest(sources):
+    listings = {}
+    for directory, fallback in sources:
+        if directory not in listings:
+            try:
+                listings[directory] = os.listdir(directory)
+            except OSError:
+                listings[directory] = []
+        files = listings[directory]
+
+        if fallback:
+            if fallback in files:
+                return ApkFile(os.path.join(directory, fallback), 'app-latest.apk')
+            continue
+
+        versioned = [f for f in files if VERSIONED_APK_RE.match(f)]
+        if versioned:
+            latest = max(versioned, key=_version_key)
+            return ApkFile(os.path.join(directory, latest), latest)
+    return None
+
+
+def _signature(sources):
+    signature = []
+    for directory in dict.fromkeys(directory for directory, _ in sources):
+        try:
+            signature.append((directory, os.stat(directory).st_mtime_ns))
+        except OSError:
+            signature.append((directory, None))
+    return tuple(signature)
+
+
+def latest_apk():
+    """The APK to serve, or None. Rescans only when a candidate directory changed."""
+    sources = candidate_sources()
+    signature = _signature(sources)
+    if _catalog['signature'] == signature:
+        return _catalog['latest']
+
+    with _lock:
+        if _catalog['signature'] != signature:
+            _catalog['latest'] = _find_latest(sources)
+            _catalog['signature'] = signature
+        return _catalog['latest']
+
+
+def clear_catalog():
+    with _lock:
+        _catalog['signature'] = None
+        _catalog['latest'] = None
@@ -0,0 +1,106 @@
+"""
+Block graph between members.
+
+Profile.blocked_users is a one-way M2M (blocker -> blocked). Chat, the member
+directory, stories and marketing comments all need "is either of these two
+users blocking the other?", which used to load the whole M2M list per check.
+
+Each user's (blocked, blocked_by) id sets are loaded with one query on the
+through table. With a shared cache (settings.SHARED_CACHE) they are cached and
+dropped by an m2m_changed receiver whenever a block is added or removed, for
+the blocker and every affected target (receiver in members/signals.py).
+Per-worker caches are never used: a block made on one worker must apply on
+all of them at once. Checks are then set lookups:
+
+    is_blocked(a, b)          either direction
+    has_blocked(a, b)         a blocked b
+    hidden_ids(user)          everyone user should not see (both directions)
+    exclude_blocked(qs, user) batch filter for querysets
+"""
+from django.core.cache import cache
+from django.db.models import Q
+
+from core.services.cache_service import delete_now_and_on_commit, is_shared
+
+BLOCK_CACHE_SECONDS = 60 * 60
+
+_EMPTY = frozenset()
+
+
+def _key(user_id):
+    return f'block-graph:{user_id}'
+
+
+def _user_id(user):
+    return getattr(user, 'id', user)
+
+
+def _load(user_id):
+    from members.models import Profile
+
+    through = Profile.blocked_users.through
+    blocked, blocked_by = set(), set()
+    rows = through.objects.filter(Q(profile__user_id=user_id) | Q(user_id=user_id))
+    for blocker_id, target_id in rows.values_list('profile__user_id', 'user_id'):
+        if blocker_id == user_id:
+            blocked.add(target_id)
+        if target_id == user_id:
+            blocked_by.add(blocker_id)
+    return frozenset(blocked), frozenset(blocked_by)
+
+
+def _sets(user_id):
+    if user_id is None:
+        return _EMPTY, _EMPTY
+    if not is_shared():
+        return _load(user_id)
+    entry = cache.get(_key(user_id))
+    if entry is None:
+        entry = _load(user_id)
+        cache.set(_key(user_id), entry, BLOCK_CACHE_SECONDS)
+    return entry
+
+
+def blocked_ids(user):
+    """Ids `user` has blocked."""
+    return _sets(_user_id(user))[0]
+
+
+def blocked_by_ids(user):
+    """Ids of users who blocked `user`."""
+    return _sets(_user_id(user))[1]
+
+
+def hidden_ids(user):
+    blocked, blocked_by = _sets(_user_id(user))
+    return blocked | blocked_by
+
+
+def has_blocked(blocker, target):
+    return _user_id(target) in blocked_ids(blocker)
+
+
+def is_blocked(a, b):
+    """True if either user has blocked the other."""
+    return _user_id(b) in hidden_ids(a)
+
+
+def exclude_blocked(queryset, user, field='id', both_ways=True):
+    """
+    queryset without rows whose `field` (a user id lookup, e.g. 'user_id' or
+    'participants__id') points at someone blocked by/blocking `user`.
+    """
+    ids = hidden_ids(user) if both_ways else blocked_ids(user)
+    if not ids:
+        return queryset
+    return queryset.exclude(**{f'{field}__in': ids})
+
+
+def filter_ids(user, user_ids):
+    """The subset of `user_ids` that `user` may interact with."""
+    hidden = hidden_ids(user)
+    return [uid for uid in user_ids if uid not in hidden]
+
+
+def invalidate(user_ids):
+    delete_now_and_on_commit(_key(uid) for uid in user_ids)
@@ -0,0 +1,30 @@
+"""
+Cache helpers.
+
+Without REDIS_URL each gunicorn worker has its own in-memory cache, so an
+entry dropped by one worker can still be served by the others until it
+expires. Code whose correctness depends on every worker agreeing (block
+checks, cross-worker throttles) asks is_shared() first and falls back to the
+database or short lifetimes when it isn't.
+
+Cached read models are invalidated with delete_now_and_on_commit(): deleted
+straight away so the writer's next read misses, and once more after commit in
+case a concurrent request re-cached the old value between the two.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def is_shared():
+    """True when every worker and instance reads the same cache (settings.SHARED_CACHE)."""
+    return getattr(settings, 'SHARED_CACHE', False)
+
+
+def delete_now_and_on_commit(keys):
+    """Delete `keys` from the cache now and again once the current transaction commits."""
+    keys = list(keys)
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,9 +1,13 @@
 import firebase_admin
 from firebase_admin import credentials, messaging
+from firebase_admin import exceptions as firebase_exceptions
 import os
 import json
 import traceback
+from datetime import timedelta
 from django.conf import settings
+from django.utils import timezone
+from core.services.metrics_service import record_outbound_error, track_outbound
 
 # Initialize Firebase Admin
 # Initialize Firebase Admin
@@ -48,86 +52,201 @@ def initialize_firebase():
 from pathlib import Path
 initialize_firebase()
 
-def send_push_notification(user, title, body, data=None, tag=None):
+# FCM accepts at most 500 tokens per multicast request
+MULTICAST_LIMIT = 500
+
+
+def _stale_cutoff():
+    # FCM considers tokens inactive after ~270 days without the app opening
+    return timezone.now() - timedelta(days=getattr(settings, 'FCM_DEVICE_STALE_DAYS', 270))
+
+
+def register_device(user, token, platform='', app_version=''):
     """
-    Send a push notification to a specific user via FCM.
-    :param tag: Android Notification Tag (for grouping/replacing)
+    Upsert a device token for `user` (one statement). A token that was
+    registered to another account (shared phone) moves to this one.
     """
-    if not hasattr(user, 'profile') or not user.profile.fcm_token:
-        # print(f"Skipping notification for {user.username}: No FCM Token")
-        return False
-        
-    try:
-        android_config = None
-        if tag:
-            android_config = messaging.AndroidConfig(
-                notification=messaging.AndroidNotification(tag=tag)
-            )
-
-        apns_config = messaging.APNSConfig(
-            headers={
-                "apns-priority": "10",
-                "apns-push-type": "alert",
-                "apns-topic": "com.femalefoundersinitiative.ffig"  # Ensure it matches your Apple Bundle ID
-            },
-            payload=messaging.APNSPayload(
-                aps=messaging.Aps(
-                    alert=messaging.ApsAlert(
-                        title=title,
-                        body=body,
-                    ),
-                    sound="default",
-                    badge=1,
+    from members.models import FCMDevice, Profile
+
+    if not token:
+        return
+    FCMDevice.objects.bulk_create(
+        [FCMDevice(
+            user=user,
+            token=token,
+            platform=(platform or '').upper()[:10],
+            app_version=(app_version or '')[:20],
+            last_seen=timezone.now(),
+        )],
+        update_conflicts=True,
+        unique_fields=['token'],
+        update_fields=['user', 'platform', 'app_version', 'last_seen'],
+    )
+    # The phone is signed in to this account now: the previous owner's legacy
+    # field must not keep pointing at it
+    Profile.objects.filter(fcm_token=token).exclude(user=user).update(fcm_token=None)
+    # Keep the legacy single-token field pointing at the latest device
+    Profile.objects.filter(user=user).exclude(fcm_token=token).update(fcm_token=token)
+
+
+def unregister_device(user, token):
+    from members.models import FCMDevice, Profile
+
+    FCMDevice.objects.filter(user=user, token=token).delete()
+    Profile.objects.filter(user=user, fcm_token=token).update(fcm_token=None)
+
+
+def active_tokens(user_ids):
+    """
+    user_id -> [token, ...] for devices seen recently. The legacy Profile token
+    is only used for users with no FCMDevice rows at all (never registered
+    since devices were introduced), and never if the token now belongs to a
+    device row (it moved to another account).
+    """
+    from members.models import FCMDevice, Profile
+
+    tokens = {}
+    devices = FCMDevice.objects.filter(user_id__in=user_ids, last_seen__gte=_stale_cutoff())
+    for user_id, token in devices.values_list('user_id', 'token'):
+        tokens.setdefault(user_id, []).append(token)
+    legacy = (
+        Profile.objects.filter(user_id__in=user_ids)
+        .exclude(fcm_token__isnull=True).exclude(fcm_token='')
+        .exclude(user__fcm_devices__isnull=False)
+        .exclude(fcm_token__in=FCMDevice.objects.values('token'))
+    )
+    for user_id, token in legacy.values_list('user_id', 'fcm_token'):
+        tokens.setdefault(user_id, []).append(token)
+    return tokens
+
+
+def _is_dead_token_error(exc):
+    if isinstance(exc, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+        return True
+    # INVALID_ARGUMENT is also used for bad payloads; only drop the token when
+    # FCM says the token itself is malformed.
+    return (
+        isinstance(exc, firebase_exceptions.InvalidArgumentError)
+        and 'registration token' in str(exc).lower()
+    )
+
+
+def prune_dead_tokens(tokens):
+    """Delete tokens FCM reported as dead, in bulk."""
+    from members.models import FCMDevice, Profile
+
+    if not tokens:
+        return
+    FCMDevice.objects.filter(token__in=tokens).delete()
+    Profile.objects.filter(fcm_token__in=tokens).update(fcm_token=None)
+
+
+def _apns_config(title, body):
+    return messaging.APNSConfig(
+        headers={
+            "apns-priority": "10",
+            "apns-push-type": "alert",
+            "apns-topic": "com.femalefoundersinitiative.ffig"  # Ensure it matches your Apple Bundle ID
+        },
+        payload=messaging.APNSPayload(
+            aps=messaging.Aps(
+                alert=messaging.ApsAlert(
+                    title=title,
+                    body=body,
                 ),
+                sound="default",
+                badge=1,
             ),
+        ),
+    )
+
+
+def send_multicast(tokens, title, body, data=None, tag=None):
+    """
+    Send one notification to many device tokens with batched FCM calls
+    (send_each_for_multicast). Dead tokens are pruned. Returns the number of
+    devices that accepted the message.
+    """
+    tokens = list(dict.fromkeys(tokens))
+    if not tokens:
+        return 0
+
+    android_config = None
+    if tag:
+        android_config = messaging.AndroidConfig(
+            notification=messaging.AndroidNotification(tag=tag)
         )
+    apns_config = _apns_config(title, body)
 
-        message = messaging.Message(
+    delivered = 0
+    dead = []
+    for start in range(0, len(tokens), MULTICAST_LIMIT):
+        batch = tokens[start:start + MULTICAST_LIMIT]
+        message = messaging.MulticastMessage(
             notification=messaging.Notification(
                 title=title,
                 body=body,
             ),
             data=data or {},
-            token=user.profile.fcm_token,
+            tokens=batch,
             android=android_config,
             apns=apns_config
         )
-        response = messaging.send(message)
-        # print(f"Successfully sent message to {user.username}: {response}")
-        return True
-    except Exception as e:
-        print(f"⚠️ FCM Notification Failed for {user.username}: {e}")
+        try:
+            with track_outbound('fcm', 'send_multicast'):
+                response = messaging.send_each_for_multicast(message)
+        except Exception as e:
+            print(f"⚠️ FCM Multicast Failed ({len(batch)} devices): {e}")
+            continue
+
+        delivered += response.success_count
+        for token, result in zip(batch, response.responses):
+            if result.success:
+                continue
+            record_outbound_error('fcm', 'send_multicast')
+            if _is_dead_token_error(result.exception):
+                dead.append(token)
+            else:
+                print(f"⚠️ FCM Notification Failed for a device: {result.exception}")
+
+    prune_dead_tokens(dead)
+    return delivered
+
+
+def send_push_notification(user, title, body, data=None, tag=None):
+    """
+    Send a push notification to every active device of a specific user via FCM.
+    :param tag: Android Notification Tag (for grouping/replacing)
+    """
+    tokens = active_tokens([user.id]).get(user.id)
+    if not tokens:
+        # print(f"Skipping notification for {user.username}: No FCM Token")
         return False
-def send_topic_notification(topic, title, body, data=None):
+    return send_multicast(tokens, title, body, data=data, tag=tag) > 0
+
+
+def send_push_to_users(users, title, body, data=None, tag=None):
+    """Same notification to many users' devices in as few FCM calls as possible."""
+    user_ids = [getattr(user, 'id', user) for user in users]
+    tokens = [token for user_tokens in active_tokens(user_ids).values() for token in user_tokens]
+    return send_multicast(tokens, title, body, data=data, tag=tag)
+
+def send_topic_notification(topic, title, body, data=None, tag=None):
     """
     Send a push notification to all users subscribed to a topic.
+    :param tag: Android Notification Tag (a newer push with the same tag replaces the old one)
     """
     try:
         # Optimization: Add APNS & Android config for topic messages
         # ensure they have sound and priority so OS shows them reliably
-        apns_config = messaging.APNSConfig(
-            headers={
-                "apns-priority": "10",
-                "apns-push-type": "alert",
-                "apns-topic": "com.femalefoundersinitiative.ffig"
-            },
-            payload=messaging.APNSPayload(
-                aps=messaging.Aps(
-                    alert=messaging.ApsAlert(
-                        title=title,
-                        body=body,
-                    ),
-                    sound="default",
-                    badge=1,
-                ),
-            ),
-        )
+        apns_config = _apns_config(title, body)
 
         android_config = messaging.AndroidConfig(
             priority='high',
             notification=messaging.AndroidNotification(
                 sound='default',
                 click_action='FLUTTER_NOTIFICATION_CLICK',
+                tag=tag,
             ),
         )
 
@@ -142,7 +261,8 @@ def send_topic_notification(topic, title, body, data=None):
             apns=apns_config,
             android=android_config,
         )
-        response = messaging.send(message)
+        with track_outbound('fcm', 'send_topic'):
+            response = messaging.send(message)
         print(f"✅ Successfully sent topic message to '{topic}': {response}")
         return True
     except Exception as e:
@@ -0,0 +1,187 @@
+"""
+Efficient file serving for /media/ and other downloads (APKs).
+
+- Local files: ETag / Last-Modified validation (304s), single byte-range
+  requests (206) so audio/video can seek and downloads can resume, and
+  optional offload to the front proxy via X-Accel-Redirect (nginx) or
+  X-Sendfile (Apache/lighttpd) so workers never stream the bytes.
+- S3 storage: redirect to a presigned URL memoized by storage_url_service,
+  so repeated requests don't re-sign.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from core.services.storage_url_service import SIGNED_URL_SAFETY_MARGIN, is_s3_storage, storage_url
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(st):
+    return quote_etag(f'{st.st_mtime_ns:x}-{st.st_size:x}')
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _parse_range(header, size):
+    """
+    Return (start, end) for a single satisfiable range, None to serve the whole
+    file (no/unsupported header), or 'unsatisfiable'.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        start, end = max(size - length, 0), size - 1
+    else:
+        return None
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _iter_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _set_common_headers(response, content_type, etag, mtime, filename, as_attachment, cache_control):
+    response['Content-Type'] = content_type
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    if as_attachment:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+
+def _offload_response(path, root):
+    """X-Accel-Redirect / X-Sendfile response, or None if offload isn't configured."""
+    header = getattr(settings, 'MEDIA_OFFLOAD_HEADER', '')
+    if not header:
+        return None
+    response = HttpResponse()
+    if header == 'X-Accel-Redirect':
+        # nginx maps MEDIA_OFFLOAD_PREFIX to the directory as an internal location
+        prefix = settings.MEDIA_OFFLOAD_PREFIX.rstrip('/')
+        relative = os.path.relpath(path, root).replace(os.sep, '/')
+        response[header] = f'{prefix}/{relative}'
+    else:
+        response[header] = path
+    return response
+
+
+def serve_file(request, path, *, root=None, filename=None, as_attachment=False,
+               content_type=None, cache_control=None):
+    """
+    Serve a local file with conditional GET and byte-range support.
+    `path` must already be validated (e.g. with safe_join) by the caller;
+    `root` is only needed for X-Accel-Redirect offloading.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise Http404('File not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('File not found')
+
+    filename = filename or os.path.basename(path)
+    if content_type is None:
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    etag = file_etag(st)
+    mtime = st.st_mtime
+
+    if _not_modified(request, etag, mtime):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        if cache_control:
+            response['Cache-Control'] = cache_control
+        return response
+
+    if root is not None:
+        offloaded = _offload_response(path, root)
+        if offloaded is not None:
+            # The proxy handles Range/conditional headers itself
+            _set_common_headers(offloaded, content_type, etag, mtime, filename, as_attachment, cache_control)
+            return offloaded
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header:
+        # If-Range: only honour the range if the client's copy is still current
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range or if_range == etag:
+            byte_range = _parse_range(range_header, st.st_size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{st.st_size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_range(path, start, length), status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+        response['Content-Length'] = str(length)
+    else:
+        response = FileResponse(open(path, 'rb'))
+        response['Content-Length'] = str(st.st_size)
+
+    _set_common_headers(response, content_type, etag, mtime, filename, as_attachment, cache_control)
+    return response
+
+
+def redirect_to_storage(storage, name):
+    url = storage_url(storage, name)
+    response = HttpResponseRedirect(url)
+    # The cached URL has at least SIGNED_URL_SAFETY_MARGIN left; let clients
+    # reuse the redirect for a fraction of that.
+    response['Cache-Control'] = f'private, max-age={SIGNED_URL_SAFETY_MARGIN // 5}'
+    return response
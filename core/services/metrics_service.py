@@ -0,0 +1,140 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Prometheus metrics shared by the API, push, email and payment code paths.
+# When PROMETHEUS_MULTIPROC_DIR is set (see render_start.sh / gunicorn.conf.py)
+# every gunicorn worker writes its samples to that directory and the /metrics
+# view aggregates them, so a scrape sees the whole server, not one worker.
+
+REQUEST_LATENCY = Histogram(
+    'ffig_http_request_duration_seconds',
+    'Request latency by URL name, method and status code.',
+    ['view', 'method', 'status'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+REQUEST_DB_QUERIES = Histogram(
+    'ffig_http_request_db_queries',
+    'Number of database queries executed per request.',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 500),
+)
+
+OUTBOUND_LATENCY = Histogram(
+    'ffig_outbound_request_duration_seconds',
+    'Latency of calls to external services (FCM, SMTP, Stripe, ...).',
+    ['service', 'operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+OUTBOUND_ERRORS = Counter(
+    'ffig_outbound_errors_total',
+    'Failed calls to external services.',
+    ['service', 'operation'],
+)
+
+# Queue name -> zero-argument callable returning the current depth.
+_queue_depth_sources = {}
+# Name -> zero-argument callable returning {metric_suffix: value} gauges.
+_gauge_sources = {}
+
+
+def view_label(request):
+    """Low-cardinality label for a request: its URL name, or the route pattern."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route or 'unnamed'
+
+
+def observe_request(request, status_code, duration, query_count):
+    view = view_label(request)
+    REQUEST_LATENCY.labels(view, request.method, str(status_code)).observe(duration)
+    REQUEST_DB_QUERIES.labels(view).observe(query_count)
+
+
+@contextmanager
+def track_outbound(service, operation):
+    """
+    Time a call to an external service and count it as an error if it raises.
+    The exception is always re-raised so callers keep their own handling.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OUTBOUND_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        OUTBOUND_LATENCY.labels(service, operation).observe(time.perf_counter() - start)
+
+
+def record_outbound_error(service, operation):
+    """For APIs that report failure through a return value instead of raising."""
+    OUTBOUND_ERRORS.labels(service, operation).inc()
+
+
+def register_queue_depth(name, source):
+    """Expose `source()` as ffig_job_queue_depth{queue=name} at scrape time."""
+    _queue_depth_sources[name] = source
+
+
+def register_gauges(name, source):
+    """Expose every key of the dict returned by `source()` as ffig_<name>_<key>."""
+    _gauge_sources[name] = source
+
+
+class ScrapeTimeCollector:
+    """
+    Values that are cheap to compute on demand (queue depths, pool stats).
+    Collected by the process serving /metrics instead of being written by every
+    worker, so in multiprocess mode they describe that one worker (its queues,
+    its connection pool), not the whole server.
+    """
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            'ffig_job_queue_depth',
+            'Pending jobs per background queue.',
+            labels=['queue'],
+        )
+        for name, source in sorted(_queue_depth_sources.items()):
+            try:
+                depth.add_metric([name], float(source()))
+            except Exception:
+                continue
+        yield depth
+
+        for name, source in sorted(_gauge_sources.items()):
+            try:
+                values = source() or {}
+            except Exception:
+                continue
+            for key, value in sorted(values.items()):
+                yield GaugeMetricFamily(f'ffig_{name}_{key}', f'{name} {key}.', value=float(value))
+
+
+def render_metrics():
+    """Return (payload, content_type) in the Prometheus text format."""
+    scrape_registry = CollectorRegistry()
+    scrape_registry.register(ScrapeTimeCollector())
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.MultiProcessCollector(scrape_registry)
+        payload = generate_latest(scrape_registry)
+    else:
+        payload = generate_latest(REGISTRY) + generate_latest(scrape_registry)
+
+    return payload, CONTENT_TYPE_LATEST
@@ -0,0 +1,267 @@
+"""
+Coalesced push notifications for bursty chat traffic.
+
+Every chat message used to mean one FCM call per recipient, made inside the
+request, and every community message one topic push. Pushes now go through a
+per-process coalescer keyed by (recipient, conversation) or by topic:
+
+- the first notification for a key is sent straight away (from a background
+  thread, so the request doesn't wait on FCM);
+- anything else for that key within the window is held, and one summary
+  ("3 new messages from X") goes out when the window closes, reusing the
+  Android `tag` so it replaces the earlier notification on the device.
+
+So a key gets at most one push per window in each process. Windows come from
+PUSH_COALESCE_WINDOW_SECONDS (chat) and COMMUNITY_PUSH_INTERVAL_SECONDS
+(community topic); 0 sends synchronously without coalescing (used in tests).
+In-app notifications (members.notifications) use the chat window per
+recipient. Held notifications are flushed when the process exits.
+
+The community topic is one key for everybody, so it is throttled across
+workers too: with a shared cache each send first claims the interval with
+cache.add() and a worker that loses holds its summary until the winner's
+interval is over. Without one the interval is multiplied by PUSH_WORKER_COUNT
+(WEB_CONCURRENCY) so the workers of one instance together stay at about one
+push per interval.
+"""
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from core.services import cache_service
+from core.services.metrics_service import register_queue_depth
+
+logger = logging.getLogger(__name__)
+
+COMMUNITY_TOPIC = 'community_chat'
+
+
+@dataclass
+class _Bucket:
+    due: float
+    flush: object  # callable(payload, count, senders)
+    payload: dict
+    count: int = 1
+    senders: dict = field(default_factory=dict)  # name -> None, insertion ordered
+    shared: bool = False  # claim the window in the shared cache before sending
+    window: float = 0
+
+
+class PushCoalescer:
+    def __init__(self):
+        self._buckets = {}
+        self._last_sent = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, key, window, payload, flush, sender_name=None, shared=False):
+        """
+        Queue a notification. `flush(payload, count, senders)` is called with the
+        latest payload once the key's window allows another push (in any worker,
+        if `shared`).
+        """
+        senders = {sender_name: None} if sender_name else {}
+        if window <= 0:
+            self._run_flush(flush, payload, 1, list(senders))
+            return
+
+        with self._cond:
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.count += 1
+                bucket.payload = payload
+                bucket.senders.update(senders)
+                return
+            now = time.monotonic()
+            due = max(now, self._last_sent.get(key, now - window) + window)
+            self._buckets[key] = _Bucket(
+                due=due, flush=flush, payload=payload, senders=senders, shared=shared, window=window,
+            )
+            self._last_sent[key] = due
+            self._ensure_thread()
+            self._cond.notify()
+
+    def pending(self):
+        return len(self._buckets)
+
+    def flush_all(self):
+        """Send everything that is held right now (process exit, tests)."""
+        with self._cond:
+            buckets = list(self._buckets.values())
+            self._buckets.clear()
+        for bucket in buckets:
+            self._run_flush(bucket.flush, bucket.payload, bucket.count, list(bucket.senders))
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name='push-coalescer', daemon=True)
+            self._thread.start()
+
+    def _take_due(self):
+        """Wait for the next due bucket(s) and remove them. Runs with the lock held."""
+        while True:
+            now = time.monotonic()
+            due = [key for key, bucket in self._buckets.items() if bucket.due <= now]
+            if due:
+                # Forget keys that haven't had a push for an hour so _last_sent stays small
+                for key, sent in list(self._last_sent.items()):
+                    if key not in self._buckets and sent < now - 3600:
+                        del self._last_sent[key]
+                return [(key, self._buckets.pop(key)) for key in due]
+            timeout = min((b.due for b in self._buckets.values()), default=now + 60) - now
+            self._cond.wait(timeout=max(timeout, 0.01))
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                buckets = self._take_due()
+            self._send(buckets)
+            close_old_connections()
+
+    def _send(self, buckets):
+        for key, bucket in buckets:
+            wait = _claim_window(key, bucket.window) if bucket.shared else 0
+            if wait:
+                self._hold(key, bucket, wait)
+            else:
+                self._run_flush(bucket.flush, bucket.payload, bucket.count, list(bucket.senders))
+
+    def _hold(self, key, bucket, wait):
+        """Put a bucket back for `wait` seconds, merged with anything queued since."""
+        with self._cond:
+            newer = self._buckets.get(key)
+            if newer:
+                bucket.count += newer.count
+                bucket.payload = newer.payload
+                bucket.senders.update(newer.senders)
+            bucket.due = time.monotonic() + wait
+            self._buckets[key] = bucket
+            self._last_sent[key] = bucket.due
+            self._cond.notify()
+
+    @staticmethod
+    def _run_flush(flush, payload, count, senders):
+        try:
+            flush(payload, count, senders)
+        except Exception:
+            logger.exception('Coalesced push failed')
+
+
+def _claim_window(key, window):
+    """
+    Claim `key`'s window in the shared cache. 0 if claimed, otherwise the
+    seconds until the worker holding it allows another push.
+    """
+    if not cache_service.is_shared():
+        return 0
+    cache_key = 'push:window:' + ':'.join(str(part) for part in key)
+    now = time.time()
+    if cache.add(cache_key, now, timeout=window):
+        return 0
+    sent_at = cache.get(cache_key)
+    return max(sent_at + window - now, 0.05) if sent_at is not None else 0.05
+
+
+coalescer = PushCoalescer()
+register_queue_depth('push_coalescer', coalescer.pending)
+atexit.register(coalescer.flush_all)
+
+
+def _chat_window():
+    return getattr(settings, 'PUSH_COALESCE_WINDOW_SECONDS', 10)
+
+
+def _community_interval():
+    interval = getattr(settings, 'COMMUNITY_PUSH_INTERVAL_SECONDS', 60)
+    if cache_service.is_shared():
+        return interval
+    # No cross-worker claim: space each worker's pushes out by the worker count
+    return interval * max(getattr(settings, 'PUSH_WORKER_COUNT', 1), 1)
+
+
+def _send_chat_summary(payload, count, senders):
+    from django.contrib.auth.models import User
+    from core.services import fcm_service
+
+    recipient = User.objects.select_related('profile').filter(id=payload['recipient_id']).first()
+    if recipient is None:
+        return
+
+    title, body = payload['title'], payload['body']
+    if count > 1:
+        if len(senders) > 1:
+            title = f"{count} new messages"
+            body = f"{count} new messages from {', '.join(senders)}"
+        else:
+            body = f"{count} new messages from {senders[0] if senders else 'a member'}"
+    data = dict(payload['data'], message_count=str(count))
+    fcm_service.send_push_notification(recipient, title, body, data=data, tag=payload['tag'])
+
+
+def _send_community_summary(payload, count, senders):
+    from core.services import fcm_service
+
+    data = dict(payload['data'], message_count=str(count))
+    fcm_service.send_topic_notification(
+        COMMUNITY_TOPIC, payload['title'], payload['body'], data=data, tag=COMMUNITY_TOPIC,
+    )
+
+
+def _send_notification_summary(payload, count, senders):
+    from django.contrib.auth.models import User
+    from core.services import fcm_service
+
+    recipient = User.objects.filter(id=payload['recipient_id']).first()
+    if recipient is None:
+        return
+
+    title, body = payload['title'], payload['body']
+    if count > 1:
+        title, body = f"{count} new notifications", f"{body} (+{count - 1} more)"
+    data = dict(payload['data'], notification_count=str(count))
+    fcm_service.send_push_notification(recipient, title, body, data=data, tag='notifications')
+
+
+def queue_notification_push(recipient_id, title, body, data):
+    """Inbox pushes for one recipient, at most one per window."""
+    coalescer.add(
+        ('notification', recipient_id),
+        _chat_window(),
+        {'recipient_id': recipient_id, 'title': title, 'body': body, 'data': data},
+        _send_notification_summary,
+    )
+
+
+def queue_chat_push(recipient, conversation_id, sender_name, title, body, data):
+    """One push per (recipient, conversation) per window; later ones are summarized."""
+    coalescer.add(
+        ('chat', recipient.id, conversation_id),
+        _chat_window(),
+        {
+            'recipient_id': recipient.id,
+            'title': title,
+            'body': body,
+            'data': data,
+            'tag': str(conversation_id),
+        },
+        _send_chat_summary,
+        sender_name=sender_name,
+    )
+
+
+def queue_community_push(sender_name, title, body, data):
+    """At most one community topic push per interval, carrying the latest preview."""
+    coalescer.add(
+        ('topic', COMMUNITY_TOPIC),
+        _community_interval(),
+        {'title': title, 'body': body, 'data': data},
+        _send_community_summary,
+        sender_name=sender_name,
+        shared=True,
+    )
@@ -0,0 +1,145 @@
+"""
+One place for turning stored files into URLs for API responses.
+
+storage.url() is cheap on local storage but on S3 with querystring auth every
+call computes a fresh signature. A chat page or member list resolves the same
+avatar many times, so URLs are memoized per (storage, name):
+
+- a bounded in-process LRU, checked first;
+- the shared Django cache behind it, so other workers reuse the same signed URL.
+
+Signed URLs are kept for their lifetime minus SIGNED_URL_SAFETY_MARGIN, so a
+client never receives one that is about to expire. Relative URLs (local
+storage) are made absolute with the request, or settings.SITE_URL without one.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+LRU_MAX_ENTRIES = 4096
+
+# Presigned URLs are cached this much shorter than they live
+SIGNED_URL_SAFETY_MARGIN = 300
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def is_s3_storage(storage):
+    try:
+        from storages.backends.s3 import S3Storage
+    except ImportError:
+        return False
+    return isinstance(storage, S3Storage)
+
+
+def _storage_key(storage):
+    # Identifies where URLs point, so differently configured storages never share entries
+    target = (
+        getattr(storage, 'bucket_name', None)
+        or getattr(storage, 'base_url', None)
+        or ''
+    )
+    extra = getattr(storage, 'custom_domain', None) or ''
+    return f'{type(storage).__module__}.{type(storage).__qualname__}:{target}:{extra}'
+
+
+def _signed_ttl(storage):
+    """Seconds a URL from this storage can be reused, or None if it never expires."""
+    if not is_s3_storage(storage) or not getattr(storage, 'querystring_auth', False):
+        return None
+    expire = getattr(storage, 'querystring_expire', 3600)
+    return max(expire - SIGNED_URL_SAFETY_MARGIN, 0)
+
+
+def _lru_get(key):
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        return url
+
+
+def _lru_set(key, url, expires_at):
+    with _lru_lock:
+        _lru[key] = (url, expires_at)
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_MAX_ENTRIES:
+            _lru.popitem(last=False)
+
+
+def clear_url_cache():
+    """Drop the in-process entries (the shared cache expires on its own)."""
+    with _lru_lock:
+        _lru.clear()
+
+
+def storage_url(storage, name):
+    """storage.url(name), memoized as described above."""
+    key = (_storage_key(storage), name)
+    url = _lru_get(key)
+    if url is not None:
+        return url
+
+    ttl = _signed_ttl(storage)
+    if ttl is None:
+        # Unsigned URLs only depend on configuration
+        url = storage.url(name)
+        _lru_set(key, url, None)
+        return url
+    if ttl == 0:
+        return storage.url(name)
+
+    shared_key = 'storage-url:' + hashlib.sha1(f'{key[0]}|{name}'.encode()).hexdigest()
+    cached = cache.get(shared_key)
+    if cached is not None:
+        url, expires_at = cached
+    else:
+        url = storage.url(name)
+        expires_at = time.time() + ttl
+        cache.set(shared_key, (url, expires_at), ttl)
+    _lru_set(key, url, expires_at)
+    return url
+
+
+def url_lifetime(storage):
+    """Seconds a URL from storage_url() stays valid at least; None if it never expires."""
+    return None if _signed_ttl(storage) is None else SIGNED_URL_SAFETY_MARGIN
+
+
+def absolute_url(url, request=None):
+    """Make a storage or legacy URL absolute; external URLs pass through."""
+    if not url:
+        return url
+    if url.startswith(('http://', 'https://')):
+        return url
+    if url.startswith('//'):
+        return f'https:{url}'
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return f"{settings.SITE_URL.rstrip('/')}/{url.lstrip('/')}"
+
+
+def file_url(field_file, request=None):
+    """Absolute URL for a FileField/ImageField value, or None when it is empty."""
+    if not field_file:
+        return None
+    return absolute_url(storage_url(field_file.storage, field_file.name), request)
+
+
+def profile_photo_url(profile, request=None):
+    """Uploaded profile photo, falling back to the external photo_url."""
+    if profile is None:
+        return None
+    if profile.photo:
+        return file_url(profile.photo, request)
+    return profile.photo_url
@@ -0,0 +1,173 @@
+"""
+Two-phase direct uploads.
+
+1. POST /api/uploads/ -> create_upload() hands the client a presigned target:
+   an S3 presigned POST when S3 storage is configured, otherwise a PUT to our
+   own local stand-in endpoint (dev/tests). Either way the file bytes never
+   pass through a gunicorn worker in production.
+2. The client uploads, then sends the returned `upload_token` with the message /
+   story / marketing request. confirm_upload() checks the token and that the
+   object actually landed, and returns the storage key to attach.
+"""
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+
+from core.services.storage_url_service import is_s3_storage
+
+TOKEN_SALT = 'ffig.uploads'
+
+MB = 1024 * 1024
+
+# purpose -> where the object lives (matches the model's upload_to) and limits
+UPLOAD_PURPOSES = {
+    'chat_attachment': {
+        'prefix': 'chat_media/',
+        'max_bytes': 100 * MB,
+        'content_types': ('image/', 'video/', 'audio/', 'application/', 'text/'),
+    },
+    'story_media': {
+        'prefix': 'stories/',
+        'max_bytes': 100 * MB,
+        'content_types': ('image/', 'video/'),
+    },
+    'marketing_image': {
+        'prefix': 'marketing_assets/',
+        'max_bytes': 20 * MB,
+        'content_types': ('image/',),
+    },
+    'marketing_video': {
+        'prefix': 'marketing_videos/',
+        'max_bytes': 200 * MB,
+        'content_types': ('video/',),
+    },
+}
+
+
+class UploadError(Exception):
+    pass
+
+
+def _upload_url_expires():
+    return getattr(settings, 'UPLOAD_URL_EXPIRES', 900)
+
+
+def _confirm_max_age():
+    # The client may upload and only send the message later (e.g. offline).
+    return getattr(settings, 'UPLOAD_CONFIRM_MAX_AGE', 24 * 60 * 60)
+
+
+def _build_key(prefix, filename):
+    name = get_valid_filename(os.path.basename(filename or '')) or 'upload'
+    return f'{prefix}{uuid.uuid4().hex}-{name[-100:]}'
+
+
+def create_upload(user, purpose, filename, content_type, size, request=None):
+    """Validate the upload request and return the presigned target for the client."""
+    config = UPLOAD_PURPOSES.get(purpose)
+    if config is None:
+        raise UploadError(f"Unknown upload purpose '{purpose}'")
+
+    content_type = (content_type or '').lower()
+    if not content_type.startswith(config['content_types']):
+        raise UploadError(f"Content type '{content_type}' is not allowed for {purpose}")
+
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size is required')
+    if size <= 0 or size > config['max_bytes']:
+        raise UploadError(f"File too large (max {config['max_bytes'] // MB} MB)")
+
+    key = _build_key(config['prefix'], filename)
+    expires_in = _upload_url_expires()
+    token = signing.dumps(
+        {'k': key, 'u': user.id, 'p': purpose, 'ct': content_type, 's': size},
+        salt=TOKEN_SALT,
+    )
+    upload = {
+        'upload_token': token,
+        'key': key,
+        'expires_in': expires_in,
+    }
+
+    if is_s3_storage(default_storage):
+        location = getattr(default_storage, 'location', '') or ''
+        object_key = f"{location.rstrip('/')}/{key}" if location else key
+        fields = {'Content-Type': content_type}
+        # Keep the same caching headers django-storages sets on server-side uploads
+        cache_control = (getattr(default_storage, 'object_parameters', None) or {}).get('CacheControl')
+        if cache_control:
+            fields['Cache-Control'] = cache_control
+        presigned = default_storage.bucket.meta.client.generate_presigned_post(
+            Bucket=default_storage.bucket_name,
+            Key=object_key,
+            Fields=fields,
+            Conditions=[{name: value} for name, value in fields.items()] + [
+                ['content-length-range', 1, config['max_bytes']],
+            ],
+            ExpiresIn=expires_in,
+        )
+        upload.update({'method': 'POST', 'url': presigned['url'], 'fields': presigned['fields']})
+    else:
+        # Local stand-in: the same token authorizes a raw-body PUT to our server
+        url = reverse('upload-local-put', kwargs={'token': token})
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        upload.update({'method': 'PUT', 'url': url, 'headers': {'Content-Type': content_type}})
+
+    return upload
+
+
+def load_upload_token(token, max_age=None):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=max_age or _confirm_max_age())
+    except signing.SignatureExpired:
+        raise UploadError('Upload token expired')
+    except signing.BadSignature:
+        raise UploadError('Invalid upload token')
+
+
+def confirm_upload(user, token, purpose):
+    """
+    Check an upload token from `user` for `purpose` and that its object exists
+    within the size limit. Returns the storage key to assign to the file field.
+    """
+    payload = load_upload_token(token)
+    if payload.get('u') != user.id or payload.get('p') != purpose:
+        raise UploadError('Upload token does not match this request')
+
+    key = payload['k']
+    try:
+        stored_size = default_storage.size(key)
+    except Exception:
+        raise UploadError('Upload not found - upload the file before confirming')
+    if stored_size > UPLOAD_PURPOSES[purpose]['max_bytes']:
+        default_storage.delete(key)
+        raise UploadError('Uploaded file exceeds the size limit')
+    return key
+
+
+def store_local_upload(token, stream, content_length):
+    """Local stand-in for the presigned PUT (FileSystemStorage only)."""
+    if is_s3_storage(default_storage):
+        raise UploadError('Direct uploads go to S3')
+
+    payload = load_upload_token(token, max_age=_upload_url_expires())
+    max_bytes = UPLOAD_PURPOSES[payload['p']]['max_bytes']
+    if not content_length or content_length > max_bytes:
+        raise UploadError('Invalid Content-Length')
+    if default_storage.exists(payload['k']):
+        raise UploadError('Upload already completed')
+
+    saved_key = default_storage.save(payload['k'], File(stream, name=payload['k']))
+    if saved_key != payload['k']:
+        default_storage.delete(saved_key)
+        raise UploadError('Upload key collision')
+    return saved_key
@@ -0,0 +1,321 @@
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.services import apk_service, storage_url_service
+
+
+class MetricsEndpointTests(APITestCase):
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_require_token(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_expose_request_latency_by_view(self):
+        self.client.get(reverse('featured-events'))
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('ffig_http_request_duration_seconds_bucket', body)
+        self.assertIn('view="featured-events"', body)
+        self.assertIn('ffig_http_request_db_queries', body)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_metrics_hidden_without_token_in_production(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PooledPostgresBackendTests(SimpleTestCase):
+    def test_pool_options_are_not_passed_to_libpq(self):
+        handler = ConnectionHandler({
+            'default': {
+                'ENGINE': 'core.db.backends.postgresql_pool',
+                'NAME': 'ffig',
+                'OPTIONS': {'pool': {'min_size': 1, 'max_size': 2}},
+            }
+        })
+        wrapper = handler['default']
+
+        # Other threads share settings_dict, so the pool config must stay in place throughout
+        from django.db.backends.postgresql.base import DatabaseWrapper
+        original = DatabaseWrapper.get_connection_params
+        seen = []
+
+        def parent(self):
+            seen.append(dict(self.settings_dict['OPTIONS']))
+            return original(self)
+
+        with patch.object(DatabaseWrapper, 'get_connection_params', parent):
+            params = wrapper.get_connection_params()
+
+        self.assertEqual(seen, [{'pool': {'min_size': 1, 'max_size': 2}}])
+        self.assertNotIn('pool', params)
+        self.assertEqual(params['dbname'], 'ffig')
+        self.assertEqual(wrapper.pool_options, {'min_size': 1, 'max_size': 2})
+
+
+@override_settings(REPLICA_READ_VIEWS=['member-list'])
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', email='r@example.com', password='x')
+        self.client.force_authenticate(user=self.user)
+        self.read_aliases = []
+
+    def _record_reads(self):
+        # Record the router's decision but keep querying 'default': the test
+        # replica is a mirror and a second SQLite connection would deadlock
+        # with the test transaction.
+        from core.db.routers import ReplicaRouter
+        original = ReplicaRouter.db_for_read
+
+        def db_for_read(router, model, **hints):
+            self.read_aliases.append(original(router, model, **hints))
+            return None
+        return patch.object(ReplicaRouter, 'db_for_read', db_for_read)
+
+    def test_listed_views_read_from_replica(self):
+        with self._record_reads():
+            response = self.client.get(reverse('member-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('replica', self.read_aliases)
+
+    def test_own_write_pins_user_to_primary(self):
+        self.client.patch(reverse('my-profile'), {'bio': 'Updated'}, format='json')
+
+        with self._record_reads():
+            self.client.get(reverse('member-list'))
+
+        self.assertNotIn('replica', self.read_aliases)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_signed_in_reads_stay_on_primary_without_shared_cache(self):
+        # A JWT client after a write on another worker: no cookie, no visible pin
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        with self._record_reads():
+            response = self.client.get(reverse('member-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('replica', self.read_aliases)
+
+    def test_replica_reads_context_manager(self):
+        from core.db.routers import replica_reads
+
+        with replica_reads():
+            self.assertEqual(User.objects.filter(pk=self.user.pk).db, 'replica')
+        self.assertEqual(User.objects.filter(pk=self.user.pk).db, 'default')
+
+
+class MediaServingTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'chat_media'))
+        self.payload = bytes(range(256)) * 40
+        with open(os.path.join(self.media_root, 'chat_media', 'clip.mp4'), 'wb') as fh:
+            fh.write(self.payload)
+        self.url = reverse('media', kwargs={'path': 'chat_media/clip.mp4'})
+
+    def test_range_request_returns_partial_content(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.payload)}')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[100:200])
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+
+    def test_etag_revalidation_returns_not_modified(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            first = self.client.get(self.url)
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            self.assertEqual(first['Accept-Ranges'], 'bytes')
+            self.assertEqual(int(first['Content-Length']), len(self.payload))
+            first.close()
+
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unsatisfiable_range_and_path_traversal(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.payload)}-')
+            self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+            response = self.client.get('/media/../settings.py')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+            response = self.client.get(reverse('media', kwargs={'path': 'chat_media/missing.mp4'}))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_OFFLOAD_HEADER='X-Accel-Redirect', MEDIA_OFFLOAD_PREFIX='/protected-media/')
+    def test_accel_redirect_offload(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/chat_media/clip.mp4')
+        self.assertEqual(response.content, b'')
+
+
+class ApkCatalogTests(APITestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.apk_dir = os.path.join(self.base_dir, 'ffig_backend', 'static', 'apk')
+        os.makedirs(self.apk_dir)
+        for name in ('app-v1.0.9.apk', 'app-v1.0.53.apk', 'notes.txt'):
+            with open(os.path.join(self.apk_dir, name), 'wb') as fh:
+                fh.write(name.encode() * 10)
+        self.settings_override = override_settings(
+            BASE_DIR=self.base_dir, STATIC_ROOT=os.path.join(self.base_dir, 'staticfiles'),
+        )
+        self.settings_override.enable()
+        apk_service.clear_catalog()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        apk_service.clear_catalog()
+
+    def test_serves_highest_version_with_range_support(self):
+        response = self.client.get(reverse('download-apk'), HTTP_RANGE='bytes=0-3')
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertIn('filename="app-v1.0.53.apk"', response['Content-Disposition'])
+        self.assertEqual(response['Content-Type'], apk_service.APK_CONTENT_TYPE)
+        self.assertEqual(b''.join(response.streaming_content), b'app-')
+
+    def test_catalog_refreshes_when_directory_changes(self):
+        self.assertEqual(apk_service.latest_apk().filename, 'app-v1.0.53.apk')
+
+        with patch('core.services.apk_service._find_latest', wraps=apk_service._find_latest) as scan:
+            apk_service.latest_apk()
+            scan.assert_not_called()
+
+            web_dir = os.path.join(self.base_dir, 'mobile_app', 'web')
+            os.makedirs(web_dir)
+            with open(os.path.join(web_dir, 'app.apk'), 'wb') as fh:
+                fh.write(b'generic')
+
+            self.assertEqual(apk_service.latest_apk().filename, 'app-latest.apk')
+            scan.assert_called_once()
+
+
+class StorageUrlResolverTests(SimpleTestCase):
+    def setUp(self):
+        storage_url_service.clear_url_cache()
+        cache.clear()
+
+    def test_signed_urls_are_memoized_per_process_and_shared(self):
+        from storages.backends.s3 import S3Storage
+
+        storage = S3Storage(
+            bucket_name='ffig-test', access_key='AKIAEXAMPLE', secret_key='secret',
+            region_name='us-east-1', querystring_auth=True, querystring_expire=3600,
+        )
+        with patch.object(S3Storage, 'url', autospec=True, side_effect=lambda self, name: f'https://s3/{name}?sig=1') as sign:
+            first = storage_url_service.storage_url(storage, 'profile_photos/a.jpg')
+            second = storage_url_service.storage_url(storage, 'profile_photos/a.jpg')
+            self.assertEqual(first, second)
+            self.assertEqual(sign.call_count, 1)
+
+            # Another worker: empty LRU, same shared cache
+            storage_url_service.clear_url_cache()
+            self.assertEqual(storage_url_service.storage_url(storage, 'profile_photos/a.jpg'), first)
+            self.assertEqual(sign.call_count, 1)
+
+            storage_url_service.storage_url(storage, 'profile_photos/b.jpg')
+            self.assertEqual(sign.call_count, 2)
+
+    @override_settings(SITE_URL='https://api.example.com', MEDIA_URL='/media/')
+    def test_local_urls_are_absolute(self):
+        from django.core.files.storage import FileSystemStorage
+
+        storage = FileSystemStorage()
+        self.assertEqual(
+            storage_url_service.absolute_url(storage_url_service.storage_url(storage, 'stories/a.mp4')),
+            'https://api.example.com/media/stories/a.mp4',
+        )
+        self.assertEqual(
+            storage_url_service.absolute_url('https://cdn.example.com/x.jpg'),
+            'https://cdn.example.com/x.jpg',
+        )
+
+
+class PushCoalescerTests(SimpleTestCase):
+    def test_burst_is_sent_once_then_summarized(self):
+        from core.services.push_service import PushCoalescer
+
+        sent = []
+        coalescer = PushCoalescer()
+        flush = lambda payload, count, senders: sent.append((payload['body'], count, senders))
+
+        with patch('core.services.push_service.PushCoalescer._ensure_thread'):
+            coalescer.add('k', 30, {'body': 'first'}, flush, sender_name='alice')
+            # Leading push is due immediately
+            coalescer.flush_all()
+            coalescer.add('k', 30, {'body': 'second'}, flush, sender_name='alice')
+            coalescer.add('k', 30, {'body': 'third'}, flush, sender_name='bob')
+            self.assertEqual(coalescer.pending(), 1)
+            self.assertEqual(len(sent), 1)
+
+            coalescer.flush_all()
+
+        self.assertEqual(sent, [('first', 1, ['alice']), ('third', 2, ['alice', 'bob'])])
+
+    def test_shared_window_is_claimed_across_workers(self):
+        from core.services.push_service import PushCoalescer
+
+        cache.clear()
+        sent = []
+        flush = lambda payload, count, senders: sent.append((payload['body'], count))
+        workers = [PushCoalescer(), PushCoalescer()]
+
+        with patch('core.services.push_service.PushCoalescer._ensure_thread'), \
+                override_settings(SHARED_CACHE=True):
+            for worker, body in zip(workers, ('from a', 'from b')):
+                worker.add('topic', 30, {'body': body}, flush, shared=True)
+            for worker in workers:
+                with worker._cond:
+                    due = worker._take_due()
+                worker._send(due)
+
+            # The second worker holds its push until the first one's window ends
+            self.assertEqual(sent, [('from a', 1)])
+            self.assertEqual(workers[1].pending(), 1)
+            self.assertGreater(workers[1]._buckets['topic'].due, time.monotonic() + 25)
+
+        cache.clear()
+
+    def test_chat_summary_text(self):
+        from core.services import push_service
+
+        user = User(id=7, username='bob')
+        with patch.object(User.objects, 'select_related') as select_related, \
+                patch('core.services.fcm_service.send_push_notification') as push:
+            select_related.return_value.filter.return_value.first.return_value = user
+            push_service._send_chat_summary(
+                {'recipient_id': 7, 'title': 'Message from alice', 'body': 'hi', 'data': {'type': 'chat_message'}, 'tag': '3'},
+                3, ['alice'],
+            )
+
+        push.assert_called_once_with(
+            user, 'Message from alice', '3 new messages from alice',
+            data={'type': 'chat_message', 'message_count': '3'}, tag='3',
+        )
@@ -0,0 +1,99 @@
+import hmac
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.services import media_service, upload_service
+from core.services.metrics_service import render_metrics
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+    Protected by METRICS_TOKEN (sent as a Bearer token). Without a token it is
+    only reachable in DEBUG so production never exposes it by accident.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+        provided = auth_header[7:] if auth_header.startswith('Bearer ') else ''
+        if not hmac.compare_digest(provided, token):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    elif not settings.DEBUG:
+        raise Http404
+
+    payload, content_type = render_metrics()
+    return HttpResponse(payload, content_type=content_type)
+
+
+class UploadCreateView(APIView):
+    """
+    Phase 1 of a direct upload: returns where the client should send the file.
+    Body: {purpose, filename, content_type, size}
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            upload = upload_service.create_upload(
+                request.user,
+                request.data.get('purpose'),
+                request.data.get('filename'),
+                request.data.get('content_type'),
+                request.data.get('size'),
+                request=request,
+            )
+        except upload_service.UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def local_upload_put(request, token):
+    """
+    Local stand-in for the S3 presigned URL (FileSystemStorage only). The signed
+    token in the URL is the authorization, exactly like a presigned URL.
+    """
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        upload_service.store_local_upload(token, request, content_length)
+    except (upload_service.UploadError, ValueError) as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+    return HttpResponse(status=204)
+
+
+@require_http_methods(['GET', 'HEAD'])
+def media_view(request, path):
+    """
+    /media/<path>. Local storage: streamed with Range/ETag support (or handed to
+    the proxy via X-Accel-Redirect / X-Sendfile). S3: redirect to a cached
+    presigned URL.
+    """
+    # Chat archives are only served through the chat API; notification archives not at all
+    private_prefixes = (
+        getattr(settings, 'CHAT_ARCHIVE_PREFIX', 'chat_archive/'),
+        getattr(settings, 'NOTIFICATION_ARCHIVE_PREFIX', 'notification_archive/'),
+    )
+    if path.startswith(private_prefixes):
+        raise Http404('File not found')
+
+    if media_service.is_s3_storage(default_storage):
+        return media_service.redirect_to_storage(default_storage, path)
+
+    # Like django.views.static.serve: traversal outside MEDIA_ROOT -> 400
+    full_path = safe_join(settings.MEDIA_ROOT, path)
+    return media_service.serve_file(
+        request,
+        full_path,
+        root=settings.MEDIA_ROOT,
+        cache_control='private, max-age=86400',
+    )
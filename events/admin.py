@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import Event
+from .models import Event, SeatHold
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ('title', 'date', 'location', 'organizer', 'is_active', 'is_featured')
     search_fields = ('title', 'location', 'description')
     list_filter = ('is_active', 'is_featured', 'is_virtual')
+
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ('tier', 'user', 'quantity', 'status', 'expires_at', 'payment_intent_id')
+    list_filter = ('status',)
+    search_fields = ('user__username', 'payment_intent_id')
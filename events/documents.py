@@ -0,0 +1,101 @@
+"""
+Event documents.
+
+EventSerializer nests speakers (with their linked member's photo), agenda,
+FAQs and ticket tiers. All of it changes rarely and is the same for every
+viewer, except the tiers' seat counts and discounted_price, so an event's document is serialized once from a
+fully prefetched queryset and cached under event-doc:<id>. Signals
+(events/signals.py) drop it whenever the event or one of its speakers, agenda
+items, FAQs or tiers is saved or deleted.
+
+Per request only the live seat counts (the reservation ledger, see
+events/reservations.py) and the viewer's membership discount are applied on
+top (for_viewer). Documents are built without a request, so relative URLs are
+made absolute with settings.SITE_URL, and they are cached for less than
+SIGNED_URL_SAFETY_MARGIN so presigned photo URLs inside them stay valid.
+Speaker photos follow profile edits within that time.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from core.services.cache_service import delete_now_and_on_commit
+
+from .models import Event, EventSpeaker
+from .serializers import EventSerializer, discounted_price, member_discount
+
+DOCUMENT_CACHE_SECONDS = 4 * 60
+
+
+def _key(event_id):
+    return f'event-doc:{event_id}'
+
+
+def with_related(queryset):
+    """Everything EventSerializer reads, in a fixed number of queries."""
+    return queryset.prefetch_related(
+        Prefetch('speakers', queryset=EventSpeaker.objects.select_related('user__profile')),
+        'agenda',
+        'faqs',
+        'ticket_tiers',
+    )
+
+
+def event_documents(queryset):
+    """
+    Serialized events of `queryset`, in its order: one query for the ids,
+    then the cached documents, and every miss built in one prefetched pass.
+    """
+    ids = list(queryset.values_list('id', flat=True))
+    cached = cache.get_many([_key(event_id) for event_id in ids])
+    documents = {event_id: cached[_key(event_id)] for event_id in ids if _key(event_id) in cached}
+
+    missing = [event_id for event_id in ids if event_id not in documents]
+    if missing:
+        built = {
+            event.id: EventSerializer(event).data
+            for event in with_related(Event.objects.filter(id__in=missing))
+        }
+        cache.set_many({_key(event_id): data for event_id, data in built.items()}, DOCUMENT_CACHE_SECONDS)
+        documents.update(built)
+    return [documents[event_id] for event_id in ids if event_id in documents]
+
+
+def event_document(event_id):
+    """One event's document, or None if it doesn't exist."""
+    document = cache.get(_key(event_id))
+    if document is not None:
+        return document
+    documents = event_documents(Event.objects.filter(id=event_id))
+    return documents[0] if documents else None
+
+
+def apply_pricing(documents, user):
+    """Set each tier's discounted_price for `user` (once per request, not per tier)."""
+    factor = member_discount(user)
+    for document in documents:
+        for tier in document['ticket_tiers']:
+            tier['discounted_price'] = discounted_price(Decimal(tier['price']), factor)
+    return documents
+
+
+def apply_availability(documents):
+    """Overwrite each tier's cached `available` with the live seat count (one query)."""
+    from .reservations import live_availability
+
+    tiers = [tier for document in documents for tier in document['ticket_tiers']]
+    if tiers:
+        available = live_availability([tier['id'] for tier in tiers])
+        for tier in tiers:
+            tier['available'] = available.get(tier['id'], tier['available'])
+    return documents
+
+
+def for_viewer(documents, user):
+    """The per-request layer over cached documents: live seat counts and the member discount."""
+    return apply_pricing(apply_availability(documents), user)
+
+
+def forget(event_ids):
+    delete_now_and_on_commit(_key(event_id) for event_id in event_ids if event_id)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from events.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Returns the seats of expired checkout holds to their ticket tiers (run every few minutes)'
+
+    def handle(self, *args, **options):
+        seats = release_expired()
+        self.stdout.write(self.style.SUCCESS(f"Released {seats} held seats"))
@@ -108,7 +108,7 @@ class Ticket(models.Model):
     tier = models.ForeignKey(TicketTier, on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='tickets', on_delete=models.CASCADE)
     purchase_date = models.DateTimeField(auto_now_add=True)
-    qr_code_data = models.TextField(blank=True) # Can just be the ID
+    qr_code_data = models.TextField(blank=True) # Signed code (events/ticket_codes.py); older tickets keep legacy strings
     status = models.CharField(max_length=20, default='ACTIVE', choices=[('ACTIVE', 'Active'), ('USED', 'Used'), ('CANCELLED', 'Cancelled')])
     purchase_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     original_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
@@ -121,6 +121,12 @@ class Ticket(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.eventName}"
 
+    def save(self, *args, **kwargs):
+        if not self.qr_code_data:
+            from .ticket_codes import issue
+            self.qr_code_data = issue(self)
+        super().save(*args, **kwargs)
+
     @property
     def eventName(self):
         return self.event.title
@@ -132,3 +138,31 @@ class Ticket(models.Model):
     @property
     def virtualLink(self):
         return self.event.virtual_link
+
+
+class SeatHold(models.Model):
+    """
+    Seats set aside for a checkout in progress (events/reservations.py).
+    TicketTier.available already excludes held seats; a hold is converted into
+    tickets by the payment webhook or released when it expires.
+    """
+    HELD = 'HELD'
+    CONVERTED = 'CONVERTED'
+    RELEASED = 'RELEASED'
+    STATUS_CHOICES = [(HELD, 'Held'), (CONVERTED, 'Converted'), (RELEASED, 'Released')]
+
+    tier = models.ForeignKey(TicketTier, related_name='holds', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='seat_holds', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=HELD)
+    payment_intent_id = models.CharField(max_length=255, blank=True, db_index=True)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='seathold_status_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.tier} for {self.user.username} ({self.status})"
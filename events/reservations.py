@@ -0,0 +1,132 @@
+"""
+Seat reservations for ticket checkout.
+
+TicketTier.available is the ledger: seats that are neither sold nor held.
+Every change to it is a single conditional UPDATE (available >= n), so two
+checkouts can never both take the last seats, without row locks held across
+the Stripe round-trip.
+
+    hold(tier_id, user, n)   when the PaymentIntent is created: takes n seats
+                             for SEAT_HOLD_MINUTES (raises SoldOut)
+    attach_intent(hold, pi)  records the PaymentIntent on the hold
+    convert(hold_id)         on payment success; True exactly once per hold, so
+                             webhook retries don't issue tickets twice
+    release(hold)            checkout failed or abandoned: seats go back
+    release_expired()        the sweeper (release_expired_seat_holds command),
+                             also run for a tier when a hold finds it full
+
+A payment that succeeds after its hold expired still gets its tickets; the
+seats are taken again (never below zero) and the oversell is logged.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import SeatHold, TicketTier
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+
+
+class SoldOut(Exception):
+    def __init__(self, available):
+        super().__init__(f'Only {available} tickets available')
+        self.available = available
+
+
+def _hold_minutes():
+    return getattr(settings, 'SEAT_HOLD_MINUTES', 15)
+
+
+def take(tier_id, quantity):
+    """Atomically take `quantity` seats; False if fewer are available."""
+    return bool(
+        TicketTier.objects.filter(id=tier_id, available__gte=quantity)
+        .update(available=F('available') - quantity)
+    )
+
+
+def give_back(tier_id, quantity):
+    TicketTier.objects.filter(id=tier_id).update(available=F('available') + quantity)
+
+
+def hold(tier_id, user, quantity):
+    """Hold seats for a checkout; raises SoldOut if they aren't available."""
+    with transaction.atomic():
+        # A retried checkout replaces the user's earlier hold on this tier
+        for previous in SeatHold.objects.filter(tier_id=tier_id, user=user, status=SeatHold.HELD):
+            release(previous)
+
+        if not take(tier_id, quantity):
+            # Expired holds may still be sitting on the seats
+            if not (release_expired(tier_id=tier_id) and take(tier_id, quantity)):
+                available = TicketTier.objects.filter(id=tier_id).values_list('available', flat=True).first()
+                raise SoldOut(max(available or 0, 0))
+
+        return SeatHold.objects.create(
+            tier_id=tier_id,
+            user=user,
+            quantity=quantity,
+            expires_at=timezone.now() + timedelta(minutes=_hold_minutes()),
+        )
+
+
+def attach_intent(seat_hold, payment_intent_id):
+    SeatHold.objects.filter(id=seat_hold.id).update(payment_intent_id=payment_intent_id)
+
+
+def release(seat_hold):
+    """Give a hold's seats back; no-op if it was already converted or released."""
+    with transaction.atomic():
+        released = SeatHold.objects.filter(id=seat_hold.id, status=SeatHold.HELD).update(status=SeatHold.RELEASED)
+        if released:
+            give_back(seat_hold.tier_id, seat_hold.quantity)
+    return bool(released)
+
+
+def convert(hold_id):
+    """
+    Mark a paid hold as sold. True if the caller should issue the tickets,
+    False if this hold was already converted (a webhook retry).
+    """
+    with transaction.atomic():
+        seat_hold = SeatHold.objects.select_for_update().filter(id=hold_id).first()
+        if seat_hold is None or seat_hold.status == SeatHold.CONVERTED:
+            return False
+        if seat_hold.status == SeatHold.RELEASED:
+            # Paid after the hold lapsed: the seats were given back, take them again
+            if not take(seat_hold.tier_id, seat_hold.quantity):
+                logger.warning('Seat hold %s paid after expiry; tier %s oversold', seat_hold.id, seat_hold.tier_id)
+                TicketTier.objects.filter(id=seat_hold.tier_id).update(
+                    available=Greatest(F('available') - seat_hold.quantity, 0)
+                )
+        seat_hold.status = SeatHold.CONVERTED
+        seat_hold.save(update_fields=['status'])
+    return True
+
+
+def release_expired(tier_id=None, now=None):
+    """Release holds past their expiry (optionally for one tier); returns seats released."""
+    expired = SeatHold.objects.filter(status=SeatHold.HELD, expires_at__lte=now or timezone.now())
+    if tier_id is not None:
+        expired = expired.filter(tier_id=tier_id)
+
+    seats = 0
+    while True:
+        batch = list(expired.only('id', 'tier_id', 'quantity')[:SWEEP_BATCH_SIZE])
+        if not batch:
+            return seats
+        for seat_hold in batch:
+            if release(seat_hold):
+                seats += seat_hold.quantity
+
+
+def live_availability(tier_ids):
+    """tier_id -> seats that can be bought right now (one query)."""
+    return dict(TicketTier.objects.filter(id__in=tier_ids).values_list('id', 'available'))
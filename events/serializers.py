@@ -1,9 +1,11 @@
 from rest_framework import serializers
 from .models import Event, EventSpeaker, AgendaItem, EventFAQ, TicketTier, Ticket
-from decimal import Decimal
 import os
 from django.utils.text import slugify
 
+from core.services.storage_url_service import file_url
+from payments.services import TIER_TICKET_DISCOUNTS
+
 
 def _share_base_url():
     base = os.environ.get(
@@ -12,6 +14,21 @@ def _share_base_url():
     ).rstrip('/')
     return base
 
+def member_discount(user):
+    """The ticket price factor for a member's tier, or None for no discount."""
+    if user is None or not user.is_authenticated:
+        return None
+    profile = getattr(user, 'profile', None)
+    if not profile:
+        return None
+    return TIER_TICKET_DISCOUNTS.get(profile.tier)
+
+
+def discounted_price(price, factor):
+    if factor is None:
+        return price
+    return round(price * factor, 2)
+
 class EventSpeakerSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -19,12 +36,7 @@ class EventSpeakerSerializer(serializers.ModelSerializer):
         if instance.user and hasattr(instance.user, 'profile'):
             p = instance.user.profile
             if p.photo:
-                request = self.context.get('request')
-                url = p.photo.url
-                if request:
-                    data['photo_url'] = request.build_absolute_uri(url)
-                else:
-                    data['photo_url'] = url
+                data['photo_url'] = file_url(p.photo, self.context.get('request'))
             elif p.photo_url:
                 data['photo_url'] = p.photo_url
         return data
@@ -52,19 +64,7 @@ class TicketTierSerializer(serializers.ModelSerializer):
 
     def get_discounted_price(self, obj):
         request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return obj.price
-            
-        profile = getattr(request.user, 'profile', None)
-        if not profile:
-            return obj.price
-            
-        if profile.tier == 'PREMIUM':
-            return round(obj.price * Decimal('0.80'), 2)
-        elif profile.tier == 'STANDARD':
-            return round(obj.price * Decimal('0.90'), 2)
-            
-        return obj.price
+        return discounted_price(obj.price, member_discount(request.user if request else None))
 
 class TicketSerializer(serializers.ModelSerializer):
     eventName = serializers.ReadOnlyField()
@@ -122,10 +122,7 @@ class AdminTicketSerializer(serializers.ModelSerializer):
         profile = getattr(obj.user, 'profile', None)
         if profile:
             if getattr(profile, 'photo', None):
-                request = self.context.get('request')
-                if request:
-                    return request.build_absolute_uri(profile.photo.url)
-                return profile.photo.url
+                return file_url(profile.photo, self.context.get('request'))
             if getattr(profile, 'photo_url', None):
                 return profile.photo_url
         return None
@@ -145,10 +142,7 @@ class EventSerializer(serializers.ModelSerializer):
 
     def get_image_url(self, obj):
         if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return file_url(obj.image, self.context.get('request'))
 
         url = (obj.image_url or '').strip()
         if not url:
@@ -0,0 +1,360 @@
+"""
+Event share pages (/share/events/<id>/<slug>/).
+
+Link previews are fetched by crawlers and chat apps far more often than by
+people, so the page is rendered once per event version and cached:
+
+- the version is a hash of what the page shows (title, date, location,
+  description, image), taken from the cached event document, so any edit
+  yields a new version and a new cache entry. The image enters the hash by
+  its stable identity: presigned S3 URLs change their signature every time
+  they are re-signed, so signing parameters are left out (stable_image_url);
+- the view sends it (with a digest of the og:image URL, which changes when
+  the card URL is re-signed) as the ETag with a public Cache-Control, so
+  repeat fetches can be answered with 304s. With presigned storage URLs the
+  max-age stays well inside the URL's remaining lifetime.
+
+The og:image is a 1200x630 card (event image, darkened, with title, date and
+location) rendered with Pillow once per version and stored in media storage
+under EVENT_OG_PREFIX/<event id>/<version>.jpg; earlier versions of the card
+are deleted. Which card a version uses is cached, not the HTML: storage URLs
+in the page are resolved (and re-signed when needed, through the memoized
+storage_url) on every request, which is only string formatting. If the card
+can't be built yet (image unreachable, another worker rendering it) the page
+points at the event image, and the view sends it with no-cache and no ETag
+so crawlers come back for the card.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import textwrap
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.html import escape
+from django.utils.text import Truncator, slugify
+
+from core.services.storage_url_service import absolute_url, storage_url, url_lifetime
+
+from .documents import event_document
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_URL = "https://images.unsplash.com/photo-1542744173-8e7e53415bb0"
+DEFAULT_DESCRIPTION = "Discover this event on Female Founders Initiative Global."
+
+PAGE_CACHE_SECONDS = 24 * 60 * 60
+CARD_SIZE = (1200, 630)
+CARD_RENDER_LOCK_SECONDS = 60
+IMAGE_FETCH_TIMEOUT = 5
+IMAGE_FETCH_MAX_BYTES = 10 * 1024 * 1024
+
+
+def share_base_url():
+    return os.environ.get(
+        'PUBLIC_SHARE_BASE_URL',
+        'https://www.femalefoundersinitiative.com',
+    ).rstrip('/')
+
+
+def _og_prefix():
+    return getattr(settings, 'EVENT_OG_PREFIX', 'og/events/')
+
+
+def share_fields(document):
+    """The parts of an event document the share page and card show."""
+    return {
+        'id': document['id'],
+        'title': (document.get('title') or 'Event').strip(),
+        'location': (document.get('location') or '').strip(),
+        'date': str(document.get('date') or ''),
+        'description': (document.get('description') or '').strip(),
+        'image_url': (document.get('image_url') or '').strip() or DEFAULT_IMAGE_URL,
+    }
+
+
+# Query parameters of presigned URLs (S3 SigV4 and SigV2)
+_SIGNING_PARAMS = ('x-amz-', 'signature', 'expires', 'awsaccesskeyid')
+
+
+def stable_image_url(url):
+    """`url` without signing parameters, so a re-signed URL is the same image."""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not k.lower().startswith(_SIGNING_PARAMS)]
+    return parts._replace(query=urlencode(query)).geturl()
+
+
+def share_version(fields):
+    stable = {**fields, 'image_url': stable_image_url(fields['image_url'])}
+    payload = json.dumps(stable, sort_keys=True).encode()
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def _page_key(event_id, version):
+    return f'event-share:{event_id}:{version}'
+
+
+def page_max_age():
+    """Cache lifetime for a share page: SHARE_PAGE_MAX_AGE, capped inside a presigned card URL's lifetime."""
+    max_age = getattr(settings, 'SHARE_PAGE_MAX_AGE', 600)
+    lifetime = url_lifetime(default_storage)
+    if lifetime is not None:
+        # Half of it, so a cached page's og:image still loads when it's followed
+        max_age = min(max_age, lifetime // 2)
+    return max_age
+
+
+def share_page(event_id):
+    """
+    (html, etag) for an event's share page, or None if it doesn't exist. etag
+    is None when the card isn't ready and the page falls back to the event
+    image; that page must not be cached.
+    """
+    document = event_document(event_id)
+    if document is None:
+        return None
+    fields = share_fields(document)
+    version = share_version(fields)
+
+    card = cache.get(_page_key(event_id, version))
+    if card is None:
+        card = og_card(fields, version)
+        if card:
+            cache.set(_page_key(event_id, version), card, PAGE_CACHE_SECONDS)
+    if not card:
+        return render_page(fields, fields['image_url']), None
+    card_url = absolute_url(storage_url(default_storage, card))
+    etag = f'{version}-{hashlib.sha1(card_url.encode()).hexdigest()[:8]}'
+    return render_page(fields, card_url), etag
+
+
+# ==========================================
+# OPEN GRAPH CARD
+# ==========================================
+
+def og_card(fields, version):
+    """Storage name of the card for this version, rendering it first if needed; None if unavailable."""
+    folder = f"{_og_prefix()}{fields['id']}/"
+    name = f'{folder}{version}.jpg'
+    if not default_storage.exists(name):
+        # One worker renders a version; the others serve the plain image meanwhile
+        if not cache.add(f'event-og-lock:{name}', 1, CARD_RENDER_LOCK_SECONDS):
+            return None
+        try:
+            content = render_card(fields, load_event_image(fields))
+            default_storage.save(name, ContentFile(content))
+            _delete_old_cards(folder, name)
+        except Exception:
+            logger.exception('Could not build the share card for event %s', fields['id'])
+            return None
+        finally:
+            cache.delete(f'event-og-lock:{name}')
+    return name
+
+
+def _delete_old_cards(folder, keep):
+    try:
+        _, files = default_storage.listdir(folder)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for filename in files:
+        if f'{folder}{filename}' != keep:
+            default_storage.delete(f'{folder}{filename}')
+
+
+def load_event_image(fields):
+    """The event's uploaded image, else its image URL, as a PIL image; None on failure."""
+    from PIL import Image
+
+    try:
+        image = Event.objects.only('image').get(id=fields['id']).image
+        if image:
+            with image.open('rb') as fh:
+                return Image.open(io.BytesIO(fh.read())).convert('RGB')
+
+        response = requests.get(fields['image_url'], timeout=IMAGE_FETCH_TIMEOUT, stream=True)
+        response.raise_for_status()
+        data = response.raw.read(IMAGE_FETCH_MAX_BYTES + 1, decode_content=True)
+        if len(data) > IMAGE_FETCH_MAX_BYTES:
+            return None
+        return Image.open(io.BytesIO(data)).convert('RGB')
+    except Exception as exc:
+        logger.warning('Could not load the image for event %s: %s', fields['id'], exc)
+        return None
+
+
+def _font(size, bold=False):
+    from PIL import ImageFont
+
+    name = 'DejaVuSans-Bold.ttf' if bold else 'DejaVuSans.ttf'
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def render_card(fields, background=None):
+    """JPEG bytes of the 1200x630 card: background image, shade, title, date and location."""
+    from PIL import Image, ImageDraw, ImageOps
+
+    width, height = CARD_SIZE
+    if background is not None:
+        card = ImageOps.fit(background, CARD_SIZE, method=Image.Resampling.LANCZOS)
+    else:
+        card = Image.new('RGB', CARD_SIZE, '#171b22')
+
+    # Darken towards the bottom so the text stays readable on any image
+    shade = Image.new('L', (1, height))
+    for y in range(height):
+        shade.putpixel((0, y), int(90 + 150 * y / height))
+    card = Image.composite(Image.new('RGB', CARD_SIZE, '#0f1116'), card, shade.resize(CARD_SIZE))
+
+    draw = ImageDraw.Draw(card)
+    margin = 64
+    title_lines = textwrap.wrap(fields['title'], width=30)[:3]
+    meta = ' • '.join(part for part in (fields['date'], fields['location']) if part)
+
+    y = height - margin - 40 - 24 - 72 * len(title_lines)
+    for line in title_lines:
+        draw.text((margin, y), line, font=_font(60, bold=True), fill='#ffffff')
+        y += 72
+    if meta:
+        draw.text((margin, y + 8), meta, font=_font(34), fill='#e7c79a')
+    draw.text((margin, margin), 'Female Founders Initiative Global', font=_font(28, bold=True), fill='#d4af37')
+
+    output = io.BytesIO()
+    card.save(output, format='JPEG', quality=85, optimize=True)
+    return output.getvalue()
+
+
+# ==========================================
+# PAGE
+# ==========================================
+
+def render_page(fields, og_image_url):
+    title = fields['title']
+    location = fields['location']
+    date_value = fields['date']
+
+    raw_description = fields['description'] or DEFAULT_DESCRIPTION
+    date_label = f"Date: {date_value}" if date_value else ""
+    location_label = f"Location: {location}" if location else ""
+    subtitle = " | ".join([x for x in [date_label, location_label] if x])
+    if subtitle:
+        raw_description = f"{raw_description} {subtitle}"
+
+    pretty_slug = slugify(title) or f"event-{fields['id']}"
+    description = Truncator(raw_description).chars(190)
+    share_url = f"{share_base_url()}/share/events/{fields['id']}/{pretty_slug}/"
+
+    safe_title = escape(title)
+    safe_description = escape(description)
+    safe_image_url = escape(fields['image_url'])
+    safe_og_image_url = escape(og_image_url)
+    safe_share_url = escape(share_url)
+    safe_location = escape(location)
+    safe_date = escape(date_value)
+
+    return f"""<!doctype html>
+<html lang="en">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width,initial-scale=1" />
+    <title>{safe_title} | FFIG Event</title>
+    <meta name="description" content="{safe_description}" />
+    <link rel="canonical" href="{safe_share_url}" />
+    <meta property="og:type" content="website" />
+    <meta property="og:site_name" content="Female Founders Initiative Global" />
+    <meta property="og:title" content="{safe_title}" />
+    <meta property="og:description" content="{safe_description}" />
+    <meta property="og:url" content="{safe_share_url}" />
+    <meta property="og:image" content="{safe_og_image_url}" />
+    <meta property="og:image:width" content="{CARD_SIZE[0]}" />
+    <meta property="og:image:height" content="{CARD_SIZE[1]}" />
+    <meta name="twitter:card" content="summary_large_image" />
+    <meta name="twitter:title" content="{safe_title}" />
+    <meta name="twitter:description" content="{safe_description}" />
+    <meta name="twitter:image" content="{safe_og_image_url}" />
+    <style>
+      body {{
+        margin: 0;
+        font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
+        background: #0f1116;
+        color: #f5f5f5;
+      }}
+      .wrap {{
+        min-height: 100vh;
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        padding: 24px;
+      }}
+      .card {{
+        width: 100%;
+        max-width: 680px;
+        background: #171b22;
+        border: 1px solid rgba(255,255,255,0.1);
+        border-radius: 18px;
+        overflow: hidden;
+        box-shadow: 0 16px 50px rgba(0,0,0,0.45);
+      }}
+      .hero {{
+        width: 100%;
+        height: 320px;
+        object-fit: cover;
+        background: #222a35;
+      }}
+      .content {{
+        padding: 18px 20px 22px;
+      }}
+      .title {{
+        margin: 0;
+        font-size: 24px;
+        font-weight: 800;
+        line-height: 1.2;
+      }}
+      .meta {{
+        margin-top: 10px;
+        color: rgba(245,245,245,0.82);
+        font-size: 14px;
+      }}
+      .desc {{
+        margin-top: 12px;
+        color: rgba(245,245,245,0.9);
+        line-height: 1.5;
+      }}
+      .cta {{
+        margin-top: 16px;
+        display: inline-block;
+        padding: 12px 16px;
+        border-radius: 12px;
+        background: #9f5d3f;
+        color: #fff;
+        text-decoration: none;
+        font-weight: 700;
+      }}
+    </style>
+  </head>
+  <body>
+    <div class="wrap">
+      <article class="card">
+        <img class="hero" src="{safe_image_url}" alt="{safe_title}" />
+        <div class="content">
+          <h1 class="title">{safe_title}</h1>
+          <div class="meta">{safe_date}{" • " + safe_location if safe_location else ""}</div>
+          <div class="desc">{safe_description}</div>
+          <a class="cta" href="{safe_share_url}">Open Event Link</a>
+        </div>
+      </article>
+    </div>
+  </body>
+</html>"""
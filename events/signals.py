@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .documents import forget
+from .models import AgendaItem, Event, EventFAQ, EventSpeaker, TicketTier
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def forget_event_document(sender, instance, **kwargs):
+    forget([instance.id])
+
+
+@receiver(post_save, sender=EventSpeaker)
+@receiver(post_delete, sender=EventSpeaker)
+@receiver(post_save, sender=AgendaItem)
+@receiver(post_delete, sender=AgendaItem)
+@receiver(post_save, sender=EventFAQ)
+@receiver(post_delete, sender=EventFAQ)
+@receiver(post_save, sender=TicketTier)
+@receiver(post_delete, sender=TicketTier)
+def forget_parent_event_document(sender, instance, **kwargs):
+    """Speakers, agenda, FAQs and tiers (incl. availability changes) are part of the event document."""
+    forget([instance.event_id])
@@ -1,13 +1,39 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import requests
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APIRequestFactory
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from members.models import Profile
 
-from .models import Event
+from . import documents, ticket_codes
+from .models import AgendaItem, Event, EventFAQ, EventSpeaker, Ticket, TicketTier
 from .serializers import EventSerializer
 
 
 class EventSharePreviewTests(TestCase):
     def setUp(self):
+        cache.clear()
+        # Fresh media dir per test: cards are stored per (event id, version)
+        media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        # Share cards fetch the event image; keep tests offline
+        fetch = patch('events.share.requests.get', side_effect=requests.ConnectionError)
+        self.fetch = fetch.start()
+        self.addCleanup(fetch.stop)
         self.event = Event.objects.create(
             title='Founders Dinner',
             location='Johannesburg',
@@ -64,3 +90,166 @@ class EventSharePreviewTests(TestCase):
             reverse('event-share-preview', kwargs={'pk': self.event.id})
         )
         self.assertEqual(response.status_code, 200)
+
+    def test_share_page_is_cached_per_version_with_generated_card(self):
+        png = io.BytesIO()
+        Image.new('RGB', (800, 400), '#336699').save(png, format='PNG')
+        self.fetch.side_effect = None
+        self.fetch.return_value = MagicMock(raw=MagicMock(read=MagicMock(return_value=png.getvalue())))
+        url = reverse('event-share-preview', kwargs={'pk': self.event.id})
+
+        response = self.client.get(url)
+        body = response.content.decode('utf-8')
+        etag = response['ETag']
+        card = f'og/events/{self.event.id}/{etag.strip(chr(34)).split("-")[0]}.jpg'
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn(f'property="og:image" content="{settings.SITE_URL.rstrip("/")}/media/{card}"', body)
+        self.assertTrue(default_storage.exists(card))
+        with default_storage.open(card) as fh:
+            self.assertEqual(Image.open(fh).size, (1200, 630))
+        self.fetch.assert_called_once()
+
+        # Warm: no queries, no render; conditional requests get a 304
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content.decode('utf-8'), body)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # An edit is a new version: new ETag and card, the old card is removed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.title = 'Founders Dinner 2026'
+            self.event.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Founders Dinner 2026', response.content.decode('utf-8'))
+        self.assertFalse(default_storage.exists(card))
+
+    def test_fallback_page_without_card_is_not_cached(self):
+        # Another worker is still rendering the card
+        with patch('events.share.og_card', return_value=None):
+            response = self.client.get(reverse('event-share-preview', kwargs={'pk': self.event.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('property="og:image" content="https://example.com/event.jpg"', response.content.decode('utf-8'))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+    @override_settings(SHARE_PAGE_MAX_AGE=600)
+    def test_max_age_stays_inside_signed_url_lifetime(self):
+        from core.services.storage_url_service import SIGNED_URL_SAFETY_MARGIN
+        from .share import page_max_age
+
+        self.assertEqual(page_max_age(), 600)
+        with patch('events.share.url_lifetime', return_value=SIGNED_URL_SAFETY_MARGIN):
+            self.assertLess(page_max_age(), SIGNED_URL_SAFETY_MARGIN)
+
+    def test_version_ignores_url_signatures(self):
+        from .share import share_fields, share_version
+
+        def version(image_url):
+            return share_version(share_fields({'id': 1, 'title': 'Gala', 'image_url': image_url}))
+
+        signed = 'https://bucket.s3.amazonaws.com/events/gala.jpg?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Expires=3600&X-Amz-Signature={}'
+        self.assertEqual(version(signed.format('aaa')), version(signed.format('bbb')))
+        self.assertNotEqual(version(signed.format('aaa')), version(signed.replace('gala', 'gala2').format('aaa')))
+        self.assertNotEqual(version('https://example.com/a.jpg?w=800'), version('https://example.com/a.jpg?w=1200'))
+
+    def test_missing_event_is_404(self):
+        response = self.client.get(reverse('event-share-preview', kwargs={'pk': 999999}))
+        self.assertEqual(response.status_code, 404)
+
+
+class EventDocumentCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.speaker_user = User.objects.create_user(username='speaker', email='speaker@test.com', password='x')
+        Profile.objects.filter(user=self.speaker_user).update(photo_url='https://example.com/speaker.jpg')
+        self.events = []
+        for i in range(3):
+            event = Event.objects.create(title=f'Summit {i}', location='Lagos', date=timezone.now().date() + timedelta(days=i + 1))
+            EventSpeaker.objects.create(event=event, user=self.speaker_user, name='Speaker')
+            AgendaItem.objects.create(event=event, start_time='09:00', end_time='10:00', title='Keynote')
+            EventFAQ.objects.create(event=event, question='Parking?', answer='Yes')
+            TicketTier.objects.create(event=event, name='General', price=Decimal('100.00'))
+            self.events.append(event)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_event_list_uses_fixed_queries_and_cached_documents(self):
+        # Ids, events, speakers (+ user, profile), agenda, FAQs, tiers, live seat counts
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('event-list'))
+        self.assertEqual([e['title'] for e in response.data], ['Summit 0', 'Summit 1', 'Summit 2'])
+        self.assertEqual(response.data[0]['speakers'][0]['photo_url'], 'https://example.com/speaker.jpg')
+
+        # Ids and live seat counts
+        with self.assertNumQueries(2):
+            self.client.get(reverse('event-list'))
+
+    def test_discount_is_applied_per_viewer_on_cached_document(self):
+        member = User.objects.create_user(username='premium', email='premium@test.com', password='x')
+        Profile.objects.filter(user=member).update(tier='PREMIUM')
+        url = reverse('event-detail', kwargs={'pk': self.events[0].id})
+
+        self.assertEqual(self.client.get(url).data['ticket_tiers'][0]['discounted_price'], Decimal('100.00'))
+
+        self.client.force_authenticate(user=User.objects.get(pk=member.pk))
+        self.assertEqual(self.client.get(url).data['ticket_tiers'][0]['discounted_price'], Decimal('80.00'))
+
+    def test_related_changes_invalidate_the_document(self):
+        url = reverse('event-detail', kwargs={'pk': self.events[0].id})
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tier = TicketTier.objects.get(event=self.events[0])
+            tier.available = 0
+            tier.save()
+            EventFAQ.objects.filter(event=self.events[0]).delete()
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['ticket_tiers'][0]['available'], 0)
+        self.assertEqual(response.data['faqs'], [])
+        self.assertEqual(self.client.get(reverse('event-detail', kwargs={'pk': 999999})).status_code, 404)
+
+
+class TicketCodeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = Event.objects.create(title='Gala', location='Accra', date=date(2030, 5, 1), end_date=date(2030, 5, 2))
+        self.tier = TicketTier.objects.create(event=self.event, name='VIP', price=Decimal('50.00'))
+        self.user = User.objects.create_user(username='holder', email='holder@test.com', password='x')
+
+    def test_round_trip_and_expiry(self):
+        ticket = Ticket.objects.create(event=self.event, tier=self.tier, user=self.user)
+        signed = ticket_codes.parse(ticket.qr_code_data)
+        self.assertEqual((signed.ticket_id, signed.event_id, signed.tier_id), (ticket.id, self.event.id, self.tier.id))
+        # Valid through the day after the event's last day
+        expires_at = ticket_codes.expiry_for(self.event)
+        self.assertEqual(expires_at.date(), date(2030, 5, 4))
+
+        with self.assertRaises(ticket_codes.ExpiredCode):
+            ticket_codes.check_expiry(self.event, now=expires_at)
+
+    def test_rescheduled_event_keeps_its_codes_valid(self):
+        ticket = Ticket.objects.create(event=self.event, tier=self.tier, user=self.user)
+        later = datetime(2030, 6, 1, 12, tzinfo=dt_timezone.utc)
+        with self.assertRaises(ticket_codes.ExpiredCode):
+            ticket_codes.check_expiry(documents.event_document(self.event.id), now=later)
+
+        self.event.date, self.event.end_date = date(2030, 6, 1), None
+        self.event.save()
+
+        # Same code, the expiry follows the event's new date
+        signed = ticket_codes.parse(ticket.qr_code_data)
+        document = documents.event_document(signed.event_id)
+        self.assertEqual(ticket_codes.check_expiry(document, now=later).date(), date(2030, 6, 3))
+
+    def test_other_keys_and_garbage_are_invalid(self):
+        code = Ticket.objects.create(event=self.event, tier=self.tier, user=self.user).qr_code_data
+        with override_settings(TICKET_SIGNING_KEY='rotated'):
+            with self.assertRaises(ticket_codes.InvalidCode):
+                ticket_codes.parse(code)
+        for garbage in ('FT1', 'FT1!!!!', code[:-4], 'EVENT-1-TIER-2'):
+            with self.assertRaises(ticket_codes.InvalidCode):
+                ticket_codes.parse(garbage)
@@ -0,0 +1,133 @@
+"""
+Signed ticket QR codes.
+
+A ticket's qr_code_data is "FT1" + base64url of
+
+    ticket uuid (16 bytes) | event id (u32) | tier id (u32)
+    + the first 12 bytes of an HMAC-SHA256 over those 24 bytes
+
+(51 characters), signed with TICKET_SIGNING_KEY (SECRET_KEY if unset). A
+scan is checked for format and signature in pure Python, so forged or
+mistyped codes never reach the database. The expiry is not part of the code:
+it follows the event's current dates (expiry_for on the cached event
+document), so rescheduling an event doesn't invalidate its tickets. A valid
+code then claims a use-once marker in the cache and marks the ticket used
+with one conditional UPDATE. The UPDATE stays the authority: without the
+marker (other worker, evicted entry) it still refuses a used ticket, and a
+marker left over for a ticket whose row is ACTIVE again (reset by an admin)
+doesn't block it; repeat scans of a used ticket only read its row.
+
+Codes issued before this format (EVENT-...-PI-..., manual codes, bare ticket
+ids) are still looked up in the database.
+"""
+import base64
+import hmac
+import struct
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+PREFIX = 'FT1'
+_PAYLOAD = struct.Struct('>16sII')
+_SIGNATURE_BYTES = 12
+_SALT = 'events.ticket_codes'
+
+
+class InvalidCode(Exception):
+    """Not a signed ticket code, or tampered with."""
+
+
+class ExpiredCode(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SignedTicket:
+    ticket_id: uuid.UUID
+    event_id: int
+    tier_id: int
+
+
+def _signing_key():
+    return getattr(settings, 'TICKET_SIGNING_KEY', '') or settings.SECRET_KEY
+
+
+def _signature(payload):
+    return salted_hmac(_SALT, payload, secret=_signing_key(), algorithm='sha256').digest()[:_SIGNATURE_BYTES]
+
+
+def is_signed_code(data):
+    return isinstance(data, str) and data.startswith(PREFIX)
+
+
+def expiry_for(event):
+    """
+    Codes stop scanning TICKET_VALID_DAYS_AFTER_EVENT days after the event's
+    last day. `event` is an Event or its (cached) document.
+    """
+    if isinstance(event, dict):
+        last_day = event.get('end_date') or event.get('date')
+    else:
+        last_day = event.end_date or event.date
+    if isinstance(last_day, str):
+        last_day = datetime.strptime(last_day, '%Y-%m-%d').date()
+    days = getattr(settings, 'TICKET_VALID_DAYS_AFTER_EVENT', 1)
+    return datetime.combine(last_day + timedelta(days=days + 1), time.min, tzinfo=dt_timezone.utc)
+
+
+def issue(ticket):
+    """The signed QR payload for a ticket (its event and tier ids must be set)."""
+    payload = _PAYLOAD.pack(ticket.id.bytes, ticket.event_id, ticket.tier_id)
+    token = base64.urlsafe_b64encode(payload + _signature(payload)).rstrip(b'=')
+    return PREFIX + token.decode()
+
+
+def parse(data):
+    """SignedTicket for a valid code; raises InvalidCode. No database access."""
+    if not is_signed_code(data):
+        raise InvalidCode()
+    token = data[len(PREFIX):].strip()
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except (ValueError, TypeError):
+        raise InvalidCode()
+    if len(raw) != _PAYLOAD.size + _SIGNATURE_BYTES:
+        raise InvalidCode()
+
+    payload, signature = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if not hmac.compare_digest(signature, _signature(payload)):
+        raise InvalidCode()
+
+    ticket_bytes, event_id, tier_id = _PAYLOAD.unpack(payload)
+    return SignedTicket(uuid.UUID(bytes=ticket_bytes), event_id, tier_id)
+
+
+def check_expiry(event, now=None):
+    """Raises ExpiredCode once tickets for `event` (Event or document) no longer scan; returns the expiry."""
+    expires_at = expiry_for(event)
+    if expires_at <= (now or timezone.now()):
+        raise ExpiredCode()
+    return expires_at
+
+
+def _used_key(ticket_id):
+    return f'ticket-used:{ticket_id}'
+
+
+def claim_use(signed, expires_at):
+    """
+    Take the use-once marker for a scanned ticket. False if it was already
+    scanned. The marker lives until the event's tickets expire.
+    """
+    ttl = max(int((expires_at - timezone.now()).total_seconds()), 1)
+    return cache.add(_used_key(signed.ticket_id), 1, ttl)
+
+
+def forget_use(ticket_id):
+    """Drop the marker (the ticket turned out not to be usable after all)."""
+    cache.delete(_used_key(ticket_id))
@@ -208,13 +208,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    'core.middleware.StaticFilesMiddleware', # WhiteNoise, async-capable for ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.UpdateLastSeenMiddleware',
@@ -256,6 +258,78 @@ DATABASES = {
     )
 }
 
+# Cache
+# REDIS_URL makes the cache shared by all workers and instances. Without it
+# Django's default per-process LocMem cache is used, and features that must
+# agree across workers fall back: block checks read the database, the community
+# push throttle and poll snapshots use per-worker limits, and signed-in users'
+# reads skip the replica. See core/services/cache_service.py.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'ffig',
+        }
+    }
+SHARED_CACHE = env_bool('SHARED_CACHE', bool(REDIS_URL))
+
+# Read replica (optional)
+# Heavy read-only views in REPLICA_READ_VIEWS (URL names) read from this database;
+# everything else, and every write, uses 'default'. After a user's own write they
+# stay on the primary for DB_REPLICA_STICKY_SECONDS (read-your-writes). The pin is
+# kept in the shared cache (plus a cookie for browsers); without SHARED_CACHE it
+# can't reach other workers, so signed-in users' reads stay on the primary and
+# only anonymous reads use the replica. See core/db/routers.py.
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL', '')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=60,
+        conn_health_checks=True,
+    )
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+REPLICA_STICKY_SECONDS = env_int('DB_REPLICA_STICKY_SECONDS', 15)
+REPLICA_READ_VIEWS = [
+    'admin-analytics',
+    'admin-login-logs',
+    'admin-audit-logs',
+    'admin-tickets',
+    'admin-login-logs-export',
+    'admin-audit-logs-export',
+    'admin-tickets-export',
+    'admin_user_export',
+    'member-list',
+    'chat-search',
+]
+
+# Postgres connection pooling (psycopg_pool, see core/db/backends/postgresql_pool)
+# Each worker keeps a small pool of warm connections instead of paying TLS + auth
+# every CONN_MAX_AGE window. Total connections are capped at
+# DB_POOL_MAX_SIZE x gunicorn workers x instances (per database) - size it
+# against the plan's limit.
+DB_POOL_ENABLED = env_bool('DB_POOL_ENABLED', True)
+for db_config in DATABASES.values():
+    if not DB_POOL_ENABLED or db_config['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    db_config['ENGINE'] = 'core.db.backends.postgresql_pool'
+    # Django "closes" the connection at the end of each request, which returns
+    # it to the pool; the pool does health checks and recycling itself.
+    db_config['CONN_MAX_AGE'] = 0
+    db_config['CONN_HEALTH_CHECKS'] = False
+    db_config.setdefault('OPTIONS', {})['pool'] = {
+        'min_size': env_int('DB_POOL_MIN_SIZE', 1),
+        'max_size': env_int('DB_POOL_MAX_SIZE', 4),
+        'timeout': env_int('DB_POOL_TIMEOUT', 10), # seconds to wait for a free connection
+        'max_idle': env_int('DB_POOL_MAX_IDLE', 300),
+        'max_lifetime': env_int('DB_POOL_MAX_LIFETIME', 1800),
+    }
+    # Server-side cursors stay enabled: QuerySet.iterator() streams large
+    # exports in chunks instead of loading every row into memory.
+    db_config['DISABLE_SERVER_SIDE_CURSORS'] = False
+
 # Strict Check: Do not allow SQLite on Render
 if os.environ.get('RENDER') and 'sqlite' in DATABASES['default']['ENGINE']:
     raise RuntimeError("❌ FATAL: Render detected but DATABASE_URL is missing! You must configure the Postgres URL in Environment Variables.")
@@ -367,6 +441,20 @@ else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Public origin used for absolute media URLs when there is no request
+# (core/services/storage_url_service.py)
+SITE_URL = os.environ.get('SITE_URL', 'https://ffig-backend-ti5w.onrender.com')
+
+# /media/ serving (core/services/media_service.py)
+# Set MEDIA_OFFLOAD_HEADER to 'X-Accel-Redirect' (nginx, with MEDIA_OFFLOAD_PREFIX
+# mapped to MEDIA_ROOT as an `internal` location) or 'X-Sendfile' to let the
+# proxy stream files instead of a worker.
+MEDIA_OFFLOAD_HEADER = os.environ.get('MEDIA_OFFLOAD_HEADER', '')
+MEDIA_OFFLOAD_PREFIX = os.environ.get('MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+
+# Direct-to-storage uploads (core/services/upload_service.py)
+UPLOAD_URL_EXPIRES = env_int('UPLOAD_URL_EXPIRES', 900) # presigned URL lifetime (seconds)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -391,6 +479,43 @@ SIMPLE_JWT = {
 
 # Chat safety defaults
 CHAT_MESSAGE_DELETE_WINDOW_MINUTES = env_int('CHAT_MESSAGE_DELETE_WINDOW_MINUTES', 15)
+# Messages older than this are moved to gzipped JSONL in storage by the
+# archive_chat_messages command and rehydrated on demand (chat/archive.py)
+CHAT_ARCHIVE_AFTER_DAYS = env_int('CHAT_ARCHIVE_AFTER_DAYS', 365)
+CHAT_ARCHIVE_PREFIX = os.environ.get('CHAT_ARCHIVE_PREFIX', 'chat_archive/')
+# Push coalescing (core/services/push_service.py): at most one chat push per
+# (recipient, conversation) per window and one community topic push per interval
+PUSH_COALESCE_WINDOW_SECONDS = env_int('PUSH_COALESCE_WINDOW_SECONDS', 10)
+COMMUNITY_PUSH_INTERVAL_SECONDS = env_int('COMMUNITY_PUSH_INTERVAL_SECONDS', 60)
+# Without a shared cache the community interval is multiplied by this so the
+# gunicorn workers of one instance together stay near one push per interval
+PUSH_WORKER_COUNT = env_int('PUSH_WORKER_COUNT', env_int('WEB_CONCURRENCY', 1))
+# Read notifications older than this are moved to gzipped JSONL in storage by
+# the archive_notifications command (members/notifications.py)
+NOTIFICATION_RETENTION_DAYS = env_int('NOTIFICATION_RETENTION_DAYS', 90)
+NOTIFICATION_ARCHIVE_PREFIX = os.environ.get('NOTIFICATION_ARCHIVE_PREFIX', 'notification_archive/')
+# Event share pages (events/share.py): generated Open Graph cards live under
+# this media prefix; crawlers may cache the page for SHARE_PAGE_MAX_AGE seconds
+# (less with presigned media URLs, see events/share.py page_max_age)
+EVENT_OG_PREFIX = os.environ.get('EVENT_OG_PREFIX', 'og/events/')
+SHARE_PAGE_MAX_AGE = env_int('SHARE_PAGE_MAX_AGE', 600)
+# Ticket checkout holds its seats this long (events/reservations.py); expired
+# holds are released by the release_expired_seat_holds command
+SEAT_HOLD_MINUTES = env_int('SEAT_HOLD_MINUTES', 15)
+# Ticket QR codes are HMAC-signed (events/ticket_codes.py) with this key
+# (SECRET_KEY if empty) and stop scanning this many days after the event
+TICKET_SIGNING_KEY = os.environ.get('TICKET_SIGNING_KEY', '')
+TICKET_VALID_DAYS_AFTER_EVENT = env_int('TICKET_VALID_DAYS_AFTER_EVENT', 1)
+# Wix Contacts API credentials for the sync_wix_members command
+# (members/wix_sync.py); an interrupted sync resumes from the checkpoint file
+# kept at WIX_SYNC_CHECKPOINT in media storage
+WIX_API_KEY = os.environ.get('WIX_API_KEY', '')
+WIX_SITE_ID = os.environ.get('WIX_SITE_ID', '')
+WIX_SYNC_CHECKPOINT = os.environ.get('WIX_SYNC_CHECKPOINT', 'sync/wix_members_checkpoint.json')
+# Rows per quiz leaderboard (community/scoring.py)
+QUIZ_LEADERBOARD_SIZE = env_int('QUIZ_LEADERBOARD_SIZE', 20)
+# Devices not seen for this long are skipped when sending pushes
+FCM_DEVICE_STALE_DAYS = env_int('FCM_DEVICE_STALE_DAYS', 270)
 
 REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = [
     'rest_framework.throttling.AnonRateThrottle',
@@ -403,7 +528,7 @@ REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {
 
 # Email Configuration (AWS SES via SMTP)
 # Make sure to add these to your Render environment variables and local .env
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = 'core.mail.InstrumentedSMTPEmailBackend' # SMTP backend + latency/error metrics
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'email-smtp.us-east-1.amazonaws.com') # Your SES SMTP endpoint
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
@@ -415,3 +540,14 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'admin@femalefoundersi
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+
+# ASGI serving (render_start.sh switches gunicorn to uvicorn workers)
+# Routes the Stripe/Apple-bound payment endpoints to payments/async_views.py so
+# slow provider calls don't tie up a worker. Every middleware above is
+# async-capable - keep it that way or Django falls back to a thread per request.
+ASGI_ENABLED = env_bool('ASGI_ENABLED', False)
+
+# Metrics (Prometheus)
+# /metrics requires `Authorization: Bearer <METRICS_TOKEN>`; without a token it is DEBUG-only.
+# Set PROMETHEUS_MULTIPROC_DIR (render_start.sh does) to aggregate across gunicorn workers.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
@@ -1,3 +1,7 @@
+import atexit
+import shutil
+import tempfile
+
 from .settings import *  # noqa: F401,F403
 
 
@@ -9,11 +13,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'test_db.sqlite3',
-    }
+    },
+    # Replica alias mirrors the primary so the replica router can be tested.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_db.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+# Routing is opted into per test with override_settings(REPLICA_READ_VIEWS=[...]).
+REPLICA_READ_VIEWS = []
 
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
+# The test run is a single process, so its LocMem cache is the shared cache.
+SHARED_CACHE = True
+
+# Send pushes inline instead of through the background coalescer.
+PUSH_COALESCE_WINDOW_SECONDS = 0
+COMMUNITY_PUSH_INTERVAL_SECONDS = 0
+
 # Speed up tests significantly.
 PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.MD5PasswordHasher',
@@ -23,6 +42,10 @@ PASSWORD_HASHERS = [
 REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = []
 REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {}
 
+# Uploads made by tests go to a throwaway directory, not the repo's media/.
+MEDIA_ROOT = tempfile.mkdtemp(prefix='ffig-test-media-')
+atexit.register(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
+
 # Use local filesystem storage for tests.
 STORAGES = {
     "default": {
@@ -16,8 +16,6 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.views.static import serve
-from django.conf import settings
 
 from events.views import (
     FeaturedEventView, EventListView, EventDetailView, MyTicketsView, 
@@ -32,11 +30,13 @@ from members.views import (
     AdminAnalyticsView, AdminBusinessProfileListView, AdminBusinessProfileDetailView, 
     AdminMarketingRequestListView, AdminMarketingRequestDetailView,
     AdminContentReportListView, AdminContentReportDetailView, AdminModerationActionView,
-    NotificationListView, NotificationMarkReadView,
+    NotificationListView, NotificationMarkReadView, NotificationBulkMarkReadView,
+    NotificationMarkAllReadView, NotificationUnreadCountView,
     ToggleFavoriteView, BlockUserView, BlockedUserListView, MarketingFeedView,
     MarketingLikeView, MarketingCommentView, MyMarketingRequestListView, MarketingRequestUpdateView,
     StoryViewSet, AdminLoginLogListView, wix_webhook,
-    AdminAuditLogListView, AdminTicketListView, UniqueLocationsView
+    AdminAuditLogListView, AdminTicketListView, UniqueLocationsView, DeviceRegistrationView,
+    AdminLoginLogExportView, AdminAuditLogExportView, AdminTicketExportView
 )
 from resources.views import (
     ResourceListView, AdminResourceListCreateView, AdminResourceDetailView,
@@ -47,9 +47,10 @@ from chat.views import (
     ConversationListView, MessageListView, SendMessageView, 
     UnreadCountView, CommunityChatView, ChatSearchView, 
     ClearChatView, MuteChatView, CommunityUnreadCountView, MarkCommunityReadView,
-    DeleteMessageView
+    DeleteMessageView, ArchivedMessageListView
 )
 from home.views import download_latest_apk
+from core.views import metrics_view, media_view, UploadCreateView, local_upload_put
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -74,6 +75,7 @@ urlpatterns = [
     path('api/members/<int:user_id>/', MemberDetailView.as_view(), name='member-detail'),
     path('api/members/unique-locations/', UniqueLocationsView.as_view(), name='unique-locations'),
     path('api/members/me/', UserProfileView.as_view(), name='my-profile'),
+    path('api/members/me/devices/', DeviceRegistrationView.as_view(), name='my-devices'),
     path('api/resources/', ResourceListView.as_view(), name='resource-list'),
     path('api/resources/unseen-count/', ResourceUnseenCount.as_view(), name='resource-unseen-count'),
     path('api/resources/<int:pk>/view/', MarkResourceViewed.as_view(), name='resource-mark-viewed'),
@@ -93,6 +95,7 @@ urlpatterns = [
     # Phase 2: RBAC & Admin
     path('api/admin/analytics/', AdminAnalyticsView.as_view(), name='admin-analytics'),
     path('api/admin/tickets/', AdminTicketListView.as_view(), name='admin-tickets'),
+    path('api/admin/tickets/export/', AdminTicketExportView.as_view(), name='admin-tickets-export'),
     
     # Admin Approvals
     path('api/admin/approvals/business/', AdminBusinessProfileListView.as_view(), name='admin-business-list'),
@@ -108,6 +111,8 @@ urlpatterns = [
     # Admin User Management (canonical users CRUD is served via authentication.urls under /api/admin/users/)
     path('api/admin/logs/logins/', AdminLoginLogListView.as_view(), name='admin-login-logs'),
     path('api/admin/logs/audit/', AdminAuditLogListView.as_view(), name='admin-audit-logs'),
+    path('api/admin/logs/logins/export/', AdminLoginLogExportView.as_view(), name='admin-login-logs-export'),
+    path('api/admin/logs/audit/export/', AdminAuditLogExportView.as_view(), name='admin-audit-logs-export'),
 
     # User Submissions
     path('api/members/me/business/', MyBusinessProfileView.as_view(), name='my-business-profile'),
@@ -138,6 +143,7 @@ urlpatterns = [
     path('api/chat/conversations/<int:pk>/mute/', MuteChatView.as_view(), name='mute-chat'),
     path('api/chat/conversations/<int:pk>/clear/', ClearChatView.as_view(), name='clear-chat'),
     path('api/chat/conversations/<int:pk>/messages/', MessageListView.as_view(), name='message-list'),
+    path('api/chat/conversations/<int:pk>/messages/archived/', ArchivedMessageListView.as_view(), name='message-archive'),
     path('api/chat/unread-count/', UnreadCountView.as_view(), name='unread-count'),
     path('api/chat/community/', CommunityChatView.as_view(), name='community-chat'),
     path('api/chat/community/unread-count/', CommunityUnreadCountView.as_view(), name='community-unread-count'),
@@ -148,11 +154,15 @@ urlpatterns = [
     path('app.apk', download_latest_apk),
     
     # Explicitly serve media files (Required for Render/Production if not using S3)
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    # Range/ETag aware, proxy offload when configured, presigned redirect on S3
+    re_path(r'^media/(?P<path>.*)$', media_view, name='media'),
 
     # Notifications
     path('api/notifications/', NotificationListView.as_view(), name='notification-list'),
     path('api/notifications/<int:pk>/read/', NotificationMarkReadView.as_view(), name='notification-read'),
+    path('api/notifications/mark-read/', NotificationBulkMarkReadView.as_view(), name='notification-mark-read'),
+    path('api/notifications/mark-all-read/', NotificationMarkAllReadView.as_view(), name='notification-mark-all-read'),
+    path('api/notifications/unread-count/', NotificationUnreadCountView.as_view(), name='notification-unread-count'),
 
     # Payments (Stripe)
     path('api/payments/', include('payments.urls')),
@@ -162,4 +172,11 @@ urlpatterns = [
 
     # Community Features (Polls & Quizzes)
     path('api/community/', include('community.urls')),
+
+    # Direct-to-storage uploads (presigned S3 POST; local PUT stand-in without S3)
+    path('api/uploads/', UploadCreateView.as_view(), name='upload-create'),
+    path('api/uploads/local/<str:token>/', local_upload_put, name='upload-local-put'),
+
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,12 @@
+# Gunicorn settings picked up automatically from the working directory.
+# Only hooks live here; workers/bind keep coming from the Render environment
+# (WEB_CONCURRENCY, PORT) as before.
+import os
+
+
+def child_exit(server, worker):
+    # Prometheus multiprocess mode: drop live gauges of workers that exited so
+    # /metrics doesn't keep reporting them.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
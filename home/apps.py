@@ -6,3 +6,7 @@ class HomeConfig(AppConfig):
 
     def ready(self):
         import home.signals
+
+        # Build the APK catalog up front so the first download doesn't scan
+        from core.services.apk_service import latest_apk
+        latest_apk()
@@ -3,6 +3,8 @@ from .models import HeroItem, FounderProfile, FlashAlert, NewsTickerItem, AppVer
 import boto3
 from django.conf import settings
 
+from core.services.storage_url_service import file_url, profile_photo_url
+
 class AppVersionSerializer(serializers.ModelSerializer):
     class Meta:
         model = AppVersion
@@ -16,20 +18,8 @@ class HeroItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'image', 'image_url', 'type', 'action_url', 'is_active', 'order', 'created_at']
 
     def get_image_url(self, obj):
-        if not obj.image: return None
-        request = self.context.get('request')
         try:
-             url = obj.image.url
-             # Always return absolute URLs for consistency
-             if request and url.startswith('/'):
-                 return request.build_absolute_uri(url)
-             # If no request context, construct absolute URL manually
-             if url.startswith('/') and not request:
-                 from django.conf import settings
-                 import os
-                 domain = os.environ.get('SITE_URL', 'https://ffig-backend-ti5w.onrender.com')
-                 return f"{domain}{url}"
-             return url
+            return file_url(obj.image, self.context.get('request'))
         except: return None
 
 class FounderProfileSerializer(serializers.ModelSerializer):
@@ -40,39 +30,17 @@ class FounderProfileSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'name', 'photo', 'photo_url', 'bio', 'country', 'business_name', 'tier', 'is_premium', 'is_active', 'expires_at', 'created_at']
 
     def get_photo_url(self, obj):
+        request = self.context.get('request')
         # 1. Use uploaded photo if available
         if obj.photo:
             try:
-                url = obj.photo.url
-                # Always return absolute URLs for consistency
-                request = self.context.get('request')
-                if request and url.startswith('/'):
-                    return request.build_absolute_uri(url)
-                # If no request context, construct absolute URL manually
-                if url.startswith('/') and not request:
-                    from django.conf import settings
-                    from django.contrib.sites.shortcuts import get_current_site
-                    import os
-                    # Fallback: Use MEDIA_URL if available
-                    if hasattr(settings, 'MEDIA_URL'):
-                        domain = os.environ.get('SITE_URL', 'https://ffig-backend-ti5w.onrender.com')
-                        return f"{domain}{url}"
-                return url
+                return file_url(obj.photo, request)
             except:
                 return None
             
         # 2. Fallback to User Profile photo if Linked
         if obj.user and hasattr(obj.user, 'profile'):
-            p = obj.user.profile
-            if p.photo:
-                try:
-                    url = p.photo.url
-                    request = self.context.get('request')
-                    if request and url.startswith('/'):
-                        return request.build_absolute_uri(url)
-                    return url
-                except: pass
-            return p.photo_url
+            return profile_photo_url(obj.user.profile, request)
             
         return None
 
@@ -103,28 +71,9 @@ class BusinessOfMonthSerializer(serializers.ModelSerializer):
 
     def get_owner_photo(self, obj):
         if not obj.owner or not hasattr(obj.owner, 'profile'): return None
-        p = obj.owner.profile
-        if p.photo:
-            try:
-                request = self.context.get('request')
-                if request: return request.build_absolute_uri(p.photo.url)
-            except: pass
-            return p.photo.url
-        return p.photo_url
+        return profile_photo_url(obj.owner.profile, self.context.get('request'))
 
     def get_image_url(self, obj):
-        if not obj.image: return None
-        request = self.context.get('request')
         try:
-             url = obj.image.url
-             # Always return absolute URLs for consistency
-             if request and url.startswith('/'):
-                 return request.build_absolute_uri(url)
-             # If no request context, construct absolute URL manually
-             if url.startswith('/') and not request:
-                 from django.conf import settings
-                 import os
-                 domain = os.environ.get('SITE_URL', 'https://ffig-backend-ti5w.onrender.com')
-                 return f"{domain}{url}"
-             return url
+            return file_url(obj.image, self.context.get('request'))
         except: return None
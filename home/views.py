@@ -84,114 +84,40 @@ class AppVersionViewSet(BaseHomeViewSet):
         return response
 
 # --- APK Download Helper ---
-import os
-from django.conf import settings
-from django.http import FileResponse, Http404, HttpResponse
+from django.http import Http404, HttpResponse
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 
+from core.services import apk_service, media_service
+
 @api_view(['GET'])
 @authentication_classes([]) # No Auth required
 @permission_classes([permissions.AllowAny])
 def download_latest_apk(request):
     """
-    Scans mobile_app/web for the latest app-vX.X.X.apk and serves it.
-    Also checks mobile_app/web/app.apk as a valid fallback.
+    Serves the latest app-vX.X.X.apk (mobile_app/web, then mobile_app/web/app.apk,
+    ffig_backend/static/apk, STATIC_ROOT) from the cached APK catalog, with
+    Range/ETag support so interrupted downloads can resume.
     """
-    try:
-        # Strategy 1: Check mobile_app/web/ for versioned files (e.g. app-v1.0.53.apk)
-        # We prioritize this to give the user the correct filename with version
-        web_dir = os.path.join(settings.BASE_DIR, 'mobile_app', 'web')
-        if os.path.exists(web_dir):
-             web_files = [f for f in os.listdir(web_dir) if f.startswith('app-v') and f.endswith('.apk')]
-             if web_files:
-                 web_files.sort(reverse=True)
-                 latest_web_file = web_files[0]
-                 web_path = os.path.join(web_dir, latest_web_file)
-                 
-                 response = FileResponse(open(web_path, 'rb'), content_type='application/vnd.android.package-archive')
-                 response['Content-Disposition'] = f'attachment; filename="{latest_web_file}"'
-                 return response
-
-        # Strategy 2: Check mobile_app/web/app.apk (Generic fallback)
-        primary_path = os.path.join(settings.BASE_DIR, 'mobile_app', 'web', 'app.apk')
-        
-        if os.path.exists(primary_path):
-             response = FileResponse(open(primary_path, 'rb'), content_type='application/vnd.android.package-archive')
-             response['Content-Disposition'] = 'attachment; filename="app-latest.apk"'
-             return response
-
-        # Strategy 3: Look in ffig_backend/static/apk/ for versioned files
-        apk_dir = os.path.join(settings.BASE_DIR, 'ffig_backend', 'static', 'apk')
-        
-        files = []
-        if os.path.exists(apk_dir):
-            # Find all .apk files starting with app-v
-            files = [f for f in os.listdir(apk_dir) if f.startswith('app-v') and f.endswith('.apk')]
-        
-        if files:
-            # Sort to find "latest" just in case multiple exist
-            files.sort(reverse=True) 
-            latest_file = files[0]
-            file_path = os.path.join(apk_dir, latest_file)
-            
-            # Serve as attachment
-            response = FileResponse(open(file_path, 'rb'), content_type='application/vnd.android.package-archive')
-            response['Content-Disposition'] = f'attachment; filename="{latest_file}"'
-            return response
-
-        # Strategy 4: Check STATIC_ROOT (where collectstatic moves files)
-        static_root = settings.STATIC_ROOT
-        if os.path.exists(static_root):
-             static_files = [f for f in os.listdir(static_root) if f.startswith('app-v') and f.endswith('.apk')]
-             if static_files:
-                 static_files.sort(reverse=True)
-                 latest_static_file = static_files[0]
-                 static_path = os.path.join(static_root, latest_static_file)
-                 
-                 response = FileResponse(open(static_path, 'rb'), content_type='application/vnd.android.package-archive')
-                 response['Content-Disposition'] = f'attachment; filename="{latest_static_file}"'
-                 return response
+    apk = apk_service.latest_apk()
+    if apk is None:
+        checked = "\n".join(
+            f"- {directory}{'/' + fallback if fallback else ''}"
+            for directory, fallback in apk_service.candidate_sources()
+        )
+        return HttpResponse(f"APK NOT FOUND. Checked paths:\n{checked}", status=404, content_type="text/plain")
 
-        # Debug Info with Recursive Search
-        debug_info = f"Checked paths:\\n"
-        debug_info += f"1. Web Dir: {web_dir} (Exists: {os.path.exists(web_dir)})\\n"
-        debug_info += f"2. Primary: {primary_path} (Exists: {os.path.exists(primary_path)})\\n"
-        debug_info += f"3. Static Apk: {apk_dir} (Exists: {os.path.exists(apk_dir)})\\n" 
-        debug_info += f"4. Static Root: {static_root} (Exists: {os.path.exists(static_root)})\\n"
-
-        # Recursive Search for ANY APK
-        debug_info += "\\n--- Recursive Search for *.apk in BASE_DIR ---\\n"
-        apk_matches = []
-        try:
-            for root, dirs, files in os.walk(settings.BASE_DIR):
-                for file in files:
-                    if file.endswith(".apk"):
-                        full_path = os.path.join(root, file)
-                        apk_matches.append(full_path)
-                        # Don't recurse too deep if unnecessary, but full walk is safer for debug
-        except Exception as walk_e:
-            debug_info += f"Walk Error: {walk_e}\\n"
-
-        if apk_matches:
-            debug_info += "Found APKs:\\n" + "\\n".join(apk_matches)
-        else:
-            debug_info += "NO APK FILES FOUND IN PROJECT DIRECTORY (Recursive Search Results)."
-
-        # Force valid response so browser shows text
-        debug_info += f"\\n\\nCURRENT WORKING DIR: {os.getcwd()}"
-        debug_info += f"\\nBASE_DIR: {settings.BASE_DIR}"
-        try:
-             debug_info += f"\\nBASE_DIR LIST: {os.listdir(settings.BASE_DIR)}"
-             mobile_path = os.path.join(settings.BASE_DIR, 'mobile_app')
-             if os.path.exists(mobile_path):
-                 debug_info += f"\\nMOBILE_APP LIST: {os.listdir(mobile_path)}"
-                 web_path = os.path.join(mobile_path, 'web')
-                 if os.path.exists(web_path):
-                     debug_info += f"\\nWEB LIST: {os.listdir(web_path)}"
-        except Exception as e:
-            debug_info += f"\\nList Error: {e}"
-
-        return HttpResponse(f"APK NOT FOUND. Debug Info:\\n\\n{debug_info}", status=404, content_type="text/plain")
-        
+    try:
+        return media_service.serve_file(
+            request._request,
+            apk.path,
+            filename=apk.filename,
+            as_attachment=True,
+            content_type=apk_service.APK_CONTENT_TYPE,
+            cache_control='public, max-age=300',
+        )
+    except Http404:
+        # Removed between the catalog lookup and the open
+        apk_service.clear_catalog()
+        return HttpResponse("APK NOT FOUND.", status=404, content_type="text/plain")
     except Exception as e:
         return HttpResponse(f"Error serving APK: {str(e)}", status=500)
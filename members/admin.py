@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Profile, LoginLog
+from .models import Profile, LoginLog, FCMDevice
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -20,3 +20,10 @@ class LoginLogAdmin(admin.ModelAdmin):
     list_filter = ('timestamp',)
     search_fields = ('user__username', 'ip_address', 'user_agent')
     readonly_fields = ('user', 'timestamp', 'ip_address', 'user_agent')
+
+@admin.register(FCMDevice)
+class FCMDeviceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'platform', 'app_version', 'last_seen')
+    list_filter = ('platform',)
+    search_fields = ('user__username',)
+    readonly_fields = ('token', 'created_at')
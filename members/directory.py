@@ -0,0 +1,209 @@
+"""
+Member directory facets.
+
+Profile.location is free text ("cape town, south africa", "USA", "Lagos,Nigeria").
+Each profile is linked to a normalized DirectoryLocation (city + country), so
+the directory can filter and count by country without guessing at strings.
+
+DirectoryFacet holds one row per (facet, value) with the number of profiles,
+for industry, tier, country and city. Profile signals (members/signals.py)
+apply +1/-1 deltas when one of those values changes; the table is read into
+the cache as a single dict and dropped from the cache on every change (other
+workers pick up changes within FACET_CACHE_SECONDS). rebuild_facets() recounts
+everything if the table ever drifts (e.g. after queryset.update()); bulk
+writers pass their changes to record_changes() instead.
+
+filtered_facets() counts a filtered directory in one grouped query, for
+MemberListView ?facets=1 with filters applied or for a member with blocks
+(whose directory leaves the blocked members out).
+"""
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from core.services.cache_service import delete_now_and_on_commit
+
+from .models import DirectoryFacet, DirectoryLocation, Profile
+
+FACETS = ('industry', 'tier', 'country', 'city')
+FACET_CACHE_KEY = 'directory-facets'
+FACET_CACHE_SECONDS = 10 * 60
+
+COUNTRY_ALIASES = {
+    'usa': 'United States',
+    'us': 'United States',
+    'u.s.': 'United States',
+    'u.s.a.': 'United States',
+    'united states of america': 'United States',
+    'america': 'United States',
+    'uk': 'United Kingdom',
+    'u.k.': 'United Kingdom',
+    'england': 'United Kingdom',
+    'great britain': 'United Kingdom',
+    'uae': 'United Arab Emirates',
+    'rsa': 'South Africa',
+    'sa': 'South Africa',
+}
+
+_SPACES = re.compile(r'\s+')
+
+
+def _clean(part):
+    part = _SPACES.sub(' ', part).strip(' .')
+    if part.islower() or part.isupper():
+        # "cape town" / "NIGERIA" -> "Cape Town" / "Nigeria"; leave mixed case alone
+        part = part.title()
+    return part
+
+
+def normalize_location(raw):
+    """
+    (city, country) from free text. The last comma-separated part is the
+    country and the first (if different) the city; a single value is taken as
+    a country, like the directory filter always assumed. ('', '') for blanks.
+    """
+    parts = [_clean(p) for p in (raw or '').split(',')]
+    parts = [p for p in parts if p]
+    if not parts:
+        return '', ''
+    country = parts[-1]
+    country = COUNTRY_ALIASES.get(country.lower(), country)
+    city = parts[0] if len(parts) > 1 else ''
+    return city, country
+
+
+def location_key(city, country):
+    return f'{city.casefold()}|{country.casefold()}'
+
+
+def resolve_location(raw):
+    """The DirectoryLocation for a free-text location, created on first use."""
+    city, country = normalize_location(raw)
+    if not country:
+        return None
+    location, _ = DirectoryLocation.objects.get_or_create(
+        key=location_key(city, country), defaults={'city': city, 'country': country},
+    )
+    return location
+
+
+def facet_values(industry, tier, location):
+    """{facet: value} for one profile; location is a DirectoryLocation or None."""
+    return {
+        'industry': industry or '',
+        'tier': tier or '',
+        'country': location.country if location else '',
+        'city': location.label if location and location.city else '',
+    }
+
+
+def profile_facet_values(profile):
+    return facet_values(profile.industry, profile.tier, profile.location_ref)
+
+
+def _apply(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta and key[1]}
+    if not deltas:
+        return
+    with transaction.atomic():
+        DirectoryFacet.objects.bulk_create(
+            [DirectoryFacet(facet=facet, value=value, count=0) for facet, value in deltas],
+            ignore_conflicts=True,
+        )
+        for (facet, value), delta in deltas.items():
+            DirectoryFacet.objects.filter(facet=facet, value=value).update(count=F('count') + delta)
+        DirectoryFacet.objects.filter(count__lte=0).delete()
+    delete_now_and_on_commit([FACET_CACHE_KEY])
+
+
+def record_change(old, new):
+    """Apply the difference between two facet_values() dicts (either may be None)."""
+    record_changes([(old, new)])
+
+
+def record_changes(changes):
+    """record_change() for many (old, new) pairs at once, e.g. after a bulk_update()."""
+    deltas = Counter()
+    for old, new in changes:
+        for facet in FACETS:
+            before = old.get(facet) if old else None
+            after = new.get(facet) if new else None
+            if before == after:
+                continue
+            if before:
+                deltas[(facet, before)] -= 1
+            if after:
+                deltas[(facet, after)] += 1
+    _apply(deltas)
+
+
+def rebuild_facets():
+    """Recount every facet from the Profile table."""
+    counts = Counter()
+    rows = (
+        Profile.objects.order_by()
+        .values('industry', 'tier', 'location_ref__country', 'location_ref__city')
+        .annotate(total=Count('id'))
+    )
+    for row in rows:
+        _fold(counts, row)
+    with transaction.atomic():
+        DirectoryFacet.objects.all().delete()
+        DirectoryFacet.objects.bulk_create([
+            DirectoryFacet(facet=facet, value=value, count=total)
+            for (facet, value), total in counts.items()
+        ])
+    cache.delete(FACET_CACHE_KEY)
+    return len(counts)
+
+
+def _fold(counts, row):
+    total = row['total']
+    country = row['location_ref__country'] or ''
+    city = row['location_ref__city'] or ''
+    for facet, value in (
+        ('industry', row['industry']),
+        ('tier', row['tier']),
+        ('country', country),
+        ('city', f'{city}, {country}' if city else ''),
+    ):
+        if value:
+            counts[(facet, value)] += total
+
+
+def _as_dict(counts):
+    facets = {facet: {} for facet in FACETS}
+    for (facet, value), total in sorted(counts, key=lambda item: (-item[1], item[0][1])):
+        facets[facet][value] = total
+    return facets
+
+
+def facet_counts():
+    """Counts for the whole directory, from the cache or the facet table."""
+    facets = cache.get(FACET_CACHE_KEY)
+    if facets is None:
+        rows = DirectoryFacet.objects.values_list('facet', 'value', 'count')
+        facets = _as_dict([((facet, value), total) for facet, value, total in rows])
+        cache.set(FACET_CACHE_KEY, facets, FACET_CACHE_SECONDS)
+    return facets
+
+
+def filtered_facets(queryset):
+    """Counts for a filtered profile queryset, in one grouped query."""
+    counts = Counter()
+    rows = (
+        queryset.order_by()
+        .values('industry', 'tier', 'location_ref__country', 'location_ref__city')
+        .annotate(total=Count('id', distinct=True))
+    )
+    for row in rows:
+        _fold(counts, row)
+    return _as_dict(counts.items())
+
+
+def countries():
+    """Known countries, most members first (the directory location filter)."""
+    return list(facet_counts()['country'])
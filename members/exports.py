@@ -0,0 +1,102 @@
+"""
+Admin exports (see core/services/export_service.py).
+
+Each export is a values() projection of the admin list's queryset plus the
+columns written out. Derived values (a ticket's buyer name and discount) are
+computed per row from the projected fields, as the list serializers do from
+the related objects.
+"""
+from core.services.export_service import export_response
+
+TICKET_FIELDS = (
+    'id', 'purchase_date', 'status',
+    'event_id', 'event__title', 'event__date', 'event__is_virtual',
+    'tier__name', 'tier__price', 'tier__currency',
+    'purchase_price', 'original_price',
+    'first_name', 'last_name', 'email',
+    'user__username', 'user__first_name', 'user__last_name', 'user__email',
+    'user__profile__business_name',
+)
+TICKET_COLUMNS = [
+    'id', 'buyer_name', 'buyer_email', 'event_id', 'event_title', 'event_date', 'is_virtual',
+    'tier_name', 'price', 'purchase_price', 'original_price', 'discount_label', 'currency',
+    'purchase_date', 'status', 'first_name', 'last_name', 'email',
+]
+
+LOGIN_LOG_FIELDS = ('id', 'user__username', 'timestamp', 'ip_address', 'user_agent')
+LOGIN_LOG_COLUMNS = ['id', 'username', 'timestamp', 'ip_address', 'user_agent']
+
+AUDIT_LOG_FIELDS = (
+    'id', 'actor_id', 'actor__username', 'action_type', 'target_type', 'target_id',
+    'target_label', 'reason', 'metadata', 'created_at',
+)
+AUDIT_LOG_COLUMNS = [
+    'id', 'actor', 'actor_username', 'action_type', 'target_type', 'target_id',
+    'target_label', 'reason', 'metadata', 'created_at',
+]
+
+MEMBER_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'is_staff', 'is_active',
+    'date_joined', 'last_login', 'profile__is_premium', 'profile__tier',
+)
+MEMBER_COLUMNS = [
+    'id', 'username', 'email', 'first_name', 'last_name', 'is_staff', 'is_active',
+    'date_joined', 'last_login', 'is_premium', 'tier',
+]
+
+
+def _buyer_name(row):
+    # Same preference as AdminTicketSerializer: guest name, full name, business name, username
+    if row['first_name'] or row['last_name']:
+        return f"{row['first_name'] or ''} {row['last_name'] or ''}".strip()
+    name = f"{row['user__first_name'] or ''} {row['user__last_name'] or ''}".strip()
+    return name or row['user__profile__business_name'] or row['user__username']
+
+
+def _discount_label(original_price, purchase_price):
+    if original_price > 0 and purchase_price < original_price:
+        return f"{round((original_price - purchase_price) / original_price * 100)}% Discount"
+    return None
+
+
+def ticket_row(row):
+    return {
+        **row,
+        'buyer_name': _buyer_name(row),
+        'buyer_email': row['user__email'],
+        'event_title': row['event__title'],
+        'event_date': row['event__date'],
+        'is_virtual': row['event__is_virtual'],
+        'tier_name': row['tier__name'],
+        'price': row['tier__price'],
+        'currency': row['tier__currency'],
+        'discount_label': _discount_label(row['original_price'], row['purchase_price']),
+    }
+
+
+def login_log_row(row):
+    return {**row, 'username': row['user__username']}
+
+
+def audit_log_row(row):
+    return {**row, 'actor': row['actor_id'], 'actor_username': row['actor__username']}
+
+
+def member_row(row):
+    return {**row, 'is_premium': row['profile__is_premium'], 'tier': row['profile__tier']}
+
+
+def export_tickets(request, queryset):
+    return export_response(request, queryset, TICKET_FIELDS, TICKET_COLUMNS, 'tickets', ticket_row)
+
+
+def export_login_logs(request, queryset):
+    return export_response(request, queryset, LOGIN_LOG_FIELDS, LOGIN_LOG_COLUMNS, 'login-logs', login_log_row)
+
+
+def export_audit_logs(request, queryset):
+    return export_response(request, queryset, AUDIT_LOG_FIELDS, AUDIT_LOG_COLUMNS, 'audit-logs', audit_log_row)
+
+
+def export_members(request, queryset):
+    return export_response(request, queryset, MEMBER_FIELDS, MEMBER_COLUMNS, 'members', member_row)
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from members.notifications import archive_read, pending_archive_count, recount_unread
+
+
+class Command(BaseCommand):
+    help = 'Moves read notifications older than NOTIFICATION_RETENTION_DAYS to gzipped JSONL archives in storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+            help='Archive read notifications older than this many days',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Also rebuild every profile\'s unread notification counter',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write(f"Archiving read notifications created before {cutoff:%Y-%m-%d %H:%M}")
+
+        if options['dry_run']:
+            total = pending_archive_count(cutoff)
+            self.stdout.write(self.style.SUCCESS(f"Would archive {total} notifications"))
+            return
+
+        archived = 0
+        for key, count in archive_read(cutoff, batch_size=options['batch_size']):
+            archived += count
+            self.stdout.write(f"  {count} notifications -> {key}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} notifications"))
+
+        if options['recount']:
+            profiles = recount_unread()
+            self.stdout.write(self.style.SUCCESS(f"Recounted unread notifications for {profiles} profiles"))
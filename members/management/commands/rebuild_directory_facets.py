@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from members.directory import rebuild_facets, resolve_location
+from members.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Re-links member locations to normalized cities/countries and recounts the directory facets'
+
+    def handle(self, *args, **options):
+        linked = 0
+        profiles = Profile.objects.only('id', 'location', 'location_ref').iterator()
+        for profile in profiles:
+            location = resolve_location(profile.location)
+            if profile.location_ref_id != (location.id if location else None):
+                Profile.objects.filter(pk=profile.pk).update(location_ref=location)
+                linked += 1
+        self.stdout.write(f"Updated the normalized location of {linked} profiles")
+
+        values = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {values} directory facet counts"))
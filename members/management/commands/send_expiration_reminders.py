@@ -4,6 +4,7 @@ from datetime import timedelta
 from members.models import Profile
 from core.services.email_service import send_membership_reminder_email
 from core.services.fcm_service import send_push_notification
+from core.db.routers import replica_reads
 
 class Command(BaseCommand):
     help = 'Sends reminders to users whose membership expires in exactly 90, 30, or 7 days.'
@@ -15,13 +16,17 @@ class Command(BaseCommand):
         for days in target_days:
             target_date = today + timedelta(days=days)
             
-            expiring_profiles = Profile.objects.filter(subscription_expiry__date=target_date)
+            # Read-only scan: served by the replica when one is configured
+            with replica_reads():
+                expiring_profiles = list(
+                    Profile.objects.filter(subscription_expiry__date=target_date).select_related('user')
+                )
             
-            if not expiring_profiles.exists():
+            if not expiring_profiles:
                 self.stdout.write(self.style.SUCCESS(f"No profiles expiring in exactly {days} days."))
                 continue
                 
-            self.stdout.write(self.style.SUCCESS(f"Found {expiring_profiles.count()} profile(s) expiring in {days} days ({target_date}). Sending reminders..."))
+            self.stdout.write(self.style.SUCCESS(f"Found {len(expiring_profiles)} profile(s) expiring in {days} days ({target_date}). Sending reminders..."))
             
             for profile in expiring_profiles:
                 user = profile.user
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from members.wix_sync import PAGE_SIZE, FixtureContacts, WixContacts, sync_members
+
+
+class Command(BaseCommand):
+    help = 'Syncs membership tiers from Wix contact labels in bulk, resuming from the last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixture',
+            help='Read contacts from this JSON file (a list, or {"contacts": [...]}) instead of the Wix API',
+        )
+        parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first contact')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument('--no-push', action='store_true', help='Don\'t notify members whose tier changed')
+        parser.add_argument(
+            '--allow-downgrades', action='store_true',
+            help='Also lower tiers to match Wix labels (never for members with a running paid subscription)',
+        )
+
+    def handle(self, *args, **options):
+        if options['fixture']:
+            source = FixtureContacts(options['fixture'], page_size=options['page_size'])
+        else:
+            if not settings.WIX_API_KEY:
+                raise CommandError('WIX_API_KEY is not set (or pass --fixture)')
+            source = WixContacts(settings.WIX_API_KEY, settings.WIX_SITE_ID, page_size=options['page_size'])
+
+        if options['dry_run']:
+            self.stdout.write("Dry run: nothing will be saved")
+
+        totals = None
+        pages = sync_members(
+            source,
+            restart=options['restart'],
+            push=not options['no_push'],
+            dry_run=options['dry_run'],
+            downgrade=options['allow_downgrades'],
+        )
+        for counts, totals in pages:
+            self.stdout.write(
+                f"  {counts['contacts']} contacts, {counts['matched']} members, {counts['changed']} changed"
+            )
+
+        if totals is None:
+            self.stdout.write(self.style.SUCCESS("No contacts to sync"))
+            return
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['changed']} of {totals['matched']} members matched from {totals['contacts']} contacts"
+        ))
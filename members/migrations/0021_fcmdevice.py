@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_profile_tokens(apps, schema_editor):
+    """Each existing Profile.fcm_token becomes that user's first device."""
+    Profile = apps.get_model('members', 'Profile')
+    FCMDevice = apps.get_model('members', 'FCMDevice')
+    seen = set()
+    devices = []
+    profiles = Profile.objects.exclude(fcm_token__isnull=True).exclude(fcm_token='').order_by('-last_seen')
+    for profile in profiles.iterator():
+        # A token moved between accounts belongs to the most recently active one
+        if profile.fcm_token in seen:
+            continue
+        seen.add(profile.fcm_token)
+        devices.append(FCMDevice(user_id=profile.user_id, token=profile.fcm_token, last_seen=profile.last_seen))
+    FCMDevice.objects.bulk_create(devices, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('members', '0020_adminauditlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FCMDevice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=255, unique=True)),
+                ('platform', models.CharField(blank=True, choices=[('ANDROID', 'Android'), ('IOS', 'iOS'), ('WEB', 'Web')], max_length=10)),
+                ('app_version', models.CharField(blank=True, max_length=20)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fcm_devices', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'last_seen'], name='members_fcm_user_id_cd4c59_idx')],
+            },
+        ),
+        migrations.RunPython(copy_profile_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:04
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread(apps, schema_editor):
+    Notification = apps.get_model('members', 'Notification')
+    Profile = apps.get_model('members', 'Profile')
+    rows = (
+        Notification.objects.filter(is_read=False)
+        .order_by()
+        .values('recipient_id')
+        .annotate(total=Count('id'))
+    )
+    for row in rows.iterator():
+        Profile.objects.filter(user_id=row['recipient_id']).update(unread_notifications=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0021_fcmdevice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'is_read', '-id'], name='notification_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_read', 'created_at'], name='notification_retention_idx'),
+        ),
+    ]
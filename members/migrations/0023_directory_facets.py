@@ -0,0 +1,117 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:07
+
+from django.db import migrations, models
+from collections import Counter
+import re
+
+import django.db.models.deletion
+
+# Copied from members/directory.py as of this migration, so later changes to
+# the normalization don't change what this migration does.
+COUNTRY_ALIASES = {
+    'usa': 'United States',
+    'us': 'United States',
+    'u.s.': 'United States',
+    'u.s.a.': 'United States',
+    'united states of america': 'United States',
+    'america': 'United States',
+    'uk': 'United Kingdom',
+    'u.k.': 'United Kingdom',
+    'england': 'United Kingdom',
+    'great britain': 'United Kingdom',
+    'uae': 'United Arab Emirates',
+    'rsa': 'South Africa',
+    'sa': 'South Africa',
+}
+
+_SPACES = re.compile(r'\s+')
+
+
+def _clean(part):
+    part = _SPACES.sub(' ', part).strip(' .')
+    if part.islower() or part.isupper():
+        part = part.title()
+    return part
+
+
+def normalize_location(raw):
+    parts = [_clean(p) for p in (raw or '').split(',')]
+    parts = [p for p in parts if p]
+    if not parts:
+        return '', ''
+    country = parts[-1]
+    country = COUNTRY_ALIASES.get(country.lower(), country)
+    city = parts[0] if len(parts) > 1 else ''
+    return city, country
+
+
+def location_key(city, country):
+    return f'{city.casefold()}|{country.casefold()}'
+
+
+def build_directory(apps, schema_editor):
+    Profile = apps.get_model('members', 'Profile')
+    DirectoryLocation = apps.get_model('members', 'DirectoryLocation')
+    DirectoryFacet = apps.get_model('members', 'DirectoryFacet')
+
+    locations = {}
+    counts = Counter()
+    for profile in Profile.objects.only('id', 'industry', 'tier', 'location').iterator():
+        city, country = normalize_location(profile.location)
+        location = None
+        if country:
+            key = location_key(city, country)
+            if key not in locations:
+                locations[key], _ = DirectoryLocation.objects.get_or_create(
+                    key=key, defaults={'city': city, 'country': country},
+                )
+            location = locations[key]
+            Profile.objects.filter(pk=profile.pk).update(location_ref=location)
+            counts[('country', country)] += 1
+            if city:
+                counts[('city', f'{city}, {country}')] += 1
+        if profile.industry:
+            counts[('industry', profile.industry)] += 1
+        if profile.tier:
+            counts[('tier', profile.tier)] += 1
+
+    DirectoryFacet.objects.bulk_create([
+        DirectoryFacet(facet=facet, value=value, count=total) for (facet, value), total in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0022_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('country', models.CharField(db_index=True, max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DirectoryFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('industry', 'Industry'), ('tier', 'Tier'), ('country', 'Country'), ('city', 'City')], max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='location_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profiles', to='members.directorylocation'),
+        ),
+        migrations.RunPython(build_directory, migrations.RunPython.noop),
+    ]
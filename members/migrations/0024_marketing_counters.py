@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_engagement(apps, schema_editor):
+    MarketingRequest = apps.get_model('members', 'MarketingRequest')
+    MarketingLike = apps.get_model('members', 'MarketingLike')
+    MarketingComment = apps.get_model('members', 'MarketingComment')
+
+    def total(model):
+        rows = (
+            model.objects.filter(marketing_request=OuterRef('pk'))
+            .order_by().values('marketing_request').annotate(n=Count('id')).values('n')
+        )
+        return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+    MarketingRequest.objects.update(likes_count=total(MarketingLike), comments_count=total(MarketingComment))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0023_directory_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketingrequest',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='marketingrequest',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_engagement, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 20:05
+
+from django.db import migrations
+
+# auth_user belongs to django.contrib.auth, so the index is added here. It
+# serves email__iexact lookups (UPPER(email) on Postgres) in the Wix webhook
+# and the sync_wix_members page matching (members/wix_sync.py).
+INDEX_NAME = 'members_auth_user_email_upper'
+
+
+def add_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON auth_user (UPPER(email::text))')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('members', '0024_marketing_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, drop_index),
+    ]
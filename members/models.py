@@ -27,6 +27,10 @@ class Profile(models.Model):
     industry = models.CharField(max_length=50, choices=INDUSTRY_CHOICES, default='OTH')
     industry_other = models.CharField(max_length=100, blank=True)
     location = models.CharField(max_length=100, blank=True)
+    # Normalized form of `location`, set on save (see members/directory.py)
+    location_ref = models.ForeignKey(
+        'members.DirectoryLocation', on_delete=models.SET_NULL, null=True, blank=True, related_name='profiles'
+    )
     bio = models.TextField(blank=True)
     # RBAC Fields
     TIER_CHOICES = [
@@ -57,6 +61,8 @@ class Profile(models.Model):
 
     # Notifications
     fcm_token = models.CharField(max_length=255, blank=True, null=True)
+    # Denormalized unread Notification count (see members/notifications.py)
+    unread_notifications = models.PositiveIntegerField(default=0)
 
     # We'll stick to a placeholder image for now to save setup time
     photo_url = models.URLField(blank=True, default="https://ui-avatars.com/api/?background=D4AF37&color=fff&name=Founder")
@@ -78,8 +84,21 @@ class Profile(models.Model):
                 self.photo = ContentFile(output.read(), name=self.photo.name.split('/')[-1])
              except Exception:
                 pass 
+        self._resolve_location(kwargs)
         super().save(*args, **kwargs)
 
+    def _resolve_location(self, save_kwargs):
+        # Keep location_ref (normalized city/country) in step with the free-text location
+        update_fields = save_kwargs.get('update_fields')
+        if update_fields is not None and 'location' not in update_fields:
+            return
+        snapshot = getattr(self, '_directory_snapshot', None)
+        if snapshot is None or snapshot[2] != self.location or (self.location and self.location_ref_id is None):
+            from .directory import resolve_location
+            self.location_ref = resolve_location(self.location)
+            if update_fields is not None:
+                save_kwargs['update_fields'] = set(update_fields) | {'location_ref'}
+
     def __str__(self):
         return f"{self.user.username}'s Profile ({self.tier})"
 
@@ -150,6 +169,11 @@ class MarketingRequest(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     feedback = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized counters, maintained with F() updates by the like/comment views
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    COUNTER_FIELDS = ('likes_count', 'comments_count')
 
     def save(self, *args, **kwargs):
         if self.image:
@@ -166,6 +190,12 @@ class MarketingRequest(models.Model):
                 self.image = ContentFile(output.read(), name=self.image.name.split('/')[-1])
              except Exception:
                 pass 
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Edits never write back the counters, so a stale copy can't undo concurrent likes
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
 
 class ContentReport(models.Model):
@@ -186,6 +216,13 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Inbox pages (cursor on id) and the retention job
+            models.Index(fields=['recipient', 'is_read', '-id'], name='notification_inbox_idx'),
+            models.Index(fields=['is_read', 'created_at'], name='notification_retention_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.recipient.username}: {self.title}"
 
@@ -198,16 +235,14 @@ def create_user_profile(sender, instance, created, **kwargs):
         
         # Only notify/welcome if the user is active (e.g. created via admin or non-OTP flow)
         if instance.is_active:
-            # 1. Notify Admins via Direct Push
-            from core.services.fcm_service import send_push_notification
-            admins = User.objects.filter(is_staff=True)
-            for admin in admins:
-                send_push_notification(
-                    admin,
-                    title="New User Registration",
-                    body=f"New user joined: {instance.username} ({instance.email})",
-                    data={"type": "admin_alert"}
-                )
+            # 1. Notify Admins via Direct Push (all admin devices, one batched call)
+            from core.services.fcm_service import send_push_to_users
+            send_push_to_users(
+                User.objects.filter(is_staff=True).values_list('id', flat=True),
+                title="New User Registration",
+                body=f"New user joined: {instance.username} ({instance.email})",
+                data={"type": "admin_alert"}
+            )
                 
             # 2. Send Welcome Email to the User
             from core.services.email_service import send_welcome_email
@@ -335,3 +370,63 @@ class AdminAuditLog(models.Model):
     def __str__(self):
         actor_name = self.actor.username if self.actor else 'System'
         return f"{actor_name} -> {self.action_type} ({self.target_type}:{self.target_id})"
+
+
+class FCMDevice(models.Model):
+    """
+    One push-capable install of the app. A user can have several (phone,
+    tablet, reinstall); pushes go to all of their active devices. Tokens that
+    FCM reports as dead are deleted by core.services.fcm_service.
+    """
+    PLATFORM_CHOICES = [
+        ('ANDROID', 'Android'),
+        ('IOS', 'iOS'),
+        ('WEB', 'Web'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='fcm_devices')
+    token = models.CharField(max_length=255, unique=True)
+    platform = models.CharField(max_length=10, choices=PLATFORM_CHOICES, blank=True)
+    app_version = models.CharField(max_length=20, blank=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'last_seen'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.platform or 'device'}"
+
+
+class DirectoryLocation(models.Model):
+    """A normalized city/country that member locations resolve to."""
+    key = models.CharField(max_length=255, unique=True)  # casefolded "city|country"
+    city = models.CharField(max_length=100, blank=True)
+    country = models.CharField(max_length=100, db_index=True)
+
+    @property
+    def label(self):
+        return f"{self.city}, {self.country}" if self.city else self.country
+
+    def __str__(self):
+        return self.label
+
+
+class DirectoryFacet(models.Model):
+    """Precomputed member count for one directory filter value."""
+    FACET_CHOICES = [
+        ('industry', 'Industry'),
+        ('tier', 'Tier'),
+        ('country', 'Country'),
+        ('city', 'City'),
+    ]
+
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('facet', 'value')
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
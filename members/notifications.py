@@ -0,0 +1,168 @@
+"""
+In-app notification inbox.
+
+- notify() / notify_users() create Notification rows and queue the push for
+  after the transaction commits. Delivery runs on the push coalescer thread
+  (core/services/push_service.py), not in the request or in a post_save signal.
+- Profile.unread_notifications is a denormalized unread counter, so badges
+  don't need a COUNT over the table. Single inserts/deletes keep it in step via
+  signals (members/signals.py); the bulk paths here adjust it by the number of
+  rows they actually changed. recount_unread() rebuilds it if it ever drifts.
+- archive_read() moves old read rows to gzipped JSONL files in storage in
+  batches, keeping the table small.
+"""
+import gzip
+import json
+import tempfile
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Notification, Profile
+
+NOTIFICATION_DATA = {
+    "click_action": "FLUTTER_NOTIFICATION_CLICK",
+    "type": "general_notification",
+}
+
+
+def archive_prefix():
+    return getattr(settings, 'NOTIFICATION_ARCHIVE_PREFIX', 'notification_archive/')
+
+
+def _adjust_unread(counts):
+    """Apply {user_id: delta} to the unread counters (never below zero)."""
+    by_delta = {}
+    for user_id, delta in counts.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(user_id)
+    for delta, user_ids in by_delta.items():
+        Profile.objects.filter(user_id__in=user_ids).update(
+            unread_notifications=Greatest(F('unread_notifications') + delta, Value(0))
+        )
+
+
+def increment_unread(user_id, delta=1):
+    _adjust_unread({user_id: delta})
+
+
+def unread_count(user):
+    return Profile.objects.filter(user=user).values_list('unread_notifications', flat=True).first() or 0
+
+
+def recount_unread(user_ids=None):
+    """Rebuild the counters from the Notification table."""
+    unread = (
+        Notification.objects.filter(recipient_id=OuterRef('user_id'), is_read=False)
+        .order_by()
+        .values('recipient_id')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    profiles = Profile.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+    return profiles.update(
+        unread_notifications=Coalesce(Subquery(unread, output_field=IntegerField()), Value(0))
+    )
+
+
+def _queue_push(notification):
+    from core.services.push_service import queue_notification_push
+
+    data = dict(NOTIFICATION_DATA, id=str(notification.id))
+    transaction.on_commit(lambda: queue_notification_push(
+        notification.recipient_id, notification.title, notification.message, data,
+    ))
+
+
+def notify(recipient, title, message, push=True):
+    """Create one notification; the push (if any) goes out after commit."""
+    notification = Notification.objects.create(recipient=recipient, title=title, message=message)
+    if push:
+        _queue_push(notification)
+    return notification
+
+
+def notify_users(recipients, title, message, push=True):
+    """Same notification for many users: one INSERT, one counter UPDATE, batched push."""
+    recipients = list(recipients)
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create([
+            Notification(recipient=user, title=title, message=message) for user in recipients
+        ])
+        _adjust_unread(Counter(user.id for user in recipients))
+
+    if push and recipients:
+        from core.services.fcm_service import send_push_to_users
+
+        user_ids = [user.id for user in recipients]
+        transaction.on_commit(lambda: send_push_to_users(user_ids, title, message, data=NOTIFICATION_DATA))
+    return notifications
+
+
+def mark_read(user, ids=None):
+    """
+    Mark `ids` (or everything, when None) read for `user`. Returns the number
+    of notifications that changed; the counter drops by exactly that.
+    """
+    notifications = Notification.objects.filter(recipient=user, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    with transaction.atomic():
+        changed = notifications.update(is_read=True)
+        if changed:
+            increment_unread(user.id, -changed)
+    return changed
+
+
+def _record(notification):
+    return {
+        'id': notification.id,
+        'recipient_id': notification.recipient_id,
+        'title': notification.title,
+        'message': notification.message,
+        'created_at': notification.created_at,
+    }
+
+
+def archive_read(cutoff, batch_size=1000):
+    """
+    Move read notifications created before `cutoff` to storage, one gzipped
+    JSONL file per batch. Each file is saved before its rows are deleted.
+    Yields (storage_key, count) per batch.
+    """
+    last_id = 0
+    while True:
+        batch = list(
+            Notification.objects.filter(is_read=True, created_at__lt=cutoff, id__gt=last_id)
+            .order_by('id')[:batch_size]
+        )
+        if not batch:
+            return
+        last_id = batch[-1].id
+
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as buffer:
+            with gzip.GzipFile(fileobj=buffer, mode='wb') as gz:
+                for notification in batch:
+                    gz.write(json.dumps(_record(notification), cls=DjangoJSONEncoder).encode() + b'\n')
+            buffer.seek(0)
+            key = default_storage.save(
+                f'{archive_prefix()}{cutoff:%Y-%m-%d}/{batch[0].id}-{last_id}-{uuid.uuid4().hex[:8]}.jsonl.gz',
+                File(buffer),
+            )
+
+        # Read rows only, so the unread counters are unaffected
+        Notification.objects.filter(id__in=[n.id for n in batch], is_read=True).delete()
+        yield key, len(batch)
+
+
+def pending_archive_count(cutoff):
+    return Notification.objects.filter(is_read=True, created_at__lt=cutoff).count()
@@ -6,6 +6,24 @@ from datetime import timedelta
 from django.conf import settings
 import boto3
 
+from core.services.storage_url_service import file_url, profile_photo_url
+
+
+def attach_direct_upload(serializer, attrs, token_field, file_field, purpose):
+    """
+    Swap a direct-upload token (see core/services/upload_service.py) for the
+    storage key of the uploaded object, so the model's file field points at it.
+    """
+    token = attrs.pop(token_field, None)
+    if not token:
+        return attrs
+    from core.services.upload_service import UploadError, confirm_upload
+    try:
+        attrs[file_field] = confirm_upload(serializer.context['request'].user, token, purpose)
+    except UploadError as e:
+        raise serializers.ValidationError({token_field: str(e)})
+    return attrs
+
 class ProfileSerializer(serializers.ModelSerializer):
     # Fetch the username from the related User model
     username = serializers.CharField(source='user.username', read_only=True)
@@ -63,6 +81,11 @@ class ProfileSerializer(serializers.ModelSerializer):
             instance.is_premium = validated_data['is_premium']
             
         instance.save()
+
+        # Older app builds register their push token here; record it as a device
+        if validated_data.get('fcm_token'):
+            from core.services.fcm_service import register_device
+            register_device(instance.user, validated_data['fcm_token'])
             
         return super().update(instance, validated_data)
 
@@ -73,23 +96,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         return (timezone.now() - obj.last_seen) < timedelta(minutes=5)
 
     def get_photo_url(self, obj):
-        if not obj.photo:
-            return obj.photo_url
-
-        # Check for S3
-        is_s3 = 's3' in settings.DEFAULT_FILE_STORAGE.lower() or (
-            hasattr(settings, 'STORAGES') and 
-            's3' in settings.STORAGES.get('default', {}).get('BACKEND', '').lower()
-        )
-
-        if not is_s3:
-            try:
-                request = self.context.get('request')
-                return request.build_absolute_uri(obj.photo.url)
-            except:
-                return obj.photo.url
-
-        return obj.photo.url
+        return profile_photo_url(obj, self.context.get('request'))
 
 
 class BusinessProfileSerializer(serializers.ModelSerializer):
@@ -104,8 +111,7 @@ class BusinessProfileSerializer(serializers.ModelSerializer):
         if not obj.logo:
             return None
         
-        # S3 Check & Static URL
-        return obj.logo.url
+        return file_url(obj.logo, self.context.get('request'))
 
 class AdminBusinessProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -132,35 +138,37 @@ class MarketingCommentSerializer(serializers.ModelSerializer):
 
     def get_photo_url(self, obj):
         try:
-            profile = obj.user.profile
-            if not profile.photo:
-                return profile.photo_url
-            
-            return profile.photo.url
+            return profile_photo_url(obj.user.profile, self.context.get('request'))
         except:
             return None
 
 class MarketingRequestSerializer(serializers.ModelSerializer):
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
+    # Counter columns; see MarketingLikeView / MarketingCommentView
+    likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.SerializerMethodField()
     username = serializers.CharField(source='user.username', read_only=True)
     user_photo = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
     video_url = serializers.SerializerMethodField()
+    # Direct uploads: upload_token from /api/uploads/ instead of a multipart file
+    image_upload = serializers.CharField(write_only=True, required=False)
+    video_upload = serializers.CharField(write_only=True, required=False)
 
     class Meta:
         model = MarketingRequest
-        fields = ['id', 'user', 'type', 'title', 'image', 'image_url', 'video', 'video_url', 'link', 'status', 'feedback', 'created_at', 'likes_count', 'comments_count', 'is_liked', 'username', 'user_photo']
+        fields = ['id', 'user', 'type', 'title', 'image', 'image_url', 'video', 'video_url', 'image_upload', 'video_upload', 'link', 'status', 'feedback', 'created_at', 'likes_count', 'comments_count', 'is_liked', 'username', 'user_photo']
         read_only_fields = ['user', 'status', 'feedback']
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+    def validate(self, attrs):
+        attrs = attach_direct_upload(self, attrs, 'image_upload', 'image', 'marketing_image')
+        return attach_direct_upload(self, attrs, 'video_upload', 'video', 'marketing_video')
 
     def get_is_liked(self, obj):
+        # Annotated by the list views (members.views.marketing_requests_for)
+        liked = getattr(obj, 'viewer_has_liked', None)
+        if liked is not None:
+            return liked
         request = self.context.get('request', None)
         if request and request.user.is_authenticated:
             return obj.likes.filter(user=request.user).exists()
@@ -168,24 +176,18 @@ class MarketingRequestSerializer(serializers.ModelSerializer):
 
     def get_user_photo(self, obj):
         try:
-            profile = obj.user.profile
-            if not profile.photo:
-                return profile.photo_url
-            
-            return profile.photo.url
+            return profile_photo_url(obj.user.profile, self.context.get('request'))
         except:
             return None
 
     def get_image_url(self, obj):
-        if not obj.image: return None
-        return obj.image.url
+        return file_url(obj.image, self.context.get('request'))
 
     def get_video_url(self, obj):
-        if not obj.video: return None
-        return obj.video.url
+        return file_url(obj.video, self.context.get('request'))
 
 class AdminMarketingRequestSerializer(serializers.ModelSerializer):
-    likes_count = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
     image_url = serializers.SerializerMethodField()
     video_url = serializers.SerializerMethodField()
@@ -209,19 +211,12 @@ class AdminMarketingRequestSerializer(serializers.ModelSerializer):
             'likes_count',
         ]
         read_only_fields = ['user', 'created_at'] # Admin can edit status and feedback
-    
-    def get_likes_count(self, obj):
-        return obj.likes.count()
 
     def get_image_url(self, obj):
-        if not obj.image:
-            return None
-        return obj.image.url
+        return file_url(obj.image, self.context.get('request'))
 
     def get_video_url(self, obj):
-        if not obj.video:
-            return None
-        return obj.video.url
+        return file_url(obj.video, self.context.get('request'))
 
 
 class ContentReportSerializer(serializers.ModelSerializer):
@@ -272,11 +267,20 @@ class StorySerializer(serializers.ModelSerializer):
     seen = serializers.SerializerMethodField()
     is_active = serializers.BooleanField(read_only=True)
     is_owner = serializers.SerializerMethodField()
+    # Direct uploads: upload_token from /api/uploads/ instead of a multipart file
+    media_upload = serializers.CharField(write_only=True, required=False)
 
     class Meta:
         model = Story
-        fields = ['id', 'user', 'username', 'user_photo', 'media', 'media_url', 'created_at', 'seen', 'is_active', 'is_owner']
+        fields = ['id', 'user', 'username', 'user_photo', 'media', 'media_upload', 'media_url', 'created_at', 'seen', 'is_active', 'is_owner']
         read_only_fields = ['user', 'created_at']
+        extra_kwargs = {'media': {'required': False}}
+
+    def validate(self, attrs):
+        attrs = attach_direct_upload(self, attrs, 'media_upload', 'media', 'story_media')
+        if not self.instance and not attrs.get('media'):
+            raise serializers.ValidationError({'media': 'Provide a media file or media_upload.'})
+        return attrs
 
     def get_is_owner(self, obj):
         request = self.context.get('request')
@@ -290,16 +294,11 @@ class StorySerializer(serializers.ModelSerializer):
 
     def get_user_photo(self, obj):
         if hasattr(obj.user, 'profile'):
-            p = obj.user.profile
-            if p.photo:
-                return p.photo.url
-            return p.photo_url
+            return profile_photo_url(obj.user.profile, self.context.get('request'))
         return None
 
     def get_media_url(self, obj):
-        if not obj.media:
-            return None
-        return obj.media.url
+        return file_url(obj.media, self.context.get('request'))
 
 
 class StoryViewSerializer(serializers.ModelSerializer):
@@ -1,53 +1,79 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in
-from .models import Notification
-from firebase_admin import messaging
+from .models import Notification, Profile
 import logging
 
 logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Notification)
-def send_fcm_notification(sender, instance, created, **kwargs):
+def count_unread_notification(sender, instance, created, **kwargs):
     """
-    Triggers when a Notification is created.
-    Sends a push notification to the recipient via FCM.
+    Keeps Profile.unread_notifications in step with single inserts.
+    Push delivery is queued by members.notifications.notify(), after commit.
     """
+    if created and not instance.is_read:
+        from .notifications import increment_unread
+        increment_unread(instance.recipient_id)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        from .notifications import increment_unread
+        increment_unread(instance.recipient_id, -1)
+
+
+# --- Directory facets (members/directory.py) ---
+
+def _facet_snapshot(instance):
+    # Read from __dict__ so deferred fields are never loaded just for this
+    values = instance.__dict__
+    if not all(name in values for name in ('industry', 'tier', 'location', 'location_ref_id')):
+        return None
+    return (values['industry'], values['tier'], values['location'], values['location_ref_id'])
+
+
+@receiver(post_init, sender=Profile)
+def remember_directory_facets(sender, instance, **kwargs):
+    instance._directory_snapshot = _facet_snapshot(instance)
+
+
+@receiver(post_save, sender=Profile)
+def update_directory_facets(sender, instance, created, **kwargs):
+    from .directory import facet_values, profile_facet_values, record_change
+    from .models import DirectoryLocation
+
+    snapshot = instance._directory_snapshot
+    current = _facet_snapshot(instance)
     if created:
-        # Check if the instance has a flag to skip FCM (e.g. set by Chat View)
-        if getattr(instance, 'skip_fcm', False):
-            return
-
-        try:
-            # 1. Get User's FCM Token
-            user_profile = getattr(instance.recipient, 'profile', None)
-            if not user_profile or not user_profile.fcm_token:
-                logger.warning(f"Skipping Push: No FCM token for user {instance.recipient.username}")
-                return
-
-            token = user_profile.fcm_token
-
-            # 2. Construct Message
-            # See FCM docs: https://firebase.google.com/docs/cloud-messaging/send-message
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=instance.title,
-                    body=instance.message,
-                ),
-                data={
-                    "click_action": "FLUTTER_NOTIFICATION_CLICK",
-                    "id": str(instance.id),
-                    "type": "general_notification" 
-                },
-                token=token,
-            )
+        record_change(None, profile_facet_values(instance))
+    elif snapshot and current and (snapshot[0], snapshot[1], snapshot[3]) != (current[0], current[1], current[3]):
+        old_location = DirectoryLocation.objects.filter(id=snapshot[3]).first() if snapshot[3] else None
+        record_change(facet_values(snapshot[0], snapshot[1], old_location), profile_facet_values(instance))
+    instance._directory_snapshot = current
 
-            # 3. Send
-            response = messaging.send(message)
-            logger.info(f"✅ Push Sent to {instance.recipient.username}: {response}")
 
-        except Exception as e:
-            logger.error(f"❌ Failed to send FCM Push: {e}")
+@receiver(post_delete, sender=Profile)
+def remove_directory_facets(sender, instance, **kwargs):
+    from .directory import profile_facet_values, record_change
+    record_change(profile_facet_values(instance), None)
+
+
+@receiver(m2m_changed, sender=Profile.blocked_users.through)
+def invalidate_block_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached block sets (core/services/block_service.py) of everyone affected."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    from core.services.block_service import invalidate
+    through = Profile.blocked_users.through
+    if reverse:
+        # instance is the blocked User; pk_set holds blocker Profile ids
+        blockers = through.objects.filter(user_id=instance.pk) if pk_set is None else through.objects.filter(profile_id__in=pk_set)
+        invalidate([instance.pk, *blockers.values_list('profile__user_id', flat=True)])
+    else:
+        targets = instance.blocked_users.values_list('id', flat=True) if pk_set is None else pk_set
+        invalidate([instance.user_id, *targets])
 
 
 @receiver(user_logged_in)
@@ -117,3 +143,37 @@ def notify_global_new_post(sender, instance, created, **kwargs):
             body=f"{instance.title}: Check out our latest update!",
             data={"type": "new_post", "post_id": str(instance.id)}
          )
+
+
+# MarketingRequest.likes_count / comments_count follow their rows here, so
+# every path (views, admin, cascades from a deleted user or post) keeps them in step
+def _move_marketing_counter(instance, field, delta):
+    from django.db.models import F
+    from django.db.models.functions import Greatest
+    from .models import MarketingRequest
+
+    MarketingRequest.objects.filter(id=instance.marketing_request_id).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@receiver(post_save, sender='members.MarketingLike')
+def count_marketing_like(sender, instance, created, **kwargs):
+    if created:
+        _move_marketing_counter(instance, 'likes_count', 1)
+
+
+@receiver(post_delete, sender='members.MarketingLike')
+def uncount_marketing_like(sender, instance, **kwargs):
+    _move_marketing_counter(instance, 'likes_count', -1)
+
+
+@receiver(post_save, sender='members.MarketingComment')
+def count_marketing_comment(sender, instance, created, **kwargs):
+    if created:
+        _move_marketing_counter(instance, 'comments_count', 1)
+
+
+@receiver(post_delete, sender='members.MarketingComment')
+def uncount_marketing_comment(sender, instance, **kwargs):
+    _move_marketing_counter(instance, 'comments_count', -1)
@@ -1,9 +1,27 @@
+import csv
+import gzip
+import json
+from io import StringIO
+import tempfile
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from members.models import AdminAuditLog, BusinessProfile, ContentReport
+from members import directory, notifications, wix_sync
+from events.models import Event, Ticket, TicketTier
+from members.models import (
+    AdminAuditLog, BusinessProfile, ContentReport, DirectoryFacet, FCMDevice, MarketingRequest, Notification,
+    Profile,
+)
 
 
 class AdminAuditLogTests(APITestCase):
@@ -111,3 +129,518 @@ class AdminAuditLogTests(APITestCase):
         self.assertIsNotNone(log)
         self.assertEqual(log.metadata.get('old_status'), 'OPEN')
         self.assertEqual(log.metadata.get('new_status'), 'RESOLVED')
+
+
+class FCMDeviceTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='devices', email='devices@test.com', password='x')
+        self.client.force_authenticate(user=self.user)
+
+    def test_register_upserts_and_moves_token_between_accounts(self):
+        url = reverse('my-devices')
+        self.client.post(url, {'token': 'phone', 'platform': 'android', 'app_version': '1.0.9'}, format='json')
+        self.client.post(url, {'token': 'phone', 'platform': 'android', 'app_version': '1.0.10'}, format='json')
+        self.client.post(url, {'token': 'tablet', 'platform': 'ios'}, format='json')
+
+        devices = FCMDevice.objects.filter(user=self.user).order_by('token')
+        self.assertEqual([(d.token, d.platform, d.app_version) for d in devices],
+                         [('phone', 'ANDROID', '1.0.10'), ('tablet', 'IOS', '')])
+
+        other = User.objects.create_user(username='other', email='other@test.com', password='x')
+        self.client.force_authenticate(user=other)
+        self.client.post(url, {'token': 'phone'}, format='json')
+        self.assertEqual(FCMDevice.objects.get(token='phone').user, other)
+
+        response = self.client.delete(url, {'token': 'phone'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(FCMDevice.objects.filter(token='phone').exists())
+
+    def test_token_moved_to_another_account_stops_reaching_the_old_one(self):
+        from core.services import fcm_service
+
+        other = User.objects.create_user(username='other', email='other@test.com', password='x')
+        fcm_service.register_device(self.user, 'shared-phone')
+        fcm_service.register_device(other, 'shared-phone')
+
+        self.user.profile.refresh_from_db()
+        self.assertIsNone(self.user.profile.fcm_token)
+        self.assertEqual(fcm_service.active_tokens([self.user.id, other.id]), {other.id: ['shared-phone']})
+
+        # Even a stale legacy copy is ignored once the token belongs to a device row
+        Profile.objects.filter(user=self.user).update(fcm_token='shared-phone')
+        self.assertEqual(fcm_service.active_tokens([self.user.id]), {})
+
+    def test_legacy_token_only_for_users_without_devices(self):
+        from core.services import fcm_service
+
+        Profile.objects.filter(user=self.user).update(fcm_token='old-install')
+        self.assertEqual(fcm_service.active_tokens([self.user.id]), {self.user.id: ['old-install']})
+
+        fcm_service.register_device(self.user, 'new-install')
+        FCMDevice.objects.filter(token='new-install').update(last_seen=timezone.now() - timedelta(days=400))
+        Profile.objects.filter(user=self.user).update(fcm_token='old-install')
+        self.assertEqual(fcm_service.active_tokens([self.user.id]), {})
+
+    def test_push_targets_all_devices_and_prunes_dead_tokens(self):
+        from firebase_admin import messaging
+        from core.services import fcm_service
+
+        fcm_service.register_device(self.user, 'alive')
+        fcm_service.register_device(self.user, 'dead')
+        responses = SimpleNamespace(
+            success_count=1,
+            responses=[
+                SimpleNamespace(success=True, exception=None),
+                SimpleNamespace(success=False, exception=messaging.UnregisteredError('Requested entity was not found.')),
+            ],
+        )
+
+        with patch('firebase_admin.messaging.send_each_for_multicast', return_value=responses) as send:
+            self.assertTrue(fcm_service.send_push_notification(self.user, 'Hi', 'There'))
+
+        send.assert_called_once()
+        self.assertEqual(sorted(send.call_args.args[0].tokens), ['alive', 'dead'])
+        self.assertEqual(list(FCMDevice.objects.values_list('token', flat=True)), ['alive'])
+        self.user.profile.refresh_from_db()
+        self.assertNotEqual(self.user.profile.fcm_token, 'dead')
+
+
+class NotificationInboxTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='inbox', email='inbox@test.com', password='x')
+        self.client.force_authenticate(user=self.user)
+
+    def _unread_counter(self):
+        self.user.profile.refresh_from_db()
+        return self.user.profile.unread_notifications
+
+    def test_unpaged_list_keeps_the_old_shape(self):
+        created = [notifications.notify(self.user, f'Title {i}', 'Body', push=False) for i in range(3)]
+        Notification.objects.filter(id=created[0].id).update(is_read=True)
+
+        response = self.client.get(reverse('notification-list'))
+        self.assertEqual([n['id'] for n in response.data], [created[2].id, created[1].id])
+
+    def test_cursor_pages_and_bulk_mark_read_keep_counter(self):
+        created = [notifications.notify(self.user, f'Title {i}', 'Body', push=False) for i in range(25)]
+        self.assertEqual(self._unread_counter(), 25)
+
+        first = self.client.get(reverse('notification-list'), {'paged': 'true'})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data['results']), 20)
+        self.assertEqual(first.data['results'][0]['id'], created[-1].id)
+        self.assertEqual(first.data['unread_count'], 25)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 5)
+        self.assertIsNone(second.data['next'])
+
+        ids = ','.join(str(n.id) for n in created[:3])
+        response = self.client.post(f"{reverse('notification-mark-read')}?ids={ids}")
+        self.assertEqual(response.data, {'updated': 3, 'unread_count': 22})
+        # Already read: no double decrement
+        response = self.client.post(reverse('notification-mark-read'), {'ids': [created[0].id]}, format='json')
+        self.assertEqual(response.data, {'updated': 0, 'unread_count': 22})
+        self.assertEqual(self.client.post(reverse('notification-mark-read')).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(reverse('notification-mark-all-read'))
+        self.assertEqual(response.data, {'updated': 22, 'unread_count': 0})
+        self.assertEqual(self.client.get(reverse('notification-list')).data, [])
+        self.assertEqual(len(self.client.get(reverse('notification-list'), {'include_read': 'true', 'paged': 'true', 'page_size': 100}).data['results']), 25)
+
+        Notification.objects.create(recipient=self.user, title='Direct', message='insert')
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data, {'unread_count': 1})
+
+    @patch('core.services.fcm_service.send_push_notification', return_value=True)
+    def test_push_is_sent_after_commit_not_on_save(self, push):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            notification = notifications.notify(self.user, 'Account Suspended', 'Details')
+            Notification.objects.create(recipient=self.user, title='No push', message='x')
+        push.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        push.assert_called_once()
+        self.assertEqual(push.call_args.args[1:], ('Account Suspended', 'Details'))
+        self.assertEqual(push.call_args.kwargs['data']['id'], str(notification.id))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_retention_archives_old_read_rows_in_batches(self):
+        old_read = [notifications.notify(self.user, f'Old {i}', 'x', push=False) for i in range(5)]
+        old_unread = notifications.notify(self.user, 'Old unread', 'x', push=False)
+        recent_read = notifications.notify(self.user, 'Recent', 'x', push=False)
+        notifications.mark_read(self.user, ids=[n.id for n in old_read] + [recent_read.id])
+        Notification.objects.exclude(id=recent_read.id).update(created_at=timezone.now() - timedelta(days=200))
+
+        call_command('archive_notifications', '--days=90', '--batch-size=2', '--recount', stdout=StringIO())
+
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)), {old_unread.id, recent_read.id},
+        )
+        self.assertEqual(self._unread_counter(), 1)
+
+
+class DirectoryFacetTests(APITestCase):
+    def setUp(self):
+        cache.delete(directory.FACET_CACHE_KEY)
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@test.com', password='x')
+        self.client.force_authenticate(user=self.viewer)
+
+    def _member(self, username, **fields):
+        user = User.objects.create_user(username=username, email=f'{username}@test.com', password='x')
+        for name, value in fields.items():
+            setattr(user.profile, name, value)
+        user.profile.save()
+        return user.profile
+
+    def test_locations_are_normalized(self):
+        self.assertEqual(directory.normalize_location(' cape town ,  SOUTH AFRICA '), ('Cape Town', 'South Africa'))
+        self.assertEqual(directory.normalize_location('USA'), ('', 'United States'))
+        self.assertEqual(directory.normalize_location(''), ('', ''))
+
+    def test_counts_follow_profile_saves(self):
+        lagos = self._member('ada', industry='TECH', tier='PREMIUM', location='Lagos, Nigeria')
+        self._member('bola', industry='TECH', location='lagos,nigeria')
+        self._member('cara', industry='LEG', location='USA')
+
+        facets = directory.facet_counts()
+        self.assertEqual(facets['country'], {'Nigeria': 2, 'United States': 1})
+        self.assertEqual(facets['city'], {'Lagos, Nigeria': 2})
+        self.assertEqual(facets['industry']['TECH'], 2)
+        self.assertEqual(lagos.location_ref, User.objects.get(username='bola').profile.location_ref)
+
+        lagos.location = 'United States of America'
+        lagos.tier = 'STANDARD'
+        lagos.save()
+        facets = directory.facet_counts()
+        self.assertEqual(facets['country'], {'United States': 2, 'Nigeria': 1})
+        self.assertEqual(facets['tier'].get('PREMIUM'), None)
+        self.assertEqual(facets['tier']['STANDARD'], 1)
+
+        User.objects.get(username='cara').delete()
+        counts = dict(DirectoryFacet.objects.values_list('value', 'count'))
+        self.assertEqual(counts['United States'], 1)
+        self.assertNotIn('LEG', counts)
+
+        expected = directory.facet_counts()
+        call_command('rebuild_directory_facets', stdout=StringIO())
+        self.assertEqual(directory.facet_counts(), expected)
+
+    def test_member_list_facets_and_country_filter(self):
+        self._member('ada', industry='TECH', location='Lagos, Nigeria')
+        self._member('bola', industry='LEG', location='Abuja, Nigeria')
+        self._member('cara', industry='TECH', location='UK')
+
+        response = self.client.get(reverse('member-list'), {'facets': 1})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(response.data['facets']['country'], {'Nigeria': 2, 'United Kingdom': 1})
+
+        with self.assertNumQueries(1):
+            facets = directory.filtered_facets(
+                directory.Profile.objects.filter(location_ref__country='Nigeria')
+            )
+        self.assertEqual(facets['industry'], {'LEG': 1, 'TECH': 1})
+
+        response = self.client.get(reverse('member-list'), {'facets': 1, 'location': 'Nigeria', 'industry': 'TECH'})
+        self.assertEqual([p['username'] for p in response.data['results']], ['ada'])
+        self.assertEqual(response.data['facets']['city'], {'Lagos, Nigeria': 1})
+
+        self.assertEqual(self.client.get(reverse('unique-locations')).data, ['Nigeria', 'United Kingdom'])
+
+    def test_unfiltered_facets_leave_out_blocked_members(self):
+        self._member('ada', industry='TECH', location='Lagos, Nigeria')
+        cara = self._member('cara', industry='TECH', location='UK')
+        self.viewer.profile.blocked_users.add(cara.user)
+
+        response = self.client.get(reverse('member-list'), {'facets': 1})
+        self.assertEqual([p['username'] for p in response.data['results']], ['ada', 'viewer'])
+        self.assertEqual(response.data['facets']['country'], {'Nigeria': 1})
+
+
+class BlockGraphTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@test.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@test.com', password='x')
+        self.client.force_authenticate(user=self.alice)
+
+    def tearDown(self):
+        # Cached sets would outlive the rolled-back rows
+        cache.clear()
+
+    def test_block_endpoint_invalidates_cached_sets(self):
+        from core.services import block_service
+
+        self.assertFalse(block_service.is_blocked(self.bob, self.alice))
+        self.client.post(reverse('block-user', kwargs={'user_id': self.bob.id}))
+
+        self.assertTrue(block_service.has_blocked(self.alice, self.bob))
+        with self.assertNumQueries(0):
+            self.assertTrue(block_service.is_blocked(self.alice, self.bob))
+        self.assertTrue(block_service.is_blocked(self.bob, self.alice))
+        self.assertFalse(block_service.has_blocked(self.bob, self.alice))
+        self.assertEqual([p['username'] for p in self.client.get(reverse('blocked-user-list')).data], ['bob'])
+
+        self.client.delete(reverse('block-user', kwargs={'user_id': self.bob.id}))
+        self.assertFalse(block_service.is_blocked(self.bob, self.alice))
+
+        # Reverse-side changes invalidate the blocker too
+        self.bob.blocked_by.add(self.alice.profile)
+        self.assertTrue(block_service.has_blocked(self.alice, self.bob))
+        self.alice.profile.blocked_users.clear()
+        self.assertFalse(block_service.is_blocked(self.alice, self.bob))
+
+    @override_settings(SHARED_CACHE=False)
+    def test_per_worker_cache_is_not_trusted(self):
+        from core.services import block_service
+
+        # Another worker cached "nothing blocked" before the block
+        cache.set(block_service._key(self.bob.id), (frozenset(), frozenset()))
+        self.alice.profile.blocked_users.add(self.bob)
+        cache.set(block_service._key(self.bob.id), (frozenset(), frozenset()))
+
+        with self.assertNumQueries(1):
+            self.assertTrue(block_service.is_blocked(self.bob, self.alice))
+
+    @patch('core.services.fcm_service.send_push_notification', return_value=True)
+    def test_blocked_users_are_hidden_both_ways(self, _push):
+        self.bob.profile.blocked_users.add(self.alice)
+
+        usernames = [p['username'] for p in self.client.get(reverse('member-list')).data]
+        self.assertNotIn('bob', usernames)
+        self.assertIn('alice', usernames)
+
+        response = self.client.post(reverse('send-message'), {'recipient_id': self.bob.id, 'text': 'hi'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['error'], 'You cannot send messages to this user.')
+
+
+class MarketingFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@test.com', password='x')
+        self.client.force_authenticate(user=self.viewer)
+        self.posts = []
+        for i in range(5):
+            author = User.objects.create_user(username=f'author{i}', email=f'author{i}@test.com', password='x')
+            self.posts.append(MarketingRequest.objects.create(user=author, type='AD', title=f'Post {i}', status='APPROVED'))
+
+    @patch('core.services.fcm_service.send_push_notification', return_value=True)
+    def test_feed_page_query_count_and_counters(self, _push):
+        post = self.posts[0]
+        self.assertEqual(self.client.post(reverse('marketing-like', kwargs={'pk': post.id})).data, {'status': 'liked', 'count': 1})
+        self.client.post(reverse('marketing-comments', kwargs={'pk': post.id}), {'content': 'Nice'}, format='json')
+        self.client.post(reverse('marketing-comments', kwargs={'pk': post.id}), {'content': 'Again'}, format='json')
+
+        # Posts, authors, profiles, counters and is_liked in one statement
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('marketing-feed'))
+        item = {p['id']: p for p in response.data}[post.id]
+        self.assertEqual((item['likes_count'], item['comments_count'], item['is_liked']), (1, 2, True))
+        self.assertFalse({p['id']: p for p in response.data}[self.posts[1].id]['is_liked'])
+
+        self.assertEqual(self.client.post(reverse('marketing-like', kwargs={'pk': post.id})).data, {'status': 'unliked', 'count': 0})
+
+    @patch('core.services.fcm_service.send_push_notification', return_value=True)
+    def test_cascaded_deletes_keep_counters_in_step(self, _push):
+        post = self.posts[0]
+        fan = User.objects.create_user(username='fan', email='fan@test.com', password='x')
+        self.client.post(reverse('marketing-like', kwargs={'pk': post.id}))
+        self.client.force_authenticate(user=fan)
+        self.client.post(reverse('marketing-like', kwargs={'pk': post.id}))
+        self.client.post(reverse('marketing-comments', kwargs={'pk': post.id}), {'content': 'Love it'}, format='json')
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.comments_count), (2, 1))
+
+        # Deleting the account cascades to its like and comment
+        admin = User.objects.create_user(username='boss', email='boss@test.com', password='x', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        self.client.delete(reverse('admin_user_detail', kwargs={'pk': fan.id}))
+        self.assertFalse(User.objects.filter(id=fan.id).exists())
+
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.comments_count), (1, 0))
+
+    def test_edits_do_not_overwrite_counters(self):
+        stale = MarketingRequest.objects.get(id=self.posts[0].id)
+        MarketingRequest.objects.filter(id=stale.id).update(likes_count=7)
+
+        stale.title = 'Edited'
+        stale.save()
+
+        fresh = MarketingRequest.objects.get(id=stale.id)
+        self.assertEqual((fresh.title, fresh.likes_count), ('Edited', 7))
+
+
+class AdminExportTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', email='admin@test.com', password='x', is_staff=True)
+        self.buyer = User.objects.create_user(
+            username='buyer', email='buyer@test.com', password='x', first_name='Ada', last_name='Lovelace',
+        )
+        event = Event.objects.create(title='Summit', location='Cape Town', date=date(2026, 4, 10), organizer=self.admin)
+        tier = TicketTier.objects.create(event=event, name='General', price='25.00', currency='usd', capacity=10, available=10)
+        for i in range(3):
+            Ticket.objects.create(
+                event=event, tier=tier, user=self.buyer, purchase_price='20.00', original_price='25.00',
+                first_name='Guest' if i == 0 else None,
+            )
+        AdminAuditLog.objects.create(
+            actor=self.admin, action_type='MODERATION_ACTION', target_type='user', target_id=str(self.buyer.id),
+            target_label='=HYPERLINK("x")', metadata={'action': 'WARN'},
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ticket_csv_is_streamed_from_one_query(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('admin-tickets-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="tickets-', response['Content-Disposition'])
+
+        # The header goes out before the query runs; every row comes from one joined query
+        chunks = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            header = next(chunks)
+        self.assertTrue(header.startswith(b'id,buyer_name,buyer_email,event_id'))
+        with self.assertNumQueries(1):
+            rest = b''.join(chunks)
+
+        rows = list(csv.DictReader(StringIO((header + rest).decode())))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(sorted(row['buyer_name'] for row in rows), ['Ada Lovelace', 'Ada Lovelace', 'Guest'])
+        self.assertEqual({row['event_title'] for row in rows}, {'Summit'})
+        self.assertEqual({row['discount_label'] for row in rows}, {'20% Discount'})
+
+    def test_ndjson_and_gzip(self):
+        response = self.client.get(reverse('admin-audit-logs-export'), {'output': 'ndjson', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson.gz"'))
+
+        lines = gzip.decompress(self._body(response)).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        entry = json.loads(lines[0])
+        self.assertEqual(entry['actor_username'], 'admin')
+        self.assertEqual(entry['metadata'], {'action': 'WARN'})
+        self.assertEqual(entry['target_label'], '=HYPERLINK("x")')
+
+    def test_csv_cells_are_not_formulas(self):
+        body = self._body(self.client.get(reverse('admin-audit-logs-export'))).decode()
+        row = next(csv.DictReader(StringIO(body)))
+        self.assertEqual(row['target_label'], '\'=HYPERLINK("x")')
+        self.assertEqual(json.loads(row['metadata']), {'action': 'WARN'})
+
+    def test_unknown_output_and_non_admins_are_rejected(self):
+        self.assertEqual(
+            self.client.get(reverse('admin-login-logs-export'), {'output': 'xlsx'}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.client.force_authenticate(user=self.buyer)
+        self.assertEqual(self.client.get(reverse('admin-tickets-export')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class WixMemberSyncTests(APITestCase):
+    def setUp(self):
+        self.media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+
+        self.ada = User.objects.create_user(username='ada', email='Ada@Example.com', password='x')
+        self.bea = User.objects.create_user(username='bea', email='bea@example.com', password='x')
+        self.cat = User.objects.create_user(username='cat', email='cat@example.com', password='x')
+        self.bea.profile.tier = 'STANDARD'
+        self.bea.profile.save()
+        self.cat.profile.tier = 'PREMIUM'
+        self.cat.profile.is_premium = True
+        self.cat.profile.save()
+
+        contacts = [
+            # Contacts v4 shape
+            {'primaryInfo': {'email': 'ada@example.com'}, 'info': {'labelKeys': {'items': ['custom.premium-member']}}},
+            {'info': {'emails': [{'email': 'BEA@example.com'}], 'labelKeys': ['custom.standard']}},
+            {'info': {'emails': [{'email': 'cat@example.com'}], 'labelKeys': []}},
+            {'info': {'emails': [{'email': 'nobody@example.com'}], 'labelKeys': ['custom.premium']}},
+            {'info': {'labelKeys': ['custom.premium']}},
+        ]
+        fixture = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        json.dump({'contacts': contacts}, fixture)
+        fixture.close()
+        self.fixture = fixture.name
+
+    def _sync(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('sync_wix_members', f'--fixture={self.fixture}', '--page-size=2', *args, stdout=out)
+        return out.getvalue()
+
+    def _tiers(self):
+        return dict(User.objects.values_list('username', 'profile__tier'))
+
+    @patch('core.services.fcm_service.send_push_to_users', return_value=1)
+    def test_sync_updates_changed_tiers_and_notifies_only_them(self, push):
+        output = self._sync('--allow-downgrades')
+
+        self.assertIn('Updated 2 of 3 members matched from 5 contacts', output)
+        self.assertEqual(self._tiers(), {'ada': 'PREMIUM', 'bea': 'STANDARD', 'cat': 'FREE'})
+        self.assertEqual(
+            dict(User.objects.values_list('username', 'profile__is_premium')),
+            {'ada': True, 'bea': False, 'cat': False},
+        )
+        pushed = {call.kwargs['title']: ([u.username for u in call.args[0]], call.kwargs['body']) for call in push.call_args_list}
+        self.assertEqual(pushed['Account Upgraded'][0], ['ada'])
+        self.assertIn('PREMIUM member', pushed['Account Upgraded'][1])
+        # The downgrade isn't announced as an upgrade
+        self.assertEqual(pushed['Membership Updated'], (['cat'], 'Your membership has been synced with Wix and is now FREE.'))
+
+        # Facet counts were moved along with the bulk update
+        counts = directory.facet_counts()['tier']
+        directory.rebuild_facets()
+        cache.clear()
+        self.assertEqual(counts, directory.facet_counts()['tier'])
+
+        # A second run finds nothing to do
+        push.reset_mock()
+        self.assertIn('Updated 0 of 3 members', self._sync('--allow-downgrades'))
+        push.assert_not_called()
+
+    @patch('core.services.fcm_service.send_push_to_users', return_value=1)
+    def test_sync_resumes_from_checkpoint(self, push):
+        wix_sync.save_checkpoint({
+            'source': 'fixture', 'cursor': '2', 'started_at': timezone.now().isoformat(),
+            'contacts': 2, 'matched': 2, 'changed': 1,
+        })
+
+        output = self._sync('--allow-downgrades')
+
+        # Only cat (third contact) was processed in this run; totals carry over
+        self.assertEqual(self._tiers(), {'ada': 'FREE', 'bea': 'STANDARD', 'cat': 'FREE'})
+        self.assertIn('Updated 2 of 3 members matched from 5 contacts', output)
+        self.assertIsNone(wix_sync.load_checkpoint(wix_sync.FixtureContacts(self.fixture)))
+
+        self._sync('--restart', '--no-push')
+        self.assertEqual(self._tiers()['ada'], 'PREMIUM')
+        self.assertEqual(push.call_count, 1)
+
+    def test_dry_run_and_downgrades_are_opt_in(self):
+        self.assertIn('Would update 2 of 3 members', self._sync('--dry-run', '--allow-downgrades'))
+        self.assertEqual(self._tiers(), {'ada': 'FREE', 'bea': 'STANDARD', 'cat': 'PREMIUM'})
+
+        self._sync('--no-push')
+        self.assertEqual(self._tiers(), {'ada': 'PREMIUM', 'bea': 'STANDARD', 'cat': 'PREMIUM'})
+
+    def test_running_paid_subscription_is_never_downgraded(self):
+        Profile.objects.filter(user=self.cat).update(subscription_expiry=timezone.now() + timedelta(days=30))
+        self._sync('--no-push', '--allow-downgrades')
+        self.assertEqual(self._tiers()['cat'], 'PREMIUM')
+
+        Profile.objects.filter(user=self.cat).update(subscription_expiry=timezone.now() - timedelta(days=1))
+        self._sync('--no-push', '--allow-downgrades', '--restart')
+        self.assertEqual(self._tiers()['cat'], 'FREE')
+
+    def test_label_mapping_matches_the_webhook(self):
+        self.assertEqual(wix_sync.tier_for_labels(['custom.premium-member', 'custom.standard']), 'PREMIUM')
+        self.assertEqual(wix_sync.tier_for_labels(['Standard Member']), 'STANDARD')
+        self.assertEqual(wix_sync.tier_for_labels([]), 'FREE')
@@ -1,7 +1,8 @@
 from rest_framework import viewsets, generics, permissions, status, mixins
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+from django.db.models import Exists, F, OuterRef, Q
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -9,6 +10,8 @@ from datetime import timedelta
 from .models import Profile
 from .serializers import ProfileSerializer
 from core.permissions import IsPremiumUser
+from core.services import block_service
+from core.services.storage_url_service import profile_photo_url
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAdminUser
 from .models import Profile, BusinessProfile, MarketingRequest, ContentReport, AdminAuditLog
@@ -95,9 +98,9 @@ class MemberListView(generics.ListAPIView):
         if tiers:
             queryset = queryset.filter(tier__in=tiers)
             
-        # Location/Country: Multi-select support (exact match on derived country strings)
+        # Location/Country: Multi-select support (normalized country, or the exact stored string)
         if locations:
-            queryset = queryset.filter(location__in=locations)
+            queryset = queryset.filter(Q(location_ref__country__in=locations) | Q(location__in=locations))
         
         # 3. STATUS FILTER: Suspended or Blocked
         status_filter = self.request.query_params.get('status', None)
@@ -106,8 +109,29 @@ class MemberListView(generics.ListAPIView):
         elif status_filter == 'blocked':
              queryset = queryset.filter(is_blocked=True)
 
+        # 4. BLOCKS: members don't see people they blocked or who blocked them (admins see everyone)
+        if not self.request.user.is_staff:
+            queryset = block_service.exclude_blocked(queryset, self.request.user, field='user_id')
+
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets') not in ('1', 'true'):
+            return response
+
+        # 5. FACETS: cached whole-directory counts, or one grouped query when filtered
+        # (blocks filter the directory too, so members with blocks get their own counts)
+        from .directory import facet_counts, filtered_facets
+        filter_params = ('search', 'industry', 'tier', 'location', 'status')
+        filtered = any(request.query_params.get(name) for name in filter_params)
+        if filtered or (not request.user.is_staff and block_service.hidden_ids(request.user)):
+            facets = filtered_facets(self.filter_queryset(self.get_queryset()))
+        else:
+            facets = facet_counts()
+        response.data = {'results': response.data, 'facets': facets}
+        return response
+
 
 class MemberDetailView(generics.RetrieveAPIView):
     """
@@ -124,11 +148,10 @@ class UniqueLocationsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        # Derive unique locations/countries from existing users
-        # We assume users enter their location in a fairly consistent way, 
-        # but even if not, we show the unique strings found in the DB.
-        locations = Profile.objects.exclude(location='').values_list('location', flat=True).distinct()
-        return Response(list(locations))
+        # Normalized countries of existing members, most members first, from the
+        # cached facet counts (members/directory.py) instead of a DISTINCT scan
+        from .directory import countries
+        return Response(countries())
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -139,6 +162,34 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         # Magic: Always return the profile of the logged-in user
         return self.request.user.profile
 
+class DeviceRegistrationView(APIView):
+    """
+    Push devices of the logged-in user. The app POSTs its FCM token on start-up
+    (and whenever it rotates) and DELETEs it on logout.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        from core.services.fcm_service import register_device
+        token = (request.data.get('token') or '').strip()
+        if not token:
+            return Response({'error': 'token is required'}, status=status.HTTP_400_BAD_REQUEST)
+        register_device(
+            request.user,
+            token,
+            platform=request.data.get('platform', ''),
+            app_version=request.data.get('app_version', ''),
+        )
+        return Response({'status': 'registered'})
+
+    def delete(self, request):
+        from core.services.fcm_service import unregister_device
+        token = (request.data.get('token') or '').strip()
+        if not token:
+            return Response({'error': 'token is required'}, status=status.HTTP_400_BAD_REQUEST)
+        unregister_device(request.user, token)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class ToggleFavoriteView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -184,7 +235,7 @@ class BlockedUserListView(generics.ListAPIView):
 
     def get_queryset(self):
         # Return profiles of users I have blocked
-        return Profile.objects.filter(user__in=self.request.user.profile.blocked_users.all())
+        return Profile.objects.filter(user_id__in=block_service.blocked_ids(self.request.user))
 
 
 # --- USER SUBMISSION VIEWS ---
@@ -206,6 +257,19 @@ class MyBusinessProfileView(generics.RetrieveUpdateDestroyAPIView,
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+def marketing_requests_for(user):
+    """
+    MarketingRequest rows ready for MarketingRequestSerializer in one query:
+    author and profile joined, counters from their columns, and whether
+    `user` liked each post as an EXISTS annotation.
+    """
+    from .models import MarketingLike
+    return MarketingRequest.objects.select_related('user__profile').annotate(
+        viewer_has_liked=Exists(
+            MarketingLike.objects.filter(marketing_request=OuterRef('pk'), user_id=user.id)
+        )
+    )
+
 class MarketingRequestCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = MarketingRequestSerializer
@@ -219,7 +283,7 @@ class MyMarketingRequestListView(generics.ListAPIView):
     
     def get_queryset(self):
         # Return only the logged-in user's requests
-        return MarketingRequest.objects.filter(user=self.request.user).order_by('-created_at')
+        return marketing_requests_for(self.request.user).filter(user=self.request.user).order_by('-created_at')
 
 class MarketingRequestUpdateView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -234,23 +298,31 @@ class MarketingFeedView(generics.ListAPIView):
     serializer_class = MarketingRequestSerializer
 
     def get_queryset(self):
-        return MarketingRequest.objects.filter(status='APPROVED').order_by('-created_at')
+        return marketing_requests_for(self.request.user).filter(status='APPROVED').order_by('-created_at')
 
 class MarketingLikeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
+        from django.db import IntegrityError, transaction
         from .models import MarketingLike
         marketing_request = get_object_or_404(MarketingRequest, id=pk)
+        counter = MarketingRequest.objects.filter(id=pk)
         
-        # Toggle Like
-        like, created = MarketingLike.objects.get_or_create(user=request.user, marketing_request=marketing_request)
-        if not created:
-            like.delete()
-            return Response({'status': 'unliked', 'count': marketing_request.likes.count()})
-        else:
+        # Toggle Like: the counter moves (members/signals.py) only by rows actually deleted/inserted
+        deleted, _ = MarketingLike.objects.filter(user=request.user, marketing_request=marketing_request).delete()
+        if deleted:
+            return Response({'status': 'unliked', 'count': counter.values_list('likes_count', flat=True).first()})
+        try:
+            with transaction.atomic():
+                MarketingLike.objects.create(user=request.user, marketing_request=marketing_request)
+            created = True
+        except IntegrityError:
+            # A concurrent request (double tap) already liked it
+            created = False
+        if created:
             # Notify creator via Direct Push
-            if marketing_request.user != request.user:
+            if marketing_request.user_id != request.user.id:
                  from core.services.fcm_service import send_push_notification
                  send_push_notification(
                      marketing_request.user,
@@ -262,7 +334,7 @@ class MarketingLikeView(APIView):
                          "sender_name": request.user.username
                      }
                  )
-            return Response({'status': 'liked', 'count': marketing_request.likes.count()})
+        return Response({'status': 'liked', 'count': counter.values_list('likes_count', flat=True).first()})
 
 class MarketingCommentView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -271,11 +343,13 @@ class MarketingCommentView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         from .models import MarketingComment
-        return MarketingComment.objects.filter(marketing_request_id=self.kwargs['pk']).order_by('created_at')
+        comments = MarketingComment.objects.filter(marketing_request_id=self.kwargs['pk']).order_by('created_at')
+        return block_service.exclude_blocked(comments, self.request.user, field='user_id')
 
     def perform_create(self, serializer):
         from .models import MarketingComment
         marketing_request = get_object_or_404(MarketingRequest, id=self.kwargs['pk'])
+        # comments_count follows in members/signals.py
         serializer.save(user=self.request.user, marketing_request=marketing_request)
         
         # Notify creator via Direct Push
@@ -333,9 +407,10 @@ class ContentReportCreateView(generics.CreateAPIView):
                          target_user.profile.admin_notice = "Account automatically suspended due to multiple reports."
                          target_user.profile.save()
                          
-                         # Notify
-                         Notification.objects.create(
-                            recipient=target_user,
+                         # Notify (push goes out after commit)
+                         from .notifications import notify
+                         notify(
+                            target_user,
                             title="Account Suspended",
                             message="Your account has been automatically suspended for 7 days due to multiple user reports."
                          )
@@ -475,7 +550,7 @@ class AdminBusinessProfileDetailView(generics.RetrieveUpdateDestroyAPIView):
             )
 
         if old_status != 'REJECTED' and new_status == 'REJECTED':
-            from chat.models import Conversation, Message
+            from chat.models import Message
             from django.contrib.auth.models import User
             from core.services.fcm_service import send_push_notification
 
@@ -485,18 +560,9 @@ class AdminBusinessProfileDetailView(generics.RetrieveUpdateDestroyAPIView):
                 admin_user = User.objects.filter(is_staff=True).first()
 
             if admin_user and instance.user != admin_user:
-                # Find existing conversation
-                conversation = Conversation.objects.filter(
-                    participants=admin_user
-                ).filter(
-                    participants=instance.user
-                ).filter(
-                    is_public=False
-                ).first()
-                
-                if not conversation:
-                    conversation = Conversation.objects.create(is_public=False)
-                    conversation.participants.add(admin_user, instance.user)
+                # Find or start the direct chat (pair-key lookup)
+                from chat.services import get_or_create_dm
+                conversation, _ = get_or_create_dm(admin_user, instance.user)
 
                 message_text = f"Your business profile for '{instance.company_name}' has been rejected."
                 if instance.feedback:
@@ -521,9 +587,11 @@ class AdminBusinessProfileDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 class AdminMarketingRequestListView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAdminUser]
-    queryset = MarketingRequest.objects.all().order_by('-created_at')
     serializer_class = MarketingRequestSerializer
 
+    def get_queryset(self):
+        return marketing_requests_for(self.request.user).order_by('-created_at')
+
 class AdminMarketingRequestDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAdminUser]
     queryset = MarketingRequest.objects.all()
@@ -720,22 +788,103 @@ class AdminUserUpdateView(generics.RetrieveUpdateDestroyAPIView):
 # --- NOTIFICATIONS (Admin Only for now) ---
 
 
+class NotificationCursorPagination(CursorPagination):
+    # id is unique and follows created_at, so pages are stable while new rows arrive
+    ordering = '-id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
 class NotificationListView(generics.ListAPIView):
+    """
+    Inbox, newest first. Unread only by default (what the app has always
+    shown); ?include_read=true returns the full inbox.
+
+    A plain list as before, unless the client opts in to cursor pages with
+    ?paged=true (or follows a `next` link carrying ?cursor=): then
+    {results, next, previous, unread_count}.
+    """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = NotificationCursorPagination
+
+    def _paged(self):
+        params = self.request.query_params
+        return 'cursor' in params or params.get('paged', '').lower() in ('1', 'true', 'yes')
+
+    @property
+    def paginator(self):
+        return super().paginator if self._paged() else None
 
     def get_queryset(self):
-        # Return only unread notifications for the user
-        return Notification.objects.filter(recipient=self.request.user, is_read=False).order_by('-created_at')
+        notifications = Notification.objects.filter(recipient=self.request.user).order_by('-id')
+        if self.request.query_params.get('include_read', '').lower() not in ('1', 'true', 'yes'):
+            notifications = notifications.filter(is_read=False)
+        return notifications
+
+    def list(self, request, *args, **kwargs):
+        from .notifications import unread_count
+        response = super().list(request, *args, **kwargs)
+        if self._paged():
+            response.data['unread_count'] = unread_count(request.user)
+        return response
+
+
+def _parse_notification_ids(request):
+    # ?ids=1,2,3 or {"ids": [1, 2, 3]}
+    raw = request.query_params.get('ids')
+    if raw is None:
+        raw = request.data.get('ids') if hasattr(request.data, 'get') else None
+    if isinstance(raw, str):
+        raw = [part for part in raw.split(',') if part.strip()]
+    if not raw or not isinstance(raw, (list, tuple)):
+        return None
+    try:
+        return [int(value) for value in raw]
+    except (TypeError, ValueError):
+        return None
+
 
 class NotificationMarkReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        notification = get_object_or_404(Notification, id=pk, recipient=request.user)
-        notification.is_read = True
-        notification.save()
-        return Response({"status": "marked as read"})
+        from .notifications import mark_read, unread_count
+        get_object_or_404(Notification, id=pk, recipient=request.user)
+        mark_read(request.user, ids=[pk])
+        return Response({"status": "marked as read", "unread_count": unread_count(request.user)})
+
+
+class NotificationBulkMarkReadView(APIView):
+    """POST mark-read/?ids=1,2,3 (or {"ids": [...]}) - one UPDATE for the lot."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        from .notifications import mark_read, unread_count
+        ids = _parse_notification_ids(request)
+        if ids is None:
+            return Response({"error": "ids is required, e.g. ?ids=1,2,3"}, status=status.HTTP_400_BAD_REQUEST)
+        updated = mark_read(request.user, ids=ids[:500])
+        return Response({"updated": updated, "unread_count": unread_count(request.user)})
+
+
+class NotificationMarkAllReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        from .notifications import mark_read, unread_count
+        updated = mark_read(request.user)
+        return Response({"updated": updated, "unread_count": unread_count(request.user)})
+
+
+class NotificationUnreadCountView(APIView):
+    """Badge count from the denormalized counter; no COUNT(*) over the table."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        from .notifications import unread_count
+        return Response({"unread_count": unread_count(request.user)})
 
 from .models import Story, StoryView
 from .serializers import StorySerializer, StoryGroupSerializer, StoryViewSerializer
@@ -751,30 +900,31 @@ class StoryViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         story = serializer.save(user=self.request.user)
         
-        # Notify all active users via Direct Push
-        from core.services.fcm_service import send_push_notification
+        # Notify all active users via Direct Push (batched multicast)
+        from core.services.fcm_service import send_push_to_users
         from django.contrib.auth.models import User
         
-        # We notify everyone EXCEPT the creator
+        # We notify everyone EXCEPT the creator and anyone on either side of a block with them
         others = User.objects.filter(is_active=True).exclude(id=self.request.user.id)
-        for user in others:
-            send_push_notification(
-                user,
-                title="New Story Uploaded",
-                body=f"{self.request.user.username} just posted a new story!",
-                data={
-                    "type": "story_uploaded",
-                    "story_id": str(story.id),
-                    "sender_id": str(self.request.user.id)
-                },
-                tag="story_update" # Group story updates
-            )
+        others = block_service.exclude_blocked(others, self.request.user)
+        send_push_to_users(
+            others.values_list('id', flat=True),
+            title="New Story Uploaded",
+            body=f"{self.request.user.username} just posted a new story!",
+            data={
+                "type": "story_uploaded",
+                "story_id": str(story.id),
+                "sender_id": str(self.request.user.id)
+            },
+            tag="story_update" # Group story updates
+        )
 
     def get_queryset(self):
         # 24 hour filter
         now = timezone.now()
         time_threshold = now - timedelta(hours=24)
-        return Story.objects.filter(created_at__gte=time_threshold).order_by('created_at')
+        stories = Story.objects.filter(created_at__gte=time_threshold).order_by('created_at')
+        return block_service.exclude_blocked(stories, self.request.user, field='user_id')
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -802,7 +952,7 @@ class StoryViewSet(viewsets.ModelViewSet):
                 username = story.user.username
                 photo = None
                 if hasattr(story.user, 'profile'):
-                    photo = story.user.profile.photo.url if story.user.profile.photo else story.user.profile.photo_url
+                    photo = profile_photo_url(story.user.profile, request)
                     
                 grouped[uid] = {
                     'user_id': uid,
@@ -875,7 +1025,7 @@ class StoryViewSet(viewsets.ModelViewSet):
         for v in views:
             photo = None
             if hasattr(v.viewer, 'profile'):
-                photo = v.viewer.profile.photo.url if v.viewer.profile.photo else v.viewer.profile.photo_url
+                photo = profile_photo_url(v.viewer.profile, request)
             
             data.append({
                 'viewer_id': v.viewer.id,
@@ -976,18 +1126,12 @@ def wix_webhook(request):
             
             profile = user.profile
             old_tier = profile.tier
-            new_tier = 'FREE'
-            
-            # Convert labels to uppercase string for matching
-            labels_str = "|".join([str(l).upper() for l in labels])
-            print(f"🏷️ [Wix Webhook] Processing Labels String: {labels_str}")
-
-            # Flexible matching: search for 'PREMIUM' or 'STANDARD' anywhere in labels
-            if "PREMIUM" in labels_str:
-                new_tier = 'PREMIUM'
-            elif "STANDARD" in labels_str:
-                new_tier = 'STANDARD'
-                
+
+            # Flexible matching: 'PREMIUM' or 'STANDARD' anywhere in labels (shared with sync_wix_members)
+            from .wix_sync import tier_for_labels
+            new_tier = tier_for_labels(labels)
+            print(f"🏷️ [Wix Webhook] Labels {labels} -> {new_tier}")
+
             if old_tier != new_tier:
                 profile.tier = new_tier
                 profile.is_premium = (new_tier == 'PREMIUM')
@@ -1044,3 +1188,22 @@ class AdminTicketListView(generics.ListAPIView):
     def get_queryset(self):
         from events.models import Ticket
         return Ticket.objects.all().order_by('-purchase_date')
+
+
+# Streaming exports of the admin lists (members/exports.py)
+class AdminLoginLogExportView(AdminLoginLogListView):
+    def list(self, request, *args, **kwargs):
+        from .exports import export_login_logs
+        return export_login_logs(request, self.filter_queryset(self.get_queryset()))
+
+
+class AdminAuditLogExportView(AdminAuditLogListView):
+    def list(self, request, *args, **kwargs):
+        from .exports import export_audit_logs
+        return export_audit_logs(request, self.filter_queryset(self.get_queryset()))
+
+
+class AdminTicketExportView(AdminTicketListView):
+    def list(self, request, *args, **kwargs):
+        from .exports import export_tickets
+        return export_tickets(request, self.filter_queryset(self.get_queryset()))
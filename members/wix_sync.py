@@ -0,0 +1,298 @@
+"""
+Bulk membership sync from Wix (manage.py sync_wix_members).
+
+The Wix webhook (members.views.wix_webhook) updates one contact per call; this
+reconciles every contact at once. Contacts are read a page at a time from the
+Wix Contacts API (or from a local JSON file, for tests and dry runs), and each
+page is applied with:
+
+- one query matching the page's emails to users and their profiles (through
+  the UPPER(email) index, see migration 0025),
+- one bulk_update of the profiles whose tier actually changed, with the
+  directory facet deltas applied in one go,
+- one batched push per new tier, to the changed members only, after commit
+  ("Account Upgraded" for upgrades, a plain "Membership Updated" for
+  downgrades).
+
+Labels are mapped to tiers like the webhook does: a label containing
+"PREMIUM" wins over "STANDARD", and a contact with neither is FREE. Users
+without a Wix contact are left alone. Tiers are only raised unless
+downgrades are asked for, and members with a running paid subscription
+(subscription_expiry in the future, set by Stripe / Apple purchases) are
+never downgraded from Wix.
+
+After every page the next cursor is written to WIX_SYNC_CHECKPOINT in media
+storage, so an interrupted run picks up where it stopped; a finished run
+removes the checkpoint.
+"""
+import json
+import logging
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from core.services.metrics_service import track_outbound
+
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+CONTACTS_QUERY_URL = 'https://www.wixapis.com/contacts/v4/contacts/query'
+PAGE_SIZE = 1000  # Wix's maximum for contact queries
+REQUEST_TIMEOUT = 30
+BULK_UPDATE_BATCH_SIZE = 500
+
+# Higher wins when the same email appears more than once
+TIER_RANK = {'FREE': 0, 'STANDARD': 1, 'PREMIUM': 2}
+
+
+@lru_cache(maxsize=1024)
+def _tier_for(labels):
+    joined = '|'.join(labels)
+    if 'PREMIUM' in joined:
+        return 'PREMIUM'
+    if 'STANDARD' in joined:
+        return 'STANDARD'
+    return 'FREE'
+
+
+def tier_for_labels(labels):
+    """The membership tier for a contact's labels (keys or display names)."""
+    return _tier_for(tuple(sorted({str(label).upper() for label in labels or ()})))
+
+
+def _items(value):
+    # Contacts v4 wraps lists as {"items": [...]}; older payloads are bare lists
+    if isinstance(value, dict):
+        return value.get('items') or []
+    return value or []
+
+
+def contact_email(contact):
+    email = (contact.get('primaryInfo') or {}).get('email')
+    if not email:
+        emails = _items((contact.get('info') or {}).get('emails'))
+        if emails:
+            email = emails[0].get('email') if isinstance(emails[0], dict) else emails[0]
+    return (email or '').strip()
+
+
+def contact_labels(contact):
+    info = contact.get('info') or {}
+    return _items(info.get('labelKeys')) or _items(info.get('labels'))
+
+
+# ==========================================
+# CONTACT SOURCES
+# ==========================================
+
+class WixContacts:
+    """Pages of contacts from the Wix Contacts API, oldest first (cursor paging)."""
+    name = 'wix'
+
+    def __init__(self, api_key, site_id='', page_size=PAGE_SIZE):
+        self.page_size = page_size
+        self.session = requests.Session()
+        self.session.headers.update({'Authorization': api_key, 'Content-Type': 'application/json'})
+        if site_id:
+            self.session.headers['wix-site-id'] = site_id
+
+    def pages(self, cursor=None):
+        """Yields (contacts, next_cursor); next_cursor is None on the last page."""
+        while True:
+            if cursor:
+                # The cursor carries the sort; Wix rejects it alongside one
+                query = {'cursorPaging': {'limit': self.page_size, 'cursor': cursor}}
+            else:
+                query = {
+                    'cursorPaging': {'limit': self.page_size},
+                    'sort': [{'fieldName': 'createdDate', 'order': 'ASC'}],
+                }
+            with track_outbound('wix', 'contacts_query'):
+                response = self.session.post(CONTACTS_QUERY_URL, json={'query': query}, timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+            data = response.json()
+            cursor = ((data.get('pagingMetadata') or {}).get('cursors') or {}).get('next')
+            yield data.get('contacts') or [], cursor
+            if not cursor:
+                return
+
+
+class FixtureContacts:
+    """The same pages from a local JSON file: a list of contacts or {"contacts": [...]}."""
+    name = 'fixture'
+
+    def __init__(self, path, page_size=PAGE_SIZE):
+        with open(path) as fh:
+            data = json.load(fh)
+        self.contacts = data.get('contacts', []) if isinstance(data, dict) else data
+        self.page_size = page_size
+
+    def pages(self, cursor=None):
+        start = int(cursor or 0)
+        while True:
+            end = start + self.page_size
+            next_cursor = str(end) if end < len(self.contacts) else None
+            yield self.contacts[start:end], next_cursor
+            if next_cursor is None:
+                return
+            start = end
+
+
+# ==========================================
+# CHECKPOINT
+# ==========================================
+
+def _checkpoint_name():
+    return getattr(settings, 'WIX_SYNC_CHECKPOINT', 'sync/wix_members_checkpoint.json')
+
+
+def load_checkpoint(source):
+    """The saved progress of an interrupted run from the same source, or None."""
+    name = _checkpoint_name()
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name, 'rb') as fh:
+        checkpoint = json.loads(fh.read())
+    return checkpoint if checkpoint.get('source') == source.name else None
+
+
+def save_checkpoint(checkpoint):
+    name = _checkpoint_name()
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(json.dumps(checkpoint).encode()))
+
+
+def clear_checkpoint():
+    default_storage.delete(_checkpoint_name())
+
+
+# ==========================================
+# SYNC
+# ==========================================
+
+def page_tiers(contacts):
+    """UPPER(email) -> tier for a page of contacts."""
+    tiers = {}
+    for contact in contacts:
+        email = contact_email(contact)
+        if not email:
+            continue
+        key = email.upper()
+        tier = tier_for_labels(contact_labels(contact))
+        if key not in tiers or TIER_RANK[tier] > TIER_RANK[tiers[key]]:
+            tiers[key] = tier
+    return tiers
+
+
+def _matching_profiles(email_keys):
+    """(user, profile) for every user whose email is in `email_keys` (one query)."""
+    users = (
+        User.objects.annotate(email_key=Upper('email'))
+        .filter(email_key__in=email_keys)
+        .select_related('profile')
+        .only(
+            'id', 'email', 'profile__id', 'profile__user_id', 'profile__tier', 'profile__is_premium',
+            'profile__subscription_expiry',
+        )
+    )
+    for user in users:
+        profile = getattr(user, 'profile', None)
+        if profile is None:
+            profile, _ = Profile.objects.get_or_create(user=user)
+        yield user, profile
+
+
+def _paid_through(profile, now):
+    return profile.subscription_expiry is not None and profile.subscription_expiry > now
+
+
+def apply_page(contacts, push=True, dry_run=False, downgrade=False):
+    """Apply one page of contacts; returns {'contacts', 'matched', 'changed'}."""
+    from .directory import record_changes
+
+    tiers = page_tiers(contacts)
+    now = timezone.now()
+    matched, changed = 0, []
+    for user, profile in _matching_profiles(list(tiers)):
+        matched += 1
+        tier = tiers[user.email_key]
+        if TIER_RANK[tier] < TIER_RANK.get(profile.tier, 0) and (not downgrade or _paid_through(profile, now)):
+            continue
+        if profile.tier == tier and profile.is_premium == (tier == 'PREMIUM'):
+            continue
+        changed.append((user, profile, profile.tier, tier))
+
+    if changed and not dry_run:
+        with transaction.atomic():
+            for _, profile, _, tier in changed:
+                profile.tier = tier
+                profile.is_premium = tier == 'PREMIUM'
+            Profile.objects.bulk_update(
+                [profile for _, profile, _, _ in changed], ['tier', 'is_premium'], batch_size=BULK_UPDATE_BATCH_SIZE,
+            )
+            # bulk_update() skips the post_save receiver that keeps the facets in step
+            record_changes([({'tier': old}, {'tier': new}) for _, _, old, new in changed if old != new])
+            if push:
+                moved = [(user, old, new) for user, _, old, new in changed if old != new]
+                transaction.on_commit(lambda: _notify(moved))
+
+    return {'contacts': len(contacts), 'matched': matched, 'changed': len(changed)}
+
+
+def _notify(changes):
+    """One push per (direction, new tier): upgrades are celebrated, downgrades just reported."""
+    from core.services.fcm_service import send_push_to_users
+
+    groups = {}
+    for user, old, new in changes:
+        upgrade = TIER_RANK[new] > TIER_RANK.get(old, 0)
+        groups.setdefault((upgrade, new), []).append(user)
+    for (upgrade, tier), users in groups.items():
+        if upgrade:
+            send_push_to_users(
+                users,
+                title="Account Upgraded",
+                body=f"Success! Your membership has been synced with Wix. You are now a {tier} member.",
+                data={"type": "account_upgrade"},
+            )
+        else:
+            send_push_to_users(
+                users,
+                title="Membership Updated",
+                body=f"Your membership has been synced with Wix and is now {tier}.",
+                data={"type": "account_update"},
+            )
+
+
+def sync_members(source, restart=False, push=True, dry_run=False, downgrade=False):
+    """
+    Page through `source` from the checkpoint (unless `restart`), applying and
+    checkpointing each page. Yields each page's counts plus the running totals.
+    """
+    checkpoint = None if restart or dry_run else load_checkpoint(source)
+    if checkpoint is None:
+        checkpoint = {
+            'source': source.name, 'cursor': None, 'started_at': timezone.now().isoformat(),
+            'contacts': 0, 'matched': 0, 'changed': 0,
+        }
+
+    for contacts, next_cursor in source.pages(checkpoint['cursor']):
+        counts = apply_page(contacts, push=push, dry_run=dry_run, downgrade=downgrade)
+        for field, value in counts.items():
+            checkpoint[field] += value
+        checkpoint['cursor'] = next_cursor
+        if not dry_run:
+            if next_cursor:
+                save_checkpoint(checkpoint)
+            else:
+                clear_checkpoint()
+        yield counts, checkpoint
@@ -0,0 +1,229 @@
+"""
+Async versions of the payment endpoints that spend most of their time waiting
+on Stripe or Apple. Routed instead of the DRF views in views.py when the app is
+served by the ASGI worker (settings.ASGI_ENABLED), so a slow Stripe round-trip
+parks a coroutine instead of holding a whole gunicorn worker.
+
+These are plain Django async views (DRF 3.14 has no async support): JWT auth,
+throttling and every ORM call go through sync_to_async; outbound HTTP uses
+Stripe's *_async methods (httpx) and httpx directly for Apple.
+"""
+import functools
+import json
+import logging
+
+import httpx
+import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from core.services.metrics_service import track_outbound
+from events import reservations
+from . import services
+
+logger = logging.getLogger(__name__)
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+APPLE_TIMEOUT_SECONDS = 15
+
+
+def _authenticate_and_throttle(request):
+    """Same JWT auth + user throttle the DRF views get. Runs in a worker thread."""
+    result = JWTAuthentication().authenticate(request)
+    if not result:
+        raise exceptions.NotAuthenticated()
+    request.user = result[0]
+
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            raise exceptions.Throttled(throttle.wait())
+
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST
+
+
+def async_api_view(methods):
+    """
+    Minimal stand-in for @api_view + IsAuthenticated for async views:
+    method check, CSRF exemption, JWT auth, throttling and body parsing.
+    The view receives the parsed body as `data`.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'}, status=405
+                )
+            try:
+                await sync_to_async(_authenticate_and_throttle)(request)
+            except exceptions.APIException as e:
+                return JsonResponse({'detail': str(e.detail)}, status=e.status_code)
+            try:
+                data = _request_data(request)
+            except ValueError:
+                return JsonResponse({'detail': 'JSON parse error'}, status=400)
+            return await view(request, data, *args, **kwargs)
+        # Token-authenticated like the DRF views, so no CSRF cookie involved.
+        # (Django 4.2's csrf_exempt decorator would wrap this in a sync function.)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+# ==========================================
+# STRIPE CONNECT (Sellers/Event Organizers)
+# ==========================================
+
+@async_api_view(['POST'])
+async def create_connect_account(request, data):
+    user = request.user
+    connect_account = await sync_to_async(services.get_or_create_connect_account)(user)
+
+    try:
+        if not connect_account.stripe_account_id:
+            with track_outbound('stripe', 'account_create'):
+                account = await stripe.Account.create_async(**services.connect_account_params(user))
+            await sync_to_async(services.save_connect_account_id)(connect_account, account.id)
+
+        with track_outbound('stripe', 'account_link_create'):
+            account_link = await stripe.AccountLink.create_async(
+                **services.account_link_params(connect_account.stripe_account_id)
+            )
+
+        return JsonResponse({'url': account_link.url})
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@async_api_view(['GET'])
+async def check_connect_status(request, data):
+    try:
+        account = await sync_to_async(services.get_connect_account)(request.user)
+        if not account or not account.stripe_account_id:
+            return JsonResponse({'status': 'not_started'})
+
+        with track_outbound('stripe', 'account_retrieve'):
+            stripe_account = await stripe.Account.retrieve_async(account.stripe_account_id)
+
+        payload = await sync_to_async(services.update_connect_status)(account, stripe_account)
+        return JsonResponse(payload)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+# ==========================================
+# PAYMENTS (Buyers)
+# ==========================================
+
+@async_api_view(['POST'])
+async def create_payment_intent(request, data):
+    tier_id = data.get('tier_id')
+    quantity = int(data.get('quantity', 1))
+
+    if not tier_id:
+        return JsonResponse({'error': 'tier_id is required'}, status=400)
+
+    try:
+        intent_params = await sync_to_async(services.ticket_intent_params)(
+            request.user, tier_id, quantity
+        )
+        # Seats are held from here until the webhook converts them (or they expire)
+        seat_hold = await sync_to_async(services.hold_ticket_seats)(request.user, intent_params)
+
+        try:
+            with track_outbound('stripe', 'payment_intent_create'):
+                intent = await stripe.PaymentIntent.create_async(**intent_params)
+        except Exception:
+            await sync_to_async(reservations.release)(seat_hold)
+            raise
+        await sync_to_async(reservations.attach_intent)(seat_hold, intent.id)
+
+        return JsonResponse({'clientSecret': intent.client_secret, 'holdExpiresAt': seat_hold.expires_at})
+
+    except services.PaymentError as e:
+        return JsonResponse({'error': e.message}, status=e.status_code)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@async_api_view(['POST'])
+async def create_membership_payment_intent(request, data):
+    try:
+        intent_params = services.membership_intent_params(request.user, data.get('target_tier'))
+    except services.PaymentError as e:
+        return JsonResponse({'error': e.message}, status=e.status_code)
+
+    try:
+        with track_outbound('stripe', 'payment_intent_create'):
+            intent = await stripe.PaymentIntent.create_async(**intent_params)
+
+        return JsonResponse({'clientSecret': intent.client_secret})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+# ==========================================
+# IN-APP SUBSCRIPTIONS
+# ==========================================
+
+async def _verify_apple_receipt(receipt_data):
+    payload = services.apple_receipt_payload(
+        receipt_data, getattr(settings, 'APPLE_IAP_SHARED_SECRET', '')
+    )
+    async with httpx.AsyncClient(timeout=APPLE_TIMEOUT_SECONDS) as client:
+        # Try production first
+        with track_outbound('apple', 'verify_receipt'):
+            resp = await client.post(services.APPLE_VERIFY_URL, json=payload)
+        data = resp.json()
+
+        # If the receipt is actually a sandbox receipt, Apple returns status 21007
+        if data.get('status') == services.APPLE_SANDBOX_RECEIPT_STATUS:
+            with track_outbound('apple', 'verify_receipt_sandbox'):
+                resp = await client.post(services.APPLE_SANDBOX_VERIFY_URL, json=payload)
+            data = resp.json()
+
+    if data.get('status') == 0:
+        return True
+    logger.error(f"Apple IAP Validation Failed: {data}")
+    return False
+
+
+@async_api_view(['POST'])
+async def verify_subscription(request, data):
+    platform = data.get('platform')
+    receipt_data = data.get('receipt_data')
+
+    try:
+        target_tier = services.subscription_target_tier(platform, receipt_data, data.get('product_id'))
+    except services.PaymentError as e:
+        return JsonResponse({'error': e.message}, status=e.status_code)
+
+    is_valid = False
+
+    if platform == 'ios':
+        try:
+            is_valid = await _verify_apple_receipt(receipt_data)
+        except Exception as e:
+            logger.error(f"Error validating Apple Receipt: {e}")
+
+    elif platform == 'android':
+        # Android Validation (Placeholder - Requires Google Service Account)
+        logger.warning("Android IAP Verification is simplified. Implement real validation.")
+        if receipt_data:
+            is_valid = True
+
+    if is_valid:
+        profile = await sync_to_async(services.apply_subscription)(request.user, target_tier)
+        return JsonResponse({'status': 'success', 'tier': profile.tier})
+    return JsonResponse({'error': 'Invalid Receipt'}, status=400)
@@ -0,0 +1,220 @@
+"""
+Payment logic shared by the sync DRF views (payments/views.py) and their async
+twins (payments/async_views.py). Everything here is plain Python or ORM work -
+the Stripe / Apple round-trips stay in the views so each flavour can use its
+own HTTP client.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from events import reservations
+from events.models import StripeConnectAccount, TicketTier
+
+# Deep links back into the app after Stripe Connect onboarding
+CONNECT_RETURN_URL = 'ffig://stripe-success'
+CONNECT_REFRESH_URL = 'ffig://stripe-refresh'
+
+# Hardcoded prices as per app requirements (USD)
+MEMBERSHIP_PRICES = {
+    'STANDARD': 600,
+    'PREMIUM': 800,
+}
+
+# Member discount applied to ticket prices
+TIER_TICKET_DISCOUNTS = {
+    'PREMIUM': Decimal('0.80'),
+    'STANDARD': Decimal('0.90'),
+}
+
+# In-app purchase product id -> membership tier
+IAP_PRODUCT_TIERS = {
+    'FFIG_STANDARD': 'STANDARD',
+    'FFIG_PREMIUM': 'PREMIUM',
+}
+
+APPLE_VERIFY_URL = 'https://buy.itunes.apple.com/verifyReceipt'
+APPLE_SANDBOX_VERIFY_URL = 'https://sandbox.itunes.apple.com/verifyReceipt'
+APPLE_SANDBOX_RECEIPT_STATUS = 21007
+
+
+class PaymentError(Exception):
+    """A request problem the views turn into a 4xx {'error': ...} response."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+# ==========================================
+# STRIPE CONNECT
+# ==========================================
+
+def connect_account_params(user):
+    return {
+        'type': 'express',
+        'country': 'US', # Defaulting to US for now, could be dynamic
+        'email': user.email,
+        'capabilities': {
+            'card_payments': {'requested': True},
+            'transfers': {'requested': True},
+        },
+    }
+
+
+def account_link_params(stripe_account_id):
+    return {
+        'account': stripe_account_id,
+        'refresh_url': CONNECT_REFRESH_URL,
+        'return_url': CONNECT_RETURN_URL,
+        'type': 'account_onboarding',
+    }
+
+
+def get_or_create_connect_account(user):
+    connect_account, _ = StripeConnectAccount.objects.get_or_create(user=user)
+    return connect_account
+
+
+def save_connect_account_id(connect_account, stripe_account_id):
+    connect_account.stripe_account_id = stripe_account_id
+    connect_account.save()
+
+
+def get_connect_account(user):
+    return StripeConnectAccount.objects.filter(user=user).first()
+
+
+def update_connect_status(account, stripe_account):
+    """Copy the Stripe account flags onto our record and build the API payload."""
+    account.charges_enabled = stripe_account.charges_enabled
+    account.payouts_enabled = stripe_account.payouts_enabled
+    account.details_submitted = stripe_account.details_submitted
+    account.save()
+
+    return {
+        'status': 'active' if account.payouts_enabled else 'pending',
+        'charges_enabled': account.charges_enabled,
+        'payouts_enabled': account.payouts_enabled,
+        'details_submitted': account.details_submitted,
+    }
+
+
+# ==========================================
+# PAYMENT INTENTS
+# ==========================================
+
+def ticket_unit_price(tier, user):
+    """Tier price after the buyer's membership discount."""
+    price = tier.price
+    profile = getattr(user, 'profile', None)
+    if profile and profile.tier in TIER_TICKET_DISCOUNTS:
+        price = price * TIER_TICKET_DISCOUNTS[profile.tier]
+    return price
+
+
+def ticket_intent_params(user, tier_id, quantity):
+    """
+    Validate a ticket purchase and build the PaymentIntent kwargs.
+    Funds are routed to the organizer's Connect account when there is one.
+    Raises PaymentError for anything the buyer should be told about.
+    """
+    try:
+        tier = TicketTier.objects.select_related(
+            'event__organizer__stripe_account',
+        ).get(id=tier_id)
+    except TicketTier.DoesNotExist:
+        raise PaymentError('Invalid Ticket Tier', status_code=404)
+    event = tier.event
+
+    if tier.available < quantity:
+        raise PaymentError(f'Only {tier.available} tickets available')
+
+    connect_account = None
+    if event.organizer:
+        connect_account = getattr(event.organizer, 'stripe_account', None)
+        if not connect_account or not connect_account.payouts_enabled:
+            raise PaymentError('The organizer is not fully set up to receive payments')
+
+    # Amount must be in cents
+    amount_cents = int(ticket_unit_price(tier, user) * quantity * 100)
+
+    params = {
+        'amount': amount_cents,
+        'currency': tier.currency,
+        'automatic_payment_methods': {'enabled': True},
+        'metadata': {
+            'event_id': event.id,
+            'tier_id': tier.id,
+            'user_id': user.id,
+            'quantity': str(quantity),
+        },
+    }
+    if connect_account:
+        params['transfer_data'] = {'destination': connect_account.stripe_account_id}
+        # params['application_fee_amount'] = int(amount_cents * 0.05)
+    return params
+
+
+def hold_ticket_seats(user, intent_params):
+    """
+    Hold the seats of a ticket PaymentIntent until it is paid or the hold
+    expires (events/reservations.py), and tag the intent metadata with the
+    hold so the webhook converts exactly that hold.
+    """
+    metadata = intent_params['metadata']
+    try:
+        seat_hold = reservations.hold(metadata['tier_id'], user, int(metadata['quantity']))
+    except reservations.SoldOut as e:
+        raise PaymentError(str(e))
+    metadata['hold_id'] = seat_hold.id
+    return seat_hold
+
+
+def membership_intent_params(user, target_tier):
+    if target_tier not in MEMBERSHIP_PRICES:
+        raise PaymentError('Invalid membership tier')
+
+    return {
+        'amount': MEMBERSHIP_PRICES[target_tier] * 100,
+        'currency': 'usd', # Defaulting to USD for memberships
+        'automatic_payment_methods': {'enabled': True},
+        'metadata': {
+            'type': 'membership',
+            'user_id': user.id,
+            'target_tier': target_tier,
+        },
+    }
+
+
+# ==========================================
+# IN-APP SUBSCRIPTIONS
+# ==========================================
+
+def subscription_target_tier(platform, receipt_data, product_id):
+    if not all([platform, receipt_data, product_id]):
+        raise PaymentError('Missing required fields')
+
+    target_tier = IAP_PRODUCT_TIERS.get(product_id)
+    if not target_tier:
+        raise PaymentError('Unknown product ID')
+    return target_tier
+
+
+def apple_receipt_payload(receipt_data, shared_secret):
+    return {
+        'receipt-data': receipt_data,
+        'password': shared_secret,
+        'exclude-old-transactions': True,
+    }
+
+
+def apply_subscription(user, target_tier):
+    """Upgrade the member and set expiry to 1 year from now."""
+    profile = user.profile
+    profile.tier = target_tier
+    profile.subscription_expiry = timezone.now() + timedelta(days=365)
+    profile.save()
+    return profile
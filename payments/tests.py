@@ -1,19 +1,30 @@
-from datetime import date
+import io
+import json
+from datetime import date, timedelta
 from types import SimpleNamespace
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
+from asgiref.sync import async_to_sync
+import stripe
 from django.contrib.auth.models import User
-from django.test import override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from events.models import Event, Ticket, TicketTier
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from events.models import Event, SeatHold, Ticket, TicketTier
+from payments import async_views
 
 
 @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
 class PaymentsApiTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.organizer = User.objects.create_user(
             username='organizer',
             email='organizer@example.com',
@@ -60,7 +71,7 @@ class PaymentsApiTests(APITestCase):
 
     @patch('payments.views.stripe.PaymentIntent.create')
     def test_create_payment_intent_returns_client_secret_and_expected_amount(self, mock_create):
-        mock_create.return_value = SimpleNamespace(client_secret='pi_client_secret_test')
+        mock_create.return_value = SimpleNamespace(id='pi_test_1', client_secret='pi_client_secret_test')
 
         self.client.force_authenticate(user=self.buyer)
         response = self.client.post(
@@ -81,6 +92,112 @@ class PaymentsApiTests(APITestCase):
         self.assertEqual(call_kwargs['metadata']['tier_id'], self.paid_tier.id)
         self.assertEqual(call_kwargs['transfer_data']['destination'], 'acct_test_123')
 
+    def _checkout(self, quantity, mock_create):
+        mock_create.return_value = SimpleNamespace(id=f'pi_{quantity}', client_secret='secret')
+        self.client.force_authenticate(user=self.buyer)
+        return self.client.post(reverse('create_payment_intent'), {'tier_id': self.paid_tier.id, 'quantity': quantity}, format='json')
+
+    def _payment_succeeded(self, metadata, amount=5000):
+        payment_intent = stripe.PaymentIntent.construct_from(
+            {'id': 'pi_paid', 'amount': amount, 'metadata': metadata}, 'sk_test',
+        )
+        event = {'type': 'payment_intent.succeeded', 'data': {'object': payment_intent}}
+        with patch('payments.views.stripe.Webhook.construct_event', return_value=event):
+            return self.client.post(reverse('stripe_webhook'), data='{}', content_type='application/json')
+
+    @patch('payments.views.stripe.PaymentIntent.create')
+    def test_checkout_holds_seats_and_rejects_oversell(self, mock_create):
+        response = self._checkout(2, mock_create)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.paid_tier.refresh_from_db()
+        self.assertEqual(self.paid_tier.available, 98)
+        seat_hold = SeatHold.objects.get(tier=self.paid_tier, user=self.buyer)
+        self.assertEqual((seat_hold.status, seat_hold.payment_intent_id), (SeatHold.HELD, 'pi_2'))
+        self.assertEqual(mock_create.call_args.kwargs['metadata']['hold_id'], seat_hold.id)
+
+        # The event API shows the live count even though the document was cached before
+        TicketTier.objects.filter(id=self.paid_tier.id).update(available=3)
+        self.client.get(reverse('event-detail', kwargs={'pk': self.event.id}))
+        self._checkout(3, mock_create)  # replaces the buyer's earlier hold: 3 + 2 back, 3 taken
+        detail = self.client.get(reverse('event-detail', kwargs={'pk': self.event.id}))
+        self.assertEqual({t['id']: t['available'] for t in detail.data['ticket_tiers']}[self.paid_tier.id], 2)
+
+        response = self._checkout(4, mock_create)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Only 2 tickets available')
+
+        # Stripe failing gives the seats back
+        mock_create.side_effect = stripe.error.APIConnectionError('down')
+        self._checkout(1, mock_create)
+        self.paid_tier.refresh_from_db()
+        self.assertEqual(self.paid_tier.available, 5)
+        self.assertFalse(SeatHold.objects.filter(status=SeatHold.HELD).exists())
+
+    @patch('core.services.fcm_service.send_push_notification')
+    @patch('payments.views.send_ticket_receipt', return_value=True)
+    @patch('payments.views.stripe.PaymentIntent.create')
+    def test_webhook_converts_hold_once(self, mock_create, _receipt, _push):
+        self._checkout(2, mock_create)
+        seat_hold = SeatHold.objects.get()
+        metadata = {'tier_id': str(self.paid_tier.id), 'event_id': str(self.event.id), 'user_id': str(self.buyer.id), 'quantity': '2', 'hold_id': str(seat_hold.id)}
+
+        self._payment_succeeded(metadata)
+        self._payment_succeeded(metadata)  # Stripe retry
+
+        self.assertEqual(Ticket.objects.filter(tier=self.paid_tier, user=self.buyer).count(), 2)
+        seat_hold.refresh_from_db()
+        self.paid_tier.refresh_from_db()
+        self.assertEqual(seat_hold.status, SeatHold.CONVERTED)
+        self.assertEqual(self.paid_tier.available, 98)
+
+    @patch('core.services.fcm_service.send_push_notification')
+    @patch('payments.views.send_ticket_receipt', return_value=True)
+    @patch('payments.views.stripe.PaymentIntent.create')
+    def test_failed_fulfilment_keeps_the_hold_for_the_retry(self, mock_create, mock_receipt, _push):
+        self._checkout(2, mock_create)
+        seat_hold = SeatHold.objects.get()
+        metadata = {'tier_id': str(self.paid_tier.id), 'event_id': str(self.event.id), 'user_id': str(self.buyer.id), 'quantity': '2', 'hold_id': str(seat_hold.id)}
+
+        original_create = Ticket.objects.create
+        calls = []
+
+        def fail_second(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise RuntimeError('database went away')
+            return original_create(**kwargs)
+
+        with patch.object(Ticket.objects, 'create', side_effect=fail_second):
+            response = self._payment_succeeded(metadata)
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        seat_hold.refresh_from_db()
+        self.assertEqual(seat_hold.status, SeatHold.HELD)
+        self.assertFalse(Ticket.objects.filter(user=self.buyer).exists())
+        mock_receipt.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._payment_succeeded(metadata)  # Stripe retry
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Ticket.objects.filter(user=self.buyer).count(), 2)
+        self.assertEqual(mock_receipt.call_count, 2)
+
+    @patch('core.services.fcm_service.send_push_notification')
+    @patch('payments.views.send_ticket_receipt', return_value=True)
+    @patch('payments.views.stripe.PaymentIntent.create')
+    def test_expired_holds_are_swept_and_late_payments_still_fulfilled(self, mock_create, _receipt, _push):
+        self._checkout(2, mock_create)
+        seat_hold = SeatHold.objects.get()
+        SeatHold.objects.filter(id=seat_hold.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        call_command('release_expired_seat_holds', stdout=io.StringIO())
+        self.paid_tier.refresh_from_db()
+        self.assertEqual(self.paid_tier.available, 100)
+
+        self._payment_succeeded({'tier_id': str(self.paid_tier.id), 'event_id': str(self.event.id), 'user_id': str(self.buyer.id), 'quantity': '2', 'hold_id': str(seat_hold.id)})
+        self.paid_tier.refresh_from_db()
+        self.assertEqual(self.paid_tier.available, 98)
+        self.assertEqual(Ticket.objects.filter(user=self.buyer).count(), 2)
+
     @patch('payments.views.send_ticket_receipt', return_value=True)
     def test_free_registration_creates_tickets_and_decrements_availability(self, mock_receipt):
         self.client.force_authenticate(user=self.buyer)
@@ -102,6 +219,69 @@ class PaymentsApiTests(APITestCase):
         self.assertEqual(self.free_tier.available, 3)
         self.assertEqual(mock_receipt.call_count, 2)
 
+    def test_signed_ticket_verifies_with_one_update_and_rejects_replays(self):
+        self.event.date = timezone.localdate() + timedelta(days=30)
+        self.event.save()
+        ticket = Ticket.objects.create(event=self.event, tier=self.paid_tier, user=self.buyer)
+        self.assertTrue(ticket.qr_code_data.startswith('FT1'))
+        self.assertEqual(len(ticket.qr_code_data), 51)
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('verify_ticket')
+        self.client.get(reverse('event-detail', kwargs={'pk': self.event.id}))  # warm the event document
+
+        # Tampered codes are rejected without touching the database
+        forged = ticket.qr_code_data[:-2] + ('AA' if not ticket.qr_code_data.endswith('AA') else 'BB')
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'qr_code_data': forged}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Mark used, then the holder's name for the scanner
+        with self.assertNumQueries(2):
+            response = self.client.post(url, {'qr_code_data': ticket.qr_code_data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['event'], response.data['tier'], response.data['user']), ('Summit', 'General', 'buyer'))
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, 'USED')
+
+        response = self.client.post(url, {'qr_code_data': ticket.qr_code_data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Ticket already used')
+
+        # Without the cache marker (another worker) the conditional update still refuses it
+        cache.clear()
+        response = self.client.post(url, {'qr_code_data': ticket.qr_code_data}, format='json')
+        self.assertEqual(response.data['error'], 'Ticket already used')
+
+    def test_reset_ticket_verifies_despite_an_old_use_marker(self):
+        self.event.date = timezone.localdate() + timedelta(days=30)
+        self.event.save()
+        ticket = Ticket.objects.create(event=self.event, tier=self.paid_tier, user=self.buyer)
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('verify_ticket')
+        self.assertEqual(self.client.post(url, {'qr_code_data': ticket.qr_code_data}, format='json').status_code, status.HTTP_200_OK)
+
+        # An admin resets the ticket; the marker from the first scan is still cached
+        Ticket.objects.filter(id=ticket.id).update(status='ACTIVE')
+        response = self.client.post(url, {'qr_code_data': ticket.qr_code_data}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user'], 'buyer')
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, 'USED')
+
+        response = self.client.post(url, {'qr_code_data': ticket.qr_code_data}, format='json')
+        self.assertEqual(response.data['error'], 'Ticket already used')
+
+    def test_expired_signed_ticket_is_rejected_without_queries(self):
+        self.event.date = date(2020, 1, 1)
+        self.event.save()
+        ticket = Ticket.objects.create(event=self.event, tier=self.paid_tier, user=self.buyer)
+        self.client.force_authenticate(user=self.admin)
+        self.client.get(reverse('event-detail', kwargs={'pk': self.event.id}))  # warm the event document
+
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('verify_ticket'), {'qr_code_data': ticket.qr_code_data}, format='json')
+        self.assertEqual(response.data['error'], 'Ticket expired')
+
     def test_verify_ticket_requires_admin(self):
         ticket = Ticket.objects.create(
             event=self.event,
@@ -129,3 +309,47 @@ class PaymentsApiTests(APITestCase):
         self.assertEqual(allowed.status_code, status.HTTP_200_OK)
         ticket.refresh_from_db()
         self.assertEqual(ticket.status, 'USED')
+
+
+class AsyncPaymentViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='async_buyer', email='a@example.com', password='x')
+        self.factory = RequestFactory()
+
+    def _post(self, view, payload, user=None):
+        headers = {}
+        if user:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        request = self.factory.post(
+            '/api/payments/', data=json.dumps(payload), content_type='application/json', **headers
+        )
+        return async_to_sync(view)(request)
+
+    @patch('payments.async_views.stripe.PaymentIntent.create_async', new_callable=AsyncMock)
+    def test_membership_intent_uses_async_stripe_client(self, mock_create):
+        mock_create.return_value = SimpleNamespace(client_secret='pi_async_secret')
+
+        response = self._post(
+            async_views.create_membership_payment_intent, {'target_tier': 'PREMIUM'}, user=self.user
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['clientSecret'], 'pi_async_secret')
+        self.assertEqual(mock_create.await_args.kwargs['amount'], 80000)
+        self.assertEqual(mock_create.await_args.kwargs['metadata']['user_id'], self.user.id)
+
+    def test_async_views_require_jwt(self):
+        response = self._post(async_views.create_membership_payment_intent, {'target_tier': 'PREMIUM'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_android_subscription_upgrades_profile(self):
+        response = self._post(
+            async_views.verify_subscription,
+            {'platform': 'android', 'receipt_data': 'token', 'product_id': 'FFIG_STANDARD'},
+            user=self.user,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.tier, 'STANDARD')
+        self.assertIsNotNone(self.user.profile.subscription_expiry)
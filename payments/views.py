@@ -2,9 +2,14 @@ from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.conf import settings
+from django.db import transaction
+from django.contrib.auth.models import User
+from events import reservations, ticket_codes
 from events.models import Event, Ticket, TicketTier, StripeConnectAccount
 import stripe
 from core.services.email_service import send_ticket_receipt
+from core.services.metrics_service import track_outbound
+from . import services
 import logging
 import requests
 from django.utils import timezone
@@ -18,6 +23,9 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 # ==========================================
 # STRIPE CONNECT (Sellers/Event Organizers)
 # ==========================================
+# The Stripe/Apple-bound views below have async twins in async_views.py that
+# are routed instead when the app runs under ASGI (settings.ASGI_ENABLED).
+# Shared validation and payload building lives in payments/services.py.
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -29,36 +37,20 @@ def create_connect_account(request):
     user = request.user
     
     # Check if they already have an account
-    connect_account, created = StripeConnectAccount.objects.get_or_create(user=user)
+    connect_account = services.get_or_create_connect_account(user)
     
     try:
         if not connect_account.stripe_account_id:
             # Create a Stripe Express Account
-            account = stripe.Account.create(
-                type='express',
-                country='US', # Defaulting to US for now, could be dynamic
-                email=user.email,
-                capabilities={
-                    'card_payments': {'requested': True},
-                    'transfers': {'requested': True},
-                },
-            )
-            connect_account.stripe_account_id = account.id
-            connect_account.save()
+            with track_outbound('stripe', 'account_create'):
+                account = stripe.Account.create(**services.connect_account_params(user))
+            services.save_connect_account_id(connect_account, account.id)
             
-        # Create an account link for onboarding
-        # We need a return URL for when the user finishes or cancels onboarding
-        # These URLs will need to point to your frontend app (e.g. deep links)
-        # Using a custom scheme for the mobile app
-        return_url = 'ffig://stripe-success'
-        refresh_url = 'ffig://stripe-refresh'
-        
-        account_link = stripe.AccountLink.create(
-            account=connect_account.stripe_account_id,
-            refresh_url=refresh_url,
-            return_url=return_url,
-            type='account_onboarding',
-        )
+        # Create an account link for onboarding (return/refresh URLs are app deep links)
+        with track_outbound('stripe', 'account_link_create'):
+            account_link = stripe.AccountLink.create(
+                **services.account_link_params(connect_account.stripe_account_id)
+            )
         
         return Response({'url': account_link.url})
         
@@ -78,22 +70,11 @@ def check_connect_status(request):
         if not account or not account.stripe_account_id:
             return Response({'status': 'not_started'}, status=200)
             
-        stripe_account = stripe.Account.retrieve(account.stripe_account_id)
+        with track_outbound('stripe', 'account_retrieve'):
+            stripe_account = stripe.Account.retrieve(account.stripe_account_id)
         
         # Update our DB
-        account.charges_enabled = stripe_account.charges_enabled
-        account.payouts_enabled = stripe_account.payouts_enabled
-        account.details_submitted = stripe_account.details_submitted
-        account.save()
-        
-        status_text = 'active' if account.payouts_enabled else 'pending'
-        
-        return Response({
-            'status': status_text,
-            'charges_enabled': account.charges_enabled,
-            'payouts_enabled': account.payouts_enabled,
-            'details_submitted': account.details_submitted,
-        })
+        return Response(services.update_connect_status(account, stripe_account))
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -116,62 +97,25 @@ def create_payment_intent(request):
         return Response({'error': 'tier_id is required'}, status=status.HTTP_400_BAD_REQUEST)
         
     try:
-        tier = TicketTier.objects.get(id=tier_id)
-        event = tier.event
-        
-        if tier.available < quantity:
-            return Response({'error': f'Only {tier.available} tickets available'}, status=status.HTTP_400_BAD_REQUEST)
+        intent_params = services.ticket_intent_params(request.user, tier_id, quantity)
+        # Seats are held from here until the webhook converts them (or they expire)
+        seat_hold = services.hold_ticket_seats(request.user, intent_params)
             
-        organizer = event.organizer
-        connect_account = None
-        
-        if organizer:
-            connect_account = getattr(organizer, 'stripe_account', None)
-            if not connect_account or not connect_account.payouts_enabled:
-                return Response({'error': 'The organizer is not fully set up to receive payments'}, status=status.HTTP_400_BAD_REQUEST)
-
-            
-        # Determine actual price based on tier discounts
-        actual_price = tier.price
-        profile = getattr(request.user, 'profile', None)
-        if profile:
-            if profile.tier == 'PREMIUM':
-                actual_price = actual_price * Decimal('0.80')
-            elif profile.tier == 'STANDARD':
-                actual_price = actual_price * Decimal('0.90')
-
-        # Amount must be in cents
-        amount_cents = int(actual_price * quantity * 100)
-        
-        # Calculate platform fee (optional) - e.g. 5%
-        # application_fee_amount = int(amount_cents * 0.05)
-        
-        # Create PaymentIntent params
-        intent_params = {
-            'amount': amount_cents,
-            'currency': tier.currency,
-            'automatic_payment_methods': {'enabled': True},
-            'metadata': {
-                'event_id': event.id,
-                'tier_id': tier.id,
-                'user_id': request.user.id,
-                'quantity': str(quantity)
-            }
-        }
-        
-        if connect_account:
-            intent_params['transfer_data'] = {'destination': connect_account.stripe_account_id}
-            # intent_params['application_fee_amount'] = int(amount_cents * 0.05)
-            
-        intent = stripe.PaymentIntent.create(**intent_params)
+        try:
+            with track_outbound('stripe', 'payment_intent_create'):
+                intent = stripe.PaymentIntent.create(**intent_params)
+        except Exception:
+            reservations.release(seat_hold)
+            raise
+        reservations.attach_intent(seat_hold, intent.id)
         
         return Response({
             'clientSecret': intent.client_secret,
+            'holdExpiresAt': seat_hold.expires_at,
         })
 
-        
-    except TicketTier.DoesNotExist:
-        return Response({'error': 'Invalid Ticket Tier'}, status=status.HTTP_404_NOT_FOUND)
+    except services.PaymentError as e:
+        return Response({'error': e.message}, status=e.status_code)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -181,27 +125,14 @@ def create_membership_payment_intent(request):
     """
     Creates a Stripe PaymentIntent for a Membership Upgrade.
     """
-    target_tier = request.data.get('target_tier')
-    
-    if target_tier not in ['STANDARD', 'PREMIUM']:
-        return Response({'error': 'Invalid membership tier'}, status=status.HTTP_400_BAD_REQUEST)
-        
     try:
-        # Hardcoded prices as per app requirements
-        # STANDARD: $600, PREMIUM: $800
-        price = 600 if target_tier == 'STANDARD' else 800
-        amount_cents = price * 100
+        intent_params = services.membership_intent_params(request.user, request.data.get('target_tier'))
+    except services.PaymentError as e:
+        return Response({'error': e.message}, status=e.status_code)
         
-        intent = stripe.PaymentIntent.create(
-            amount=amount_cents,
-            currency='usd', # Defaulting to USD for memberships
-            automatic_payment_methods={'enabled': True},
-            metadata={
-                'type': 'membership',
-                'user_id': request.user.id,
-                'target_tier': target_tier
-            }
-        )
+    try:
+        with track_outbound('stripe', 'payment_intent_create'):
+            intent = stripe.PaymentIntent.create(**intent_params)
         
         return Response({
             'clientSecret': intent.client_secret,
@@ -282,51 +213,65 @@ def stripe_webhook(request):
         if tier_id and user_id:
             try:
                 tier = TicketTier.objects.get(id=tier_id)
-                
-                # Fulfill the purchase (Create Tickets)
-                for _ in range(quantity):
-                    ticket = Ticket.objects.create(
-                        event_id=event_id,
-                        tier_id=tier_id,
-                        user_id=user_id,
-                        purchase_price=Decimal(payment_intent.amount) / Decimal('100.00'),
-                        original_price=tier.price,
-                        qr_code_data=f"EVENT-{event_id}-TIER-{tier_id}-USER-{user_id}-PI-{payment_intent.id}-{Ticket.objects.count()}"
-                    )
-                    
-                    # Send Receipt Email (individually or wait? Individually ensures unique QR codes are sent)
-                    send_ticket_receipt(ticket)
-                
-                # Decrement availability
-                if tier.available >= quantity:
-                    tier.available -= quantity
-                    tier.save()
-                elif tier.available > 0:
-                    tier.available = 0
-                    tier.save()
-
-                # --- 📣 NOTIFY ADMINS ---
-                try:
-                    from django.contrib.auth import get_user_model
-                    from core.services.fcm_service import send_push_notification
-                    User = get_user_model()
-                    user = User.objects.get(id=user_id)
-                    admins = User.objects.filter(is_staff=True)
-                    for admin in admins:
-                        send_push_notification(
-                            admin,
-                            title="New Ticket Purchase",
-                            body=f"{user.username} bought {quantity} {tier.name} ticket(s) for {tier.event.title}.",
-                            data={"type": "admin_purchase_alert", "event_id": str(tier.event.id)}
+
+                # The hold is only marked converted together with its tickets, so a
+                # failure part-way rolls both back and Stripe's retry issues them
+                with transaction.atomic():
+                    # Convert the checkout's seat hold; False means this payment was already fulfilled
+                    hold_id = metadata.get('hold_id')
+                    if hold_id:
+                        if not reservations.convert(hold_id):
+                            return Response(status=status.HTTP_200_OK)
+                    elif not reservations.take(tier.id, quantity):
+                        # Intent created before seat holds existed
+                        TicketTier.objects.filter(id=tier.id).update(available=0)
+
+                    # Fulfill the purchase (Create Tickets)
+                    tickets = [
+                        # qr_code_data is a signed code issued on save (events/ticket_codes.py)
+                        Ticket.objects.create(
+                            event=tier.event,
+                            tier=tier,
+                            user_id=user_id,
+                            purchase_price=Decimal(payment_intent.amount) / Decimal('100.00'),
+                            original_price=tier.price,
                         )
-                except Exception as e:
-                    logger.error(f"⚠️ Failed to send admin push for ticket: {e}")
-                    
+                        for _ in range(quantity)
+                    ]
+                    transaction.on_commit(lambda: _notify_ticket_purchase(tickets, tier, user_id, quantity))
+
+            except TicketTier.DoesNotExist:
+                logger.error(f"❌ Error fulfilling order: ticket tier {tier_id} not found")
             except Exception as e:
-                 logger.error(f"❌ Error fulfilling order: {e}")
+                logger.error(f"❌ Error fulfilling order: {e}")
+                # Nothing was kept; a non-2xx makes Stripe retry the delivery
+                return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     return Response(status=status.HTTP_200_OK)
 
+
+def _notify_ticket_purchase(tickets, tier, user_id, quantity):
+    # Send Receipt Email (individually ensures unique QR codes are sent)
+    for ticket in tickets:
+        send_ticket_receipt(ticket)
+
+    # --- 📣 NOTIFY ADMINS ---
+    try:
+        from django.contrib.auth import get_user_model
+        from core.services.fcm_service import send_push_notification
+        User = get_user_model()
+        user = User.objects.get(id=user_id)
+        admins = User.objects.filter(is_staff=True)
+        for admin in admins:
+            send_push_notification(
+                admin,
+                title="New Ticket Purchase",
+                body=f"{user.username} bought {quantity} {tier.name} ticket(s) for {tier.event.title}.",
+                data={"type": "admin_purchase_alert", "event_id": str(tier.event.id)}
+            )
+    except Exception as e:
+        logger.error(f"⚠️ Failed to send admin push for ticket: {e}")
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def register_free_ticket(request):
@@ -351,7 +296,9 @@ def register_free_ticket(request):
         if tier.price > 0:
             return Response({'error': 'This ticket tier is not free'}, status=status.HTTP_400_BAD_REQUEST)
             
-        if tier.available < quantity:
+        # Take the seats atomically so concurrent registrations can't overbook
+        if not reservations.take(tier.id, quantity):
+            tier.refresh_from_db(fields=['available'])
             return Response({'error': f'Only {tier.available} tickets available'}, status=status.HTTP_400_BAD_REQUEST)
             
         # Create Tickets
@@ -366,7 +313,6 @@ def register_free_ticket(request):
                 first_name=first_name,
                 last_name=last_name,
                 email=email,
-                qr_code_data=f"EVENT-{event.id}-TIER-{tier.id}-USER-{request.user.id}-FREE-{tier.currency}-{Ticket.objects.count()}-{i}"
             )
             if first_ticket_id is None:
                 first_ticket_id = ticket.id
@@ -374,10 +320,6 @@ def register_free_ticket(request):
             # Send Receipt Email
             send_ticket_receipt(ticket)
         
-        # Decrement availability
-        tier.available -= quantity
-        tier.save()
-        
         return Response({'status': 'success', 'ticket_id': first_ticket_id}, status=status.HTTP_201_CREATED)        
     except TicketTier.DoesNotExist:
         return Response({'error': 'Invalid Ticket Tier'}, status=status.HTTP_404_NOT_FOUND)
@@ -389,6 +331,8 @@ def register_free_ticket(request):
 def verify_ticket(request):
     """
     Verifies a ticket scanned by an admin and marks it as USED.
+    Signed codes are checked without the database (events/ticket_codes.py);
+    legacy codes and bare ticket ids are looked up.
     """
     qr_data = request.data.get('qr_code_data')
     
@@ -396,18 +340,21 @@ def verify_ticket(request):
         return Response({'error': 'QR code data is required'}, status=status.HTTP_400_BAD_REQUEST)
         
     try:
-        # The QR code data format is: EVENT-{event_id}-TIER-{tier_id}-USER-{user_id}-PI-{payment_intent.id}
+        if ticket_codes.is_signed_code(qr_data):
+            return _verify_signed_ticket(qr_data)
+
+        # Legacy format: EVENT-{event_id}-TIER-{tier_id}-USER-{user_id}-PI-{payment_intent.id}
         # or it could just be the Ticket ID (UUID). Let's be flexible.
         
         ticket = None
         
         # 1. Try finding by exactly matching qr_code_data
-        ticket = Ticket.objects.filter(qr_code_data=qr_data).first()
+        ticket = Ticket.objects.select_related('user', 'event', 'tier').filter(qr_code_data=qr_data).first()
         
         # 2. Try finding by UUID if the scanner sent just the ID
         if not ticket:
             try:
-                ticket = Ticket.objects.get(id=qr_data)
+                ticket = Ticket.objects.select_related('user', 'event', 'tier').get(id=qr_data)
             except:
                 pass
                 
@@ -415,29 +362,93 @@ def verify_ticket(request):
             return Response({'error': 'Invalid Ticket'}, status=status.HTTP_404_NOT_FOUND)
             
         if ticket.status == 'USED':
-            return Response({
-                'error': 'Ticket already used',
-                'user': ticket.user.username,
-                'event': ticket.event.title,
-                'tier': ticket.tier.name,
-                'purchase_date': ticket.purchase_date
-            }, status=status.HTTP_400_BAD_REQUEST)
+            return _ticket_used_response(ticket)
             
-        # Success! Mark as USED
-        ticket.status = 'USED'
-        ticket.save()
+        # Success! Mark as USED (conditionally, so two scanners can't both admit it)
+        if not Ticket.objects.filter(id=ticket.id, status='ACTIVE').update(status='USED'):
+            ticket.refresh_from_db(fields=['status'])
+            return _ticket_used_response(ticket)
         
-        return Response({
-            'status': 'success',
-            'message': 'Ticket verified successfully',
-            'user': f"{ticket.user.first_name} {ticket.user.last_name}" if ticket.user.first_name else ticket.user.username,
-            'event': ticket.event.title,
-            'tier': ticket.tier.name
-        }, status=status.HTTP_200_OK)
+        return _ticket_verified_response(ticket.user, ticket.event.title, ticket.tier.name)
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+def _verify_signed_ticket(qr_data):
+    from events.documents import event_document
+
+    # 1. Signature: CPU only, forged codes never reach the DB
+    try:
+        signed = ticket_codes.parse(qr_data)
+    except ticket_codes.InvalidCode:
+        return Response({'error': 'Invalid Ticket'}, status=status.HTTP_404_NOT_FOUND)
+
+    # 2. Expiry from the event's current dates (cached document, so rescheduling is honoured)
+    document = event_document(signed.event_id)
+    if document is None:
+        return Response({'error': 'Invalid Ticket'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        expires_at = ticket_codes.check_expiry(document)
+    except ticket_codes.ExpiredCode:
+        return Response({'error': 'Ticket expired'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # 3. Use-once marker, then a single conditional update. The UPDATE is the
+    # authority: a marker left from before (e.g. an admin reset the ticket to
+    # ACTIVE) doesn't reject a ticket whose row is still active.
+    ticket = None
+    claimed = ticket_codes.claim_use(signed, expires_at)
+    if not claimed:
+        ticket = Ticket.objects.select_related('user', 'event', 'tier').filter(id=signed.ticket_id).first()
+        if ticket is None or ticket.status != 'ACTIVE':
+            return _ticket_unusable_response(ticket)
+
+    try:
+        updated = Ticket.objects.filter(id=signed.ticket_id, status='ACTIVE').update(status='USED')
+    except Exception:
+        if claimed:
+            ticket_codes.forget_use(signed.ticket_id)
+        raise
+    if updated:
+        tier_name = next((t['name'] for t in document.get('ticket_tiers', []) if t['id'] == signed.tier_id), '')
+        holder = ticket.user if ticket else (
+            User.objects.filter(tickets__id=signed.ticket_id).only('username', 'first_name', 'last_name').first()
+        )
+        return _ticket_verified_response(holder, document.get('title', ''), tier_name)
+
+    # Used, cancelled or deleted meanwhile: details for the scanner screen
+    ticket = Ticket.objects.select_related('user', 'event', 'tier').filter(id=signed.ticket_id).first()
+    return _ticket_unusable_response(ticket)
+
+
+def _ticket_unusable_response(ticket):
+    if ticket is None:
+        return Response({'error': 'Invalid Ticket'}, status=status.HTTP_404_NOT_FOUND)
+    if ticket.status == 'CANCELLED':
+        ticket_codes.forget_use(ticket.id)
+        return Response({'error': 'Ticket cancelled'}, status=status.HTTP_400_BAD_REQUEST)
+    return _ticket_used_response(ticket)
+
+
+def _ticket_used_response(ticket):
+    return Response({
+        'error': 'Ticket already used',
+        'user': ticket.user.username,
+        'event': ticket.event.title,
+        'tier': ticket.tier.name,
+        'purchase_date': ticket.purchase_date
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _ticket_verified_response(user, event_title, tier_name):
+    return Response({
+        'status': 'success',
+        'message': 'Ticket verified successfully',
+        'user': (f"{user.first_name} {user.last_name}" if user.first_name else user.username) if user else '',
+        'event': event_title,
+        'tier': tier_name
+    }, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def verify_subscription(request):
@@ -446,42 +457,30 @@ def verify_subscription(request):
     """
     platform = request.data.get('platform')
     receipt_data = request.data.get('receipt_data')
-    product_id = request.data.get('product_id')
-
-    if not all([platform, receipt_data, product_id]):
-        return Response({'error': 'Missing required fields'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Determine Tier from Product ID
-    tier_mapping = {
-        'FFIG_STANDARD': 'STANDARD',
-        'FFIG_PREMIUM': 'PREMIUM',
-    }
-    target_tier = tier_mapping.get(product_id)
-
-    if not target_tier:
-        return Response({'error': 'Unknown product ID'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        target_tier = services.subscription_target_tier(platform, receipt_data, request.data.get('product_id'))
+    except services.PaymentError as e:
+        return Response({'error': e.message}, status=e.status_code)
 
     is_valid = False
 
     if platform == 'ios':
         # Apple Verification
-        shared_secret = getattr(settings, 'APPLE_IAP_SHARED_SECRET', '')
-        payload = {
-            'receipt-data': receipt_data,
-            'password': shared_secret,
-            'exclude-old-transactions': True
-        }
+        payload = services.apple_receipt_payload(
+            receipt_data, getattr(settings, 'APPLE_IAP_SHARED_SECRET', '')
+        )
         
         # Try production first
-        verify_url = 'https://buy.itunes.apple.com/verifyReceipt'
         try:
-            resp = requests.post(verify_url, json=payload)
+            with track_outbound('apple', 'verify_receipt'):
+                resp = requests.post(services.APPLE_VERIFY_URL, json=payload)
             data = resp.json()
             
             # If the receipt is actually a sandbox receipt, Apple returns status 21007
-            if data.get('status') == 21007:
-                sandbox_url = 'https://sandbox.itunes.apple.com/verifyReceipt'
-                resp = requests.post(sandbox_url, json=payload)
+            if data.get('status') == services.APPLE_SANDBOX_RECEIPT_STATUS:
+                with track_outbound('apple', 'verify_receipt_sandbox'):
+                    resp = requests.post(services.APPLE_SANDBOX_VERIFY_URL, json=payload)
                 data = resp.json()
                 
             if data.get('status') == 0:
@@ -500,13 +499,7 @@ def verify_subscription(request):
             is_valid = True
 
     if is_valid:
-        profile = request.user.profile
-        profile.tier = target_tier
-        # Set expiry to 1 year from now
-        profile.subscription_expiry = timezone.now() + timedelta(days=365)
-        profile.save()
-        
+        profile = services.apply_subscription(request.user, target_tier)
         return Response({'status': 'success', 'tier': profile.tier})
     else:
         return Response({'error': 'Invalid Receipt'}, status=status.HTTP_400_BAD_REQUEST)
-
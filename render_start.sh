@@ -23,5 +23,21 @@ if [ -f "create_superuser.py" ]; then
     python create_superuser.py
 fi
 
-# Start Gunicorn
-gunicorn ffig_backend.wsgi:application
+# Prometheus: share metrics between gunicorn workers (wiped on every boot)
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/ffig-prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Start Gunicorn (hooks in gunicorn.conf.py)
+# ASGI_ENABLED=true: uvicorn workers serve ffig_backend.asgi so the Stripe/Apple
+# payment endpoints run as async views and a few slow provider calls can't
+# starve the worker pool. Otherwise the classic sync WSGI workers.
+case "${ASGI_ENABLED:-false}" in
+    1|true|True|yes|on)
+        echo "⚡ Starting ASGI workers (uvicorn)..."
+        gunicorn ffig_backend.asgi:application -k uvicorn_worker.UvicornWorker
+        ;;
+    *)
+        gunicorn ffig_backend.wsgi:application
+        ;;
+esac
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from .models import Resource, ResourceImage
 
+from core.services.storage_url_service import file_url
+
 class ResourceImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ResourceImage
@@ -16,17 +18,7 @@ class ResourceSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'url', 'file', 'category', 'thumbnail', 'thumbnail_url', 'created_at', 'is_active', 'images']
 
     def get_thumbnail(self, obj):
-        if obj.thumbnail:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.thumbnail.url)
-            return obj.thumbnail.url
-        return None
+        return file_url(obj.thumbnail, self.context.get('request'))
 
     def get_file(self, obj):
-        if obj.file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.file.url)
-            return obj.file.url
-        return None
+        return file_url(obj.file, self.context.get('request'))